@@ -0,0 +1,244 @@
+import hashlib
+import math
+import random
+import time
+from datetime import datetime, timezone
+from functools import wraps
+from http import HTTPStatus
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple, Type
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Model
+from django.http import HttpRequest, HttpResponse
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import condition
+
+VERSION_KEY = 'version:{}'
+
+PageState = Optional[Tuple[Optional[datetime], Iterable[str]]]
+
+
+def now_version() -> int:
+    return int(time.time() * 1_000_000)
+
+
+def get_versions(scopes: Iterable[str]) -> Dict[str, int]:
+    keys = {VERSION_KEY.format(scope): scope for scope in scopes}
+    found = cache.get_many(keys)
+    missing = {key: now_version() for key in keys if key not in found}
+    if missing:
+        cache.set_many(missing, None)
+        found.update(missing)
+    return {scope: found[key] for key, scope in keys.items()}
+
+
+def version_datetime(version: int) -> datetime:
+    return datetime.fromtimestamp(version / 1_000_000, tz=timezone.utc)
+
+
+def bump_versions(*scopes: str) -> None:
+    version = now_version()
+    cache.set_many(
+        {VERSION_KEY.format(scope): version for scope in scopes},
+        None,
+    )
+
+
+def table_scope(table: str) -> str:
+    return f'table:{table}'
+
+
+def bump_tables(*models: Type[Model]) -> None:
+    bump_versions(*(table_scope(model._meta.db_table) for model in models))
+
+
+def conditional_page(state: Callable[..., PageState]) -> Callable:
+    """Отвечает 304 Not Modified, не выполняя представление.
+
+    `state` получает аргументы представления и возвращает время последнего
+    изменения записей страницы и области, от которых она зависит, или None,
+    если страницы нет. Версии областей учитываются и в ETag, и в
+    Last-Modified, поэтому удаление записей тоже меняет валидаторы.
+    Устаревшая копия из `versioned_cache_page` отдаётся с валидаторами,
+    сохранёнными вместе с ней.
+    """
+
+    def validators(request: HttpRequest, *args, **kwargs) -> tuple:
+        if not hasattr(request, '_page_validators'):
+            request._page_validators = _validators(
+                request,
+                state(request, *args, **kwargs),
+            )
+        return request._page_validators
+
+    return condition(
+        etag_func=lambda *args, **kwargs: validators(*args, **kwargs)[0],
+        last_modified_func=(
+            lambda *args, **kwargs: validators(*args, **kwargs)[1]
+        ),
+    )
+
+
+def _validators(
+    request: HttpRequest,
+    page_state: PageState,
+) -> Tuple[Optional[str], Optional[datetime]]:
+    if page_state is None:
+        return None, None
+    modified, scopes = page_state
+    versions = get_versions(scopes)
+    stamps = [version_datetime(version) for version in versions.values()]
+    if modified is not None:
+        stamps.append(modified)
+    user = request.user.pk if request.user.is_authenticated else 'anon'
+    etag = hashlib.md5(
+        repr(
+            (
+                user,
+                modified and modified.isoformat(),
+                sorted(versions.items()),
+            ),
+        ).encode(),
+    ).hexdigest()
+    return etag, max(stamps, default=None)
+
+
+def page_cache_key(key_prefix: str, request: HttpRequest) -> str:
+    user = request.user.pk if request.user.is_authenticated else 'anon'
+    url = hashlib.md5(request.build_absolute_uri().encode()).hexdigest()
+    return f'page:{key_prefix}:{request.method}:{url}:{user}'
+
+
+def versioned_cache_page(
+    timeout: int,
+    key_prefix: str,
+    scopes: Callable[..., Iterable[str]],
+    stale_timeout: Optional[int] = None,
+    beta: Optional[float] = None,
+) -> Callable:
+    """Кэш страницы с версионированием, stale-while-revalidate и блокировкой.
+
+    `scopes` получает аргументы представления и возвращает имена областей,
+    от которых зависит страница. Копия считается свежей, пока совпадают
+    версии областей и не истёк `timeout`. Перестраивает страницу только
+    запрос, получивший блокировку, остальные в это время отдают устаревшую
+    копию, которая хранится ещё `stale_timeout` секунд. Чтобы горячие ключи
+    не истекали одновременно, копия обновляется заранее с вероятностью,
+    растущей к концу срока (XFetch, коэффициент `beta`).
+    """
+
+    def decorator(view: Callable) -> Callable:
+        @wraps(view)
+        def wrapper(request: HttpRequest, *args, **kwargs) -> HttpResponse:
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            versions = get_versions(scopes(request, *args, **kwargs))
+            key = page_cache_key(key_prefix, request)
+            entry = cache.get(key)
+            if entry is not None and _is_fresh(entry, versions, beta):
+                return _restore(entry)
+            if not cache.add(
+                f'{key}:lock',
+                True,
+                settings.PAGE_CACHE_LOCK_TIMEOUT,
+            ):
+                if entry is None:
+                    entry = _wait_for(key, versions)
+                if entry is not None:
+                    return _restore(entry, entry['versions'] != versions)
+                return view(request, *args, **kwargs)
+            try:
+                started = time.monotonic()
+                response = view(request, *args, **kwargs)
+                _store(
+                    key,
+                    request,
+                    response,
+                    versions,
+                    timeout,
+                    time.monotonic() - started,
+                    stale_timeout,
+                )
+            finally:
+                cache.delete(f'{key}:lock')
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def _is_fresh(
+    entry: Dict[str, Any],
+    versions: Dict[str, int],
+    beta: Optional[float],
+) -> bool:
+    if entry['versions'] != versions:
+        return False
+    beta = settings.PAGE_CACHE_BETA if beta is None else beta
+    # XFetch: чем дольше строилась страница, тем раньше её обновляют
+    early = entry['delta'] * beta * -math.log(1.0 - random.random())
+    return time.time() + early < entry['expires']
+
+
+def _wait_for(key: str, versions: Dict[str, int]) -> Optional[Dict]:
+    deadline = time.monotonic() + settings.PAGE_CACHE_LOCK_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        entry = cache.get(key)
+        if entry is not None and entry['versions'] == versions:
+            return entry
+    return None
+
+
+def _store(
+    key: str,
+    request: HttpRequest,
+    response: HttpResponse,
+    versions: Dict[str, int],
+    timeout: int,
+    delta: float,
+    stale_timeout: Optional[int],
+) -> None:
+    if (
+        response.status_code != HTTPStatus.OK
+        or response.streaming
+        or response.cookies
+    ):
+        return
+    stale_timeout = (
+        settings.PAGE_CACHE_STALE_TIMEOUT
+        if stale_timeout is None
+        else stale_timeout
+    )
+    cache.set(
+        key,
+        {
+            'versions': versions,
+            'expires': time.time() + timeout,
+            'delta': delta,
+            'content': response.content,
+            'headers': list(response.items()),
+            # валидаторы conditional_page, посчитанные до построения
+            'validators': getattr(request, '_page_validators', None),
+        },
+        timeout + stale_timeout,
+    )
+
+
+def _restore(entry: Dict[str, Any], stale: bool = False) -> HttpResponse:
+    response = HttpResponse(entry['content'])
+    for header, value in entry['headers']:
+        response[header] = value
+    if stale:
+        # у устаревшей копии валидаторы текущих версий дали бы клиенту 304
+        # на старое содержимое и после перестроения страницы
+        etag, modified = entry.get('validators') or (None, None)
+        if etag is None:
+            response['Cache-Control'] = 'no-cache'
+        else:
+            response['ETag'] = quote_etag(etag)
+        if modified is not None:
+            response['Last-Modified'] = http_date(modified.timestamp())
+    return response
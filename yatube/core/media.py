@@ -0,0 +1,162 @@
+import mimetypes
+import os
+import re
+import stat
+from http import HTTPStatus
+from typing import BinaryIO, Optional, Tuple
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpRequest, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.http import require_safe
+
+from core.storage import is_hashed
+
+RANGE = re.compile(r'^bytes=(?P<start>\d*)-(?P<end>\d*)$')
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+
+class FileRange:
+    """Часть открытого файла от текущей позиции длиной `length` байт.
+
+    `fileno` и `tell` нужны серверу, который отдаёт файл через
+    `wsgi.file_wrapper` и sendfile: он начинает с текущей позиции и
+    отправляет столько байт, сколько указано в Content-Length.
+    """
+
+    def __init__(self, file_: BinaryIO, start: int, length: int) -> None:
+        self.file = file_
+        self.file.seek(start)
+        self.remaining = length
+
+    def read(self, size: int = -1) -> bytes:
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self) -> int:
+        return self.file.fileno()
+
+    def tell(self) -> int:
+        return self.file.tell()
+
+    def close(self) -> None:
+        self.file.close()
+
+
+def byte_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """Первый и последний байт из заголовка Range или None.
+
+    Поддерживается только один диапазон: на несколько сразу, как разрешает
+    RFC 7233, отвечаем целым файлом. Для диапазона за концом файла
+    возвращается (size, size - 1).
+    """
+    match = RANGE.match(header.strip())
+    if match is None or not (match['start'] or match['end']):
+        return None
+    if not match['start']:
+        suffix = int(match['end'])
+        if not suffix:
+            return size, size - 1
+        return max(size - suffix, 0), size - 1
+    start = int(match['start'])
+    if not match['end']:
+        return start, size - 1
+    end = int(match['end'])
+    if end < start:
+        return None
+    return start, min(end, size - 1)
+
+
+def if_range_matches(
+    request: HttpRequest,
+    etag: str,
+    last_modified: int,
+) -> bool:
+    value = request.META.get('HTTP_IF_RANGE')
+    if value is None:
+        return True
+    if value.startswith('"'):
+        return value == etag
+    return parse_http_date_safe(value) == last_modified
+
+
+@require_safe
+def serve(request: HttpRequest, path: str) -> HttpResponse:
+    """Отдаёт файл из MEDIA_ROOT через FileResponse.
+
+    Сервер с `wsgi.file_wrapper` передаёт файл через sendfile, минуя
+    Python. Поддерживаются запросы диапазонов, условные запросы по
+    ETag и Last-Modified, а файлы с именем по хэшу содержимого
+    кэшируются браузером навсегда.
+    """
+    try:
+        fullpath = safe_join(settings.MEDIA_ROOT, path)
+        file_ = open(fullpath, 'rb')
+    except (SuspiciousFileOperation, OSError):
+        raise Http404('Файл не найден')
+    stats = os.fstat(file_.fileno())
+    if not stat.S_ISREG(stats.st_mode):
+        file_.close()
+        raise Http404('Файл не найден')
+    size = stats.st_size
+    etag = f'"{stats.st_mtime_ns:x}-{size:x}"'
+    last_modified = int(stats.st_mtime)
+    cache_control = (
+        IMMUTABLE
+        if is_hashed(path)
+        else f'public, max-age={settings.MEDIA_CACHE_MAX_AGE}'
+    )
+    not_modified = get_conditional_response(
+        request,
+        etag=etag,
+        last_modified=last_modified,
+    )
+    if not_modified is not None:
+        file_.close()
+        not_modified['Cache-Control'] = cache_control
+        return not_modified
+
+    requested = None
+    if 'HTTP_RANGE' in request.META and if_range_matches(
+        request,
+        etag,
+        last_modified,
+    ):
+        requested = byte_range(request.META['HTTP_RANGE'], size)
+    if requested is not None and requested[0] >= size:
+        file_.close()
+        response = HttpResponse(
+            status=HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE,
+        )
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    content_type, encoding = mimetypes.guess_type(fullpath)
+    content_type = content_type or 'application/octet-stream'
+    if requested is None:
+        response = FileResponse(file_, content_type=content_type)
+    else:
+        start, end = requested
+        response = FileResponse(
+            FileRange(file_, start, end - start + 1),
+            status=HTTPStatus.PARTIAL_CONTENT,
+            content_type=content_type,
+        )
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response['Content-Length'] = (
+        size if requested is None else requested[1] - requested[0] + 1
+    )
+    if encoding:
+        response['Content-Encoding'] = encoding
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = cache_control
+    return response
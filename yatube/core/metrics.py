@@ -0,0 +1,420 @@
+import glob
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from http import HTTPStatus
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from django.conf import settings
+from django.core.cache.backends import locmem
+from django.http import HttpRequest
+from django.template.backends import django as templates
+
+from core import queries
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+HEADER = struct.Struct('q')
+LENGTH = struct.Struct('i')
+VALUE = struct.Struct('d')
+
+MISSING = object()
+
+
+class MemoryStore:
+    """Значения метрик в памяти процесса: для разработки и тестов."""
+
+    def __init__(self) -> None:
+        self.data: Dict[str, float] = defaultdict(float)
+        self.lock = threading.Lock()
+
+    def add(self, key: str, amount: float) -> None:
+        with self.lock:
+            self.data[key] += amount
+
+    def values(self) -> Dict[str, float]:
+        with self.lock:
+            return dict(self.data)
+
+
+class FileStore:
+    """Значения метрик в файле процесса, отображённом в память.
+
+    Файл начинается с длины занятой части, за ней идут записи: длина
+    ключа, ключ, выравнивание до 8 байт и значение double. Новая запись
+    становится видна читателям только после обновления длины, поэтому
+    другие процессы читают файл без блокировок.
+    """
+
+    INITIAL_SIZE = 64 * 1024
+
+    def __init__(self, path: str) -> None:
+        self.lock = threading.Lock()
+        self.file = open(path, 'a+b')
+        self.capacity = os.fstat(self.file.fileno()).st_size
+        if self.capacity == 0:
+            self.capacity = self.INITIAL_SIZE
+            self.file.truncate(self.capacity)
+        self.map = mmap.mmap(self.file.fileno(), self.capacity)
+        self.used = HEADER.unpack_from(self.map)[0] or HEADER.size
+        self.positions = {
+            key: position for key, _, position in entries(self.map, self.used)
+        }
+
+    def add(self, key: str, amount: float) -> None:
+        with self.lock:
+            position = self.positions.get(key)
+            if position is None:
+                position = self.append(key)
+            (value,) = VALUE.unpack_from(self.map, position)
+            VALUE.pack_into(self.map, position, value + amount)
+
+    def append(self, key: str) -> int:
+        encoded = key.encode()
+        start = LENGTH.size + len(encoded)
+        size = start + -start % VALUE.size + VALUE.size
+        while self.used + size > self.capacity:
+            self.capacity *= 2
+            self.map.close()
+            self.file.truncate(self.capacity)
+            self.map = mmap.mmap(self.file.fileno(), self.capacity)
+        LENGTH.pack_into(self.map, self.used, len(encoded))
+        begin, end = self.used + LENGTH.size, self.used + start
+        self.map[begin:end] = encoded
+        position = self.used + size - VALUE.size
+        VALUE.pack_into(self.map, position, 0.0)
+        self.used += size
+        HEADER.pack_into(self.map, 0, self.used)
+        self.positions[key] = position
+        return position
+
+    def values(self) -> Dict[str, float]:
+        with self.lock:
+            return {
+                key: value for key, value, _ in entries(self.map, self.used)
+            }
+
+
+def entries(data, used: int) -> Iterator[Tuple[str, float, int]]:
+    offset = HEADER.size
+    while offset < used:
+        (length,) = LENGTH.unpack_from(data, offset)
+        start = LENGTH.size + length
+        begin, end = offset + LENGTH.size, offset + start
+        key = bytes(data[begin:end]).decode()
+        offset += start + -start % VALUE.size
+        (value,) = VALUE.unpack_from(data, offset)
+        yield key, value, offset
+        offset += VALUE.size
+
+
+def merged(directory: str) -> Dict[str, float]:
+    """Сумма значений из файлов всех процессов, в том числе завершённых."""
+    total: Dict[str, float] = defaultdict(float)
+    for path in glob.glob(os.path.join(directory, '*.db')):
+        with open(path, 'rb') as file_:
+            data = file_.read()
+        if len(data) < HEADER.size:
+            continue
+        used = min(HEADER.unpack_from(data)[0], len(data))
+        for key, value, _ in entries(data, used):
+            total[key] += value
+    return total
+
+
+_store = None
+_store_pid = None
+_store_lock = threading.Lock()
+
+
+def store():
+    """Хранилище текущего процесса; после fork создаётся своё."""
+    global _store, _store_pid
+    if _store_pid != os.getpid():
+        with _store_lock:
+            if _store_pid != os.getpid():
+                if settings.METRICS_DIR:
+                    os.makedirs(settings.METRICS_DIR, exist_ok=True)
+                    _store = FileStore(
+                        os.path.join(
+                            settings.METRICS_DIR,
+                            f'{os.getpid()}.db',
+                        ),
+                    )
+                else:
+                    _store = MemoryStore()
+                _store_pid = os.getpid()
+    return _store
+
+
+def collect() -> Dict[str, float]:
+    if settings.METRICS_DIR:
+        return merged(settings.METRICS_DIR)
+    return store().values()
+
+
+REGISTRY: List['Metric'] = []
+
+
+class Metric:
+    kind = ''
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str],
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        REGISTRY.append(self)
+
+    def add(self, labels: Sequence[str], sample: str, amount: float) -> None:
+        store().add(json.dumps([self.name, list(labels), sample]), amount)
+
+    def lines(
+        self,
+        labels: Tuple[str, ...],
+        samples: Dict[str, float],
+    ) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        self.add(labels, '', amount)
+
+    def lines(
+        self,
+        labels: Tuple[str, ...],
+        samples: Dict[str, float],
+    ) -> List[str]:
+        return [sample(self.name, zip(self.labels, labels), samples[''])]
+
+
+class Histogram(Metric):
+    """Гистограмма: наблюдение меняет одну корзину, сумму и счётчик.
+
+    Корзины хранятся без накопления и складываются при выводе.
+    """
+
+    kind = 'histogram'
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str],
+        buckets: Sequence[float],
+    ) -> None:
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(float(bound) for bound in buckets)
+
+    def observe(self, value: float, *labels: str) -> None:
+        for bound in self.buckets:
+            if value <= bound:
+                self.add(labels, repr(bound), 1.0)
+                break
+        self.add(labels, 'sum', value)
+        self.add(labels, 'count', 1.0)
+
+    def lines(
+        self,
+        labels: Tuple[str, ...],
+        samples: Dict[str, float],
+    ) -> List[str]:
+        pairs = list(zip(self.labels, labels))
+        found = []
+        cumulative = 0.0
+        for bound in self.buckets:
+            cumulative += samples.get(repr(bound), 0.0)
+            found.append(
+                sample(
+                    f'{self.name}_bucket',
+                    pairs + [('le', repr(bound))],
+                    cumulative,
+                ),
+            )
+        count = samples.get('count', 0.0)
+        found += [
+            sample(f'{self.name}_bucket', pairs + [('le', '+Inf')], count),
+            sample(f'{self.name}_sum', pairs, samples.get('sum', 0.0)),
+            sample(f'{self.name}_count', pairs, count),
+        ]
+        return found
+
+
+def escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def sample(name: str, pairs, value: float) -> str:
+    labels = ','.join(f'{label}="{escape(text)}"' for label, text in pairs)
+    if labels:
+        name = f'{name}{{{labels}}}'
+    return f'{name} {float(value)!r}'
+
+
+def render(values: Dict[str, float]) -> str:
+    """Текстовый формат Prometheus."""
+    families: Dict[str, Dict[tuple, Dict[str, float]]] = defaultdict(
+        lambda: defaultdict(dict),
+    )
+    for key, value in values.items():
+        name, labels, sample_name = json.loads(key)
+        families[name][tuple(labels)][sample_name] = value
+    found = []
+    for metric in REGISTRY:
+        found += [
+            f'# HELP {metric.name} {metric.documentation}',
+            f'# TYPE {metric.name} {metric.kind}',
+        ]
+        for labels, samples in sorted(families[metric.name].items()):
+            found += metric.lines(labels, samples)
+    return '\n'.join(found) + '\n'
+
+
+requests = Counter(
+    'yatube_requests_total',
+    'Обработанные запросы.',
+    ('view', 'method', 'status'),
+)
+request_duration = Histogram(
+    'yatube_request_duration_seconds',
+    'Время обработки запроса.',
+    ('view',),
+    DURATION_BUCKETS,
+)
+db_duration = Histogram(
+    'yatube_db_duration_seconds',
+    'Время SQL-запросов за один запрос.',
+    ('view',),
+    DURATION_BUCKETS,
+)
+db_queries = Histogram(
+    'yatube_db_queries',
+    'Число SQL-запросов за один запрос.',
+    ('view',),
+    QUERY_BUCKETS,
+)
+template_duration = Histogram(
+    'yatube_template_duration_seconds',
+    'Время отрисовки шаблонов за один запрос.',
+    ('view',),
+    DURATION_BUCKETS,
+)
+cache_reads = Counter(
+    'yatube_cache_reads_total',
+    'Чтения из кэша: попадания и промахи.',
+    ('view', 'result'),
+)
+
+
+class Current(threading.local):
+    request: Optional[HttpRequest] = None
+    template = 0.0
+    status = HTTPStatus.INTERNAL_SERVER_ERROR
+
+
+_current = Current()
+
+
+def current_view() -> str:
+    match = getattr(_current.request, 'resolver_match', None)
+    return match.view_name if match else ''
+
+
+@contextmanager
+def tracking(request: HttpRequest) -> Iterator[Current]:
+    """Записывает метрики запроса, выполняемого внутри блока.
+
+    Код ответа блок сохраняет в `status` полученного объекта.
+    """
+    _current.request = request
+    _current.template = 0.0
+    _current.status = HTTPStatus.INTERNAL_SERVER_ERROR
+    started = time.perf_counter()
+    try:
+        with queries.capture() as log:
+            yield _current
+    finally:
+        view = current_view()
+        requests.inc(view, request.method, str(int(_current.status)))
+        request_duration.observe(time.perf_counter() - started, view)
+        db_duration.observe(log.duration, view)
+        db_queries.observe(log.count, view)
+        template_duration.observe(_current.template, view)
+        _current.request = None
+
+
+class Template(templates.Template):
+    def render(self, context=None, request=None) -> str:
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            _current.template += time.perf_counter() - started
+
+
+class DjangoTemplates(templates.DjangoTemplates):
+    """Движок шаблонов, учитывающий время отрисовки в метриках запроса.
+
+    Засекаются только шаблоны верхнего уровня, включённые через
+    `include` и `extends` входят в их время.
+    """
+
+    def from_string(self, template_code: str) -> Template:
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name: str) -> Template:
+        try:
+            return Template(self.engine.get_template(template_name), self)
+        except templates.TemplateDoesNotExist as exc:
+            templates.reraise(exc, self)
+
+
+class CacheMetricsMixin:
+    """Считает попадания и промахи `get` и `get_many` бэкенда кэша."""
+
+    counting = True
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, MISSING, version)
+        if self.counting:
+            record_cache_reads(int(value is not MISSING), 1)
+        return default if value is MISSING else value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        # базовый get_many читает ключи через get, их не считаем дважды
+        self.counting = False
+        try:
+            found = super().get_many(keys, version)
+        finally:
+            self.counting = True
+        record_cache_reads(len(found), len(keys))
+        return found
+
+
+class LocMemCache(CacheMetricsMixin, locmem.LocMemCache):
+    pass
+
+
+def record_cache_reads(hits: int, total: int) -> None:
+    view = current_view()
+    if hits:
+        cache_reads.inc(view, 'hit', amount=hits)
+    if total > hits:
+        cache_reads.inc(view, 'miss', amount=total - hits)
@@ -0,0 +1,65 @@
+import logging
+from typing import Callable
+
+from django.conf import settings
+from django.http import HttpRequest, HttpResponse
+
+from core import metrics, profiling, queries
+
+logger = logging.getLogger(__name__)
+
+
+class MetricsMiddleware:
+    """Собирает метрики запроса для `/metrics/`; ставится первым."""
+
+    def __init__(self, get_response: Callable) -> None:
+        self.get_response = get_response
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        with metrics.tracking(request) as current:
+            response = self.get_response(request)
+            current.status = response.status_code
+        return response
+
+
+class QueryBudgetMiddleware:
+    """Считает SQL-запросы каждого запроса и сообщает о нарушениях.
+
+    В работе нарушения бюджета и N+1 пишутся в журнал, а при
+    `QUERY_BUDGET_STRICT` (в тестах) запрос завершается исключением.
+    """
+
+    def __init__(self, get_response: Callable) -> None:
+        self.get_response = get_response
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        with queries.capture() as log:
+            response = self.get_response(request)
+        match = request.resolver_match
+        found = queries.problems(log, match.view_name if match else None)
+        if found:
+            if settings.QUERY_BUDGET_STRICT:
+                raise queries.QueryBudgetExceeded('\n'.join(found))
+            for problem in found:
+                logger.warning(problem)
+        return response
+
+
+class ProfilingMiddleware:
+    """Профилирует выбранные запросы, см. `core.profiling.requested`.
+
+    Ставится после AuthenticationMiddleware, имя отчёта возвращается в
+    заголовке X-Profile-Id.
+    """
+
+    def __init__(self, get_response: Callable) -> None:
+        self.get_response = get_response
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        if not profiling.requested(request):
+            return self.get_response(request)
+        with profiling.profile(request) as report:
+            response = self.get_response(request)
+            report.status = response.status_code
+        response[profiling.RESPONSE_HEADER] = report.name
+        return response
@@ -0,0 +1,37 @@
+# Generated by Django 2.2.16 on 2026-10-18 20:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = []
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredFile',
+            fields=[
+                (
+                    'name',
+                    models.CharField(
+                        max_length=255,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name='имя файла',
+                    ),
+                ),
+                (
+                    'refs',
+                    models.PositiveIntegerField(
+                        default=0, verbose_name='число ссылок'
+                    ),
+                ),
+            ],
+            options={
+                'verbose_name': 'файл',
+                'verbose_name_plural': 'файлы',
+            },
+        ),
+    ]
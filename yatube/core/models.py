@@ -1,3 +1,5 @@
+from typing import Tuple
+
 from behaviors.behaviors import Timestamped
 from django.contrib.auth import get_user_model
 from django.db import models
@@ -6,9 +8,27 @@ User = get_user_model()
 
 
 class DefaultModel(models.Model):
+    # денормализованные счётчики меняются только атомарными UPDATE,
+    # поэтому обычное сохранение объекта их не перезаписывает
+    counter_fields: Tuple[str, ...] = ()
+
     class Meta:
         abstract = True
 
+    def save(self, *args, **kwargs) -> None:
+        if (
+            self.counter_fields
+            and not self._state.adding
+            and kwargs.get('update_fields') is None
+        ):
+            kwargs['update_fields'] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.counter_fields
+            ]
+        super().save(*args, **kwargs)
+
 
 class TimestampedModel(DefaultModel, Timestamped):
     def __init__(self, *args, **kwargs):
@@ -37,3 +57,22 @@ class TextAuthorModel(TimestampedModel):
     class Meta:
         abstract = True
         ordering = ('-created',)
+
+
+class StoredFile(models.Model):
+    name = models.CharField(
+        'имя файла',
+        max_length=255,
+        primary_key=True,
+    )
+    refs = models.PositiveIntegerField(
+        'число ссылок',
+        default=0,
+    )
+
+    class Meta:
+        verbose_name = 'файл'
+        verbose_name_plural = 'файлы'
+
+    def __str__(self) -> str:
+        return self.name
@@ -0,0 +1,309 @@
+import collections.abc
+import hashlib
+import json
+from typing import Any, Iterator, List, Optional, Sequence, Tuple, Union
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Field, Model, Q, QuerySet
+from django.utils.functional import cached_property
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+from core.cache import get_versions, table_scope
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class CachedCountPaginator(Paginator):
+    """Paginator с кэшированным COUNT(*) и сокращённым списком страниц.
+
+    Число объектов хранится в кэше под ключом, зависящим от SQL запроса и
+    версий всех участвующих в нём таблиц (см. `core.cache.table_scope`),
+    поэтому сбрасывается при сохранении и удалении записей. Если выборка
+    больше `estimate_threshold`, вместо точного подсчёта используется оценка,
+    которая обновляется не чаще раза в `estimate_timeout` секунд.
+    """
+
+    ELLIPSIS = '…'
+
+    def __init__(
+        self,
+        object_list: Union[QuerySet, Sequence],
+        per_page: int,
+        orphans: int = 0,
+        allow_empty_first_page: bool = True,
+        count_timeout: Optional[int] = None,
+        estimate_threshold: Optional[int] = None,
+        estimate_timeout: Optional[int] = None,
+    ) -> None:
+        super().__init__(
+            object_list,
+            per_page,
+            orphans,
+            allow_empty_first_page,
+        )
+        self.count_timeout = (
+            settings.PAGINATOR_COUNT_TIMEOUT
+            if count_timeout is None
+            else count_timeout
+        )
+        self.estimate_threshold = (
+            settings.PAGINATOR_ESTIMATE_THRESHOLD
+            if estimate_threshold is None
+            else estimate_threshold
+        )
+        self.estimate_timeout = (
+            settings.PAGINATOR_ESTIMATE_TIMEOUT
+            if estimate_timeout is None
+            else estimate_timeout
+        )
+
+    @cached_property
+    def count(self) -> int:
+        if not isinstance(self.object_list, QuerySet):
+            return super().count
+        query = str(self.object_list.query)
+        versions = get_versions(
+            table_scope(alias.table_name)
+            for alias in self.object_list.query.alias_map.values()
+        )
+        key = 'paginator:count:{}'.format(
+            hashlib.md5(
+                (query + repr(sorted(versions.items()))).encode(),
+            ).hexdigest(),
+        )
+        count = cache.get(key)
+        if count is None:
+            count = self._count(query)
+            cache.set(key, count, self.count_timeout)
+        return count
+
+    def get_elided_page_range(
+        self,
+        number: int = 1,
+        on_each_side: int = 3,
+        on_ends: int = 2,
+    ) -> Iterator[Union[int, str]]:
+        number = self.validate_number(number)
+        if self.num_pages <= (on_each_side + on_ends) * 2:
+            yield from self.page_range
+            return
+        if number > (1 + on_each_side + on_ends) + 1:
+            yield from range(1, on_ends + 1)
+            yield self.ELLIPSIS
+            yield from range(number - on_each_side, number + 1)
+        else:
+            yield from range(1, number + 1)
+        if number < (self.num_pages - on_each_side - on_ends) - 1:
+            yield from range(number + 1, number + on_each_side + 1)
+            yield self.ELLIPSIS
+            yield from range(self.num_pages - on_ends + 1, self.num_pages + 1)
+        else:
+            yield from range(number + 1, self.num_pages + 1)
+
+    def _count(self, query: str) -> int:
+        if not self.estimate_threshold:
+            return self.object_list.count()
+        # подсчёт ограничен порогом, поэтому не сканирует всю таблицу
+        bounded = self.object_list[: self.estimate_threshold].count()
+        if bounded < self.estimate_threshold:
+            return bounded
+        key = 'paginator:estimate:{}'.format(
+            hashlib.md5(query.encode()).hexdigest(),
+        )
+        estimate = cache.get(key)
+        if estimate is None:
+            estimate = max(self._estimate(), self.estimate_threshold)
+            cache.set(key, estimate, self.estimate_timeout)
+        return estimate
+
+    def _estimate(self) -> int:
+        connection = connections[self.object_list.db]
+        if connection.vendor != 'postgresql':
+            return self.object_list.count()
+        sql, params = self.object_list.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            return int(cursor.fetchone()[0][0]['Plan']['Plan Rows'])
+
+
+class KeysetPage(collections.abc.Sequence):
+    cursor_based = True
+
+    def __init__(
+        self,
+        object_list: list,
+        paginator: 'KeysetPaginator',
+        next_cursor: Optional[str] = None,
+        previous_cursor: Optional[str] = None,
+    ) -> None:
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self) -> str:
+        return f'<KeysetPage of {len(self)} objects>'
+
+    def __len__(self) -> int:
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self) -> bool:
+        return self.next_cursor is not None
+
+    def has_previous(self) -> bool:
+        return self.previous_cursor is not None
+
+    def has_other_pages(self) -> bool:
+        return self.has_previous() or self.has_next()
+
+
+class KeysetPaginator:
+    """Постраничный вывод по курсору вместо OFFSET и COUNT(*).
+
+    Каждая страница выбирается одним запросом `WHERE (created, id) < курсор
+    ORDER BY created DESC, id DESC LIMIT n + 1`, поэтому стоимость дальних
+    страниц не отличается от первой.
+    """
+
+    def __init__(
+        self,
+        queryset: QuerySet,
+        per_page: int,
+        keys: Tuple[str, ...] = ('created', 'id'),
+        descending: bool = True,
+    ) -> None:
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        self.keys = keys
+        self.descending = descending
+
+    def encode_cursor(self, obj: Model) -> str:
+        values = [self._dump(getattr(obj, key)) for key in self.keys]
+        return urlsafe_base64_encode(json.dumps(values).encode())
+
+    def decode_cursor(self, cursor: str) -> Tuple[Any, ...]:
+        try:
+            values = json.loads(urlsafe_base64_decode(cursor))
+        except (TypeError, ValueError):
+            raise InvalidCursor(cursor)
+        if not isinstance(values, list) or len(values) != len(self.keys):
+            raise InvalidCursor(cursor)
+        return tuple(
+            self._load(field, value)
+            for field, value in zip(self.fields, values)
+        )
+
+    @cached_property
+    def fields(self) -> List[Field]:
+        # курсор разбирается полем своего ключа: дата в позиции id должна
+        # давать InvalidCursor, а не TypeError при построении запроса
+        annotations = self.queryset.query.annotations
+        return [
+            annotations[key].output_field
+            if key in annotations
+            else self.queryset.model._meta.get_field(key)
+            for key in self.keys
+        ]
+
+    def page(
+        self,
+        after: Optional[str] = None,
+        before: Optional[str] = None,
+    ) -> KeysetPage:
+        if before:
+            return self._page_before(self.decode_cursor(before))
+        queryset = self._ordered(self.descending)
+        if after:
+            queryset = queryset.filter(
+                self._seek(self.decode_cursor(after), self.descending),
+            )
+        objects = list(queryset[: self.per_page + 1])
+        has_next = len(objects) > self.per_page
+        objects = objects[: self.per_page]
+        return KeysetPage(
+            objects,
+            self,
+            self.encode_cursor(objects[-1]) if has_next else None,
+            self.encode_cursor(objects[0]) if after and objects else None,
+        )
+
+    def get_page(
+        self,
+        after: Optional[str] = None,
+        before: Optional[str] = None,
+    ) -> KeysetPage:
+        try:
+            return self.page(after, before)
+        except InvalidCursor:
+            return self.page()
+
+    def _page_before(self, values: Tuple[Any, ...]) -> KeysetPage:
+        objects = list(
+            self._ordered(not self.descending).filter(
+                self._seek(values, not self.descending),
+            )[: self.per_page + 1],
+        )
+        if not objects:
+            return self.page()
+        has_previous = len(objects) > self.per_page
+        objects = objects[: self.per_page][::-1]
+        return KeysetPage(
+            objects,
+            self,
+            self.encode_cursor(objects[-1]),
+            self.encode_cursor(objects[0]) if has_previous else None,
+        )
+
+    def _ordered(self, descending: bool) -> QuerySet:
+        prefix = '-' if descending else ''
+        return self.queryset.order_by(*(prefix + key for key in self.keys))
+
+    def _seek(self, values: Sequence[Any], descending: bool) -> Q:
+        # лексикографическое сравнение кортежа (k1, k2, ...) с курсором
+        lookup = 'lt' if descending else 'gt'
+        condition = Q()
+        for position in range(len(self.keys) - 1, -1, -1):
+            equal = {
+                key: value
+                for key, value in zip(
+                    self.keys[:position],
+                    values[:position],
+                )
+            }
+            step = Q(
+                **equal,
+                **{f'{self.keys[position]}__{lookup}': values[position]},
+            )
+            condition = step | condition if condition else step
+        # условие на первый ключ отдельно: по нему база начинает обход
+        # индекса с курсора, а не с начала
+        return Q(**{f'{self.keys[0]}__{lookup}e': values[0]}) & condition
+
+    @staticmethod
+    def _dump(value: Any) -> Any:
+        return value.isoformat() if hasattr(value, 'isoformat') else value
+
+    @staticmethod
+    def _load(field: Field, value: Any) -> Any:
+        if value is None or isinstance(value, (bool, list, dict)):
+            raise InvalidCursor(value)
+        try:
+            # формат может быть верен, а дата не существовать: 2020-13-45
+            loaded = field.to_python(value)
+        except (ValidationError, TypeError, ValueError, OverflowError):
+            raise InvalidCursor(value)
+        if loaded is None:
+            raise InvalidCursor(value)
+        if isinstance(loaded, int) and not -(2**63) <= loaded < 2**63:
+            # не поместится в целочисленный столбец базы
+            raise InvalidCursor(value)
+        return loaded
@@ -0,0 +1,143 @@
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from http import HTTPStatus
+from types import FrameType
+from typing import Iterator, Optional
+
+from django.conf import settings
+from django.core import signing
+from django.http import HttpRequest
+
+from core import queries
+
+HEADER = 'HTTP_X_PROFILE'
+
+RESPONSE_HEADER = 'X-Profile-Id'
+
+SALT = 'core.profiling'
+
+
+def token() -> str:
+    """Значение заголовка X-Profile, действующее `PROFILE_TOKEN_MAX_AGE`."""
+    return signing.TimestampSigner(salt=SALT).sign('profile')
+
+
+def requested(request: HttpRequest) -> bool:
+    """Профилировать ли запрос.
+
+    Профилируются запросы с подписанным заголовком X-Profile, запросы
+    сотрудников с параметром `profile` и каждый `PROFILE_SAMPLE_RATE`-й
+    запрос в среднем, если выборка включена.
+    """
+    value = request.META.get(HEADER)
+    if value:
+        try:
+            signing.TimestampSigner(salt=SALT).unsign(
+                value,
+                max_age=settings.PROFILE_TOKEN_MAX_AGE,
+            )
+            return True
+        except signing.BadSignature:
+            pass
+    if 'profile' in request.GET and request.user.is_staff:
+        return True
+    rate = settings.PROFILE_SAMPLE_RATE
+    return bool(rate) and random.randrange(rate) == 0
+
+
+def collapse(frame: Optional[FrameType]) -> str:
+    """Стек в формате collapsed stacks: от корня к листу через `;`."""
+    names = []
+    while frame is not None:
+        module = frame.f_globals.get('__name__', '?')
+        names.append(f'{module}:{frame.f_code.co_name}')
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class Sampler(threading.Thread):
+    """Раз в `interval` секунд снимает стек потока `target`."""
+
+    def __init__(self, target: int, interval: float) -> None:
+        super().__init__(name='profiler', daemon=True)
+        self.target = target
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.done = threading.Event()
+
+    def run(self) -> None:
+        while not self.done.wait(self.interval):
+            frame = sys._current_frames().get(self.target)
+            if frame is not None:
+                self.stacks[collapse(frame)] += 1
+
+    def stop(self) -> None:
+        self.done.set()
+        self.join()
+
+
+class Report:
+    def __init__(self, request: HttpRequest) -> None:
+        self.request = request
+        self.name = f'{time.strftime("%Y%m%d-%H%M%S")}-{uuid.uuid4().hex[:8]}'
+        self.status = HTTPStatus.INTERNAL_SERVER_ERROR
+
+    def write(
+        self,
+        duration: float,
+        stacks: Counter,
+        log: queries.QueryLog,
+    ) -> None:
+        os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+        path = os.path.join(settings.PROFILE_DIR, self.name)
+        with open(f'{path}.folded', 'w') as file_:
+            for stack, count in stacks.most_common():
+                file_.write(f'{stack} {count}\n')
+        match = self.request.resolver_match
+        with open(f'{path}.json', 'w') as file_:
+            json.dump(
+                {
+                    'method': self.request.method,
+                    'path': self.request.get_full_path(),
+                    'view': match.view_name if match else '',
+                    'status': self.status,
+                    'duration': duration,
+                    'interval': settings.PROFILE_INTERVAL,
+                    'samples': sum(stacks.values()),
+                    'db_duration': log.duration,
+                    'queries': [
+                        {'sql': sql, 'duration': query_duration}
+                        for sql, query_duration in log.statements
+                    ],
+                },
+                file_,
+                ensure_ascii=False,
+                indent=2,
+            )
+
+
+@contextmanager
+def profile(request: HttpRequest) -> Iterator[Report]:
+    """Профилирует блок, обрабатывающий запрос, и пишет отчёт.
+
+    В `PROFILE_DIR` появляются `<имя>.folded` для flamegraph.pl или
+    speedscope и `<имя>.json` со временем SQL-запросов. Код ответа блок
+    сохраняет в `status` полученного отчёта.
+    """
+    report = Report(request)
+    sampler = Sampler(threading.get_ident(), settings.PROFILE_INTERVAL)
+    started = time.perf_counter()
+    sampler.start()
+    try:
+        with queries.capture(keep=True) as log:
+            yield report
+    finally:
+        sampler.stop()
+        report.write(time.perf_counter() - started, sampler.stacks, log)
@@ -0,0 +1,106 @@
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import connections
+
+IN_LIST = re.compile(r'\(\s*%s(?:\s*,\s*%s)*\s*\)')
+
+TRANSACTION_CONTROL = re.compile(
+    r'\s*(?:BEGIN|COMMIT|ROLLBACK|SAVEPOINT|RELEASE)\b',
+    re.IGNORECASE,
+)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def shape(sql: str) -> str:
+    """Запрос без значений: списки IN любой длины считаются одинаковыми."""
+    return IN_LIST.sub('(%s, …)', sql)
+
+
+class QueryLog:
+    """Обёртка `execute_wrapper`, считающая запросы, их время и формы.
+
+    С `keep=True` сохраняет и сами запросы с их временем.
+    """
+
+    def __init__(self, keep: bool = False) -> None:
+        self.count = 0
+        self.duration = 0.0
+        self.shapes: Counter = Counter()
+        self.statements: Optional[List[Tuple[str, float]]] = (
+            [] if keep else None
+        )
+
+    def __call__(
+        self,
+        execute: Callable,
+        sql: str,
+        params,
+        many: bool,
+        context,
+    ):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            self.duration += duration
+            self.count += 1
+            # управление транзакциями повторяется законно, это не N+1
+            if not TRANSACTION_CONTROL.match(sql):
+                self.shapes[shape(sql)] += 1
+            if self.statements is not None:
+                self.statements.append((sql, duration))
+
+    def repeated(self, limit: int) -> List[str]:
+        return [sql for sql, count in self.shapes.items() if count > limit]
+
+
+@contextmanager
+def capture(keep: bool = False) -> Iterator[QueryLog]:
+    """Считает запросы ко всем базам внутри блока, в том числе без DEBUG."""
+    log = QueryLog(keep)
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(log))
+        yield log
+
+
+def problems(log: QueryLog, view_name: Optional[str]) -> List[str]:
+    """Превышение бюджета представления и повторяющиеся запросы (N+1).
+
+    Бюджет берётся из `QUERY_BUDGETS` по имени URL, для остальных
+    представлений действует `QUERY_BUDGET_DEFAULT`. Запрос одной формы,
+    выполненный больше `QUERY_REPEAT_LIMIT` раз, считается N+1.
+    """
+    found = []
+    budget = settings.QUERY_BUDGETS.get(
+        view_name,
+        settings.QUERY_BUDGET_DEFAULT,
+    )
+    if log.count > budget:
+        found.append(
+            f'{view_name}: {log.count} запросов при бюджете {budget}',
+        )
+    for sql in log.repeated(settings.QUERY_REPEAT_LIMIT):
+        found.append(
+            f'{view_name}: запрос выполнен {log.shapes[sql]} раз: {sql}',
+        )
+    return found
+
+
+@contextmanager
+def assert_budget(view_name: Optional[str] = None) -> Iterator[QueryLog]:
+    """Проверка для тестов: блок укладывается в бюджет и не содержит N+1."""
+    with capture() as log:
+        yield log
+    found = problems(log, view_name)
+    if found:
+        raise QueryBudgetExceeded('\n'.join(found))
@@ -0,0 +1,155 @@
+import hashlib
+import os
+import re
+import uuid
+from typing import Iterable, Iterator, NamedTuple, Optional
+
+from django.core.files.base import File
+from django.core.files.storage import FileSystemStorage, Storage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from core.models import StoredFile
+
+HASHED_NAME = re.compile(
+    r'(?:^|/)[0-9a-f]{2}/[0-9a-f]{2}/(?P<digest>[0-9a-f]{64})(\.\w+)?$',
+)
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранилище, в котором имя файла - SHA-256 его содержимого.
+
+    Файл `posts/photo.jpg` сохраняется как `posts/ab/cd/abcd….jpg`:
+    два уровня каталогов по первым байтам хэша не дают одному каталогу
+    разрастись, а одинаковые загрузки попадают в один и тот же файл.
+    Число ссылок на файл ведёт `StoredFile` (см. `retain` и `release`).
+    """
+
+    def get_available_name(
+        self,
+        name: str,
+        max_length: Optional[int] = None,
+    ) -> str:
+        # одинаковое имя означает одинаковое содержимое
+        return name
+
+    def _save(self, name: str, content: File) -> str:
+        name = self.hashed_name(name, content)
+        if self.exists(name):
+            return name
+        # FileSystemStorage при занятом имени просит другое у
+        # get_available_name и зациклится, поэтому файл пишется под
+        # временным именем и атомарно переносится: если такое же
+        # содержимое успели сохранить параллельно, оно просто заменится
+        temporary = super()._save(
+            os.path.join(os.path.dirname(name), f'.{uuid.uuid4().hex}.tmp'),
+            content,
+        )
+        os.replace(self.path(temporary), self.path(name))
+        return name
+
+    @staticmethod
+    def hashed_name(name: str, content: File) -> str:
+        digest = hashlib.sha256()
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        for chunk in content.chunks():
+            digest.update(chunk)
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        digest = digest.hexdigest()
+        directory, basename = os.path.split(name)
+        return os.path.join(
+            directory,
+            digest[:2],
+            digest[2:4],
+            digest + os.path.splitext(basename)[1].lower(),
+        )
+
+
+def is_hashed(name: str) -> bool:
+    return bool(HASHED_NAME.search(name))
+
+
+def retain(name: str, count: int = 1) -> None:
+    if not name or not is_hashed(name):
+        return
+    stored = StoredFile.objects.filter(name=name)
+    with transaction.atomic():
+        if stored.update(refs=F('refs') + count):
+            return
+        try:
+            with transaction.atomic():
+                StoredFile.objects.create(name=name, refs=count)
+        except IntegrityError:
+            stored.update(refs=F('refs') + count)
+
+
+def release(name: str, storage: Storage) -> None:
+    """Уменьшает число ссылок и удаляет файл, когда ссылок не осталось."""
+    if not name or not is_hashed(name):
+        return
+    with transaction.atomic():
+        stored = (
+            StoredFile.objects.select_for_update().filter(name=name).first()
+        )
+        if stored is None:
+            return
+        if stored.refs > 1:
+            StoredFile.objects.filter(name=name).update(refs=F('refs') - 1)
+            return
+        stored.delete()
+        transaction.on_commit(lambda: _delete_unused(name, storage))
+
+
+def _delete_unused(name: str, storage: Storage) -> None:
+    # пока транзакция шла, такой же файл могли загрузить снова
+    if not StoredFile.objects.filter(name=name).exists():
+        storage.delete(name)
+
+
+class StoredEntry(NamedTuple):
+    name: str
+    size: int
+    modified: float
+
+
+def walk(storage: FileSystemStorage, directory: str) -> Iterator[StoredEntry]:
+    """Файлы каталога хранилища по возрастанию имени, без списка в памяти.
+
+    Соседние записи сортируются так, будто у каталогов в конце имени
+    стоит `/`, поэтому порядок полных имён совпадает с обычным
+    сравнением строк и с `ORDER BY` по имени файла в базе.
+    """
+    try:
+        entries = list(os.scandir(storage.path(directory)))
+    except FileNotFoundError:
+        return
+    entries.sort(key=lambda entry: entry.name + '/' * entry.is_dir())
+    for entry in entries:
+        name = f'{directory}/{entry.name}'
+        if entry.is_dir(follow_symlinks=False):
+            yield from walk(storage, name)
+        elif entry.is_file(follow_symlinks=False):
+            stat = entry.stat()
+            yield StoredEntry(name, stat.st_size, stat.st_mtime)
+
+
+def unreferenced(
+    entries: Iterable[StoredEntry],
+    referenced: Iterable[str],
+) -> Iterator[StoredEntry]:
+    """Слияние двух отсортированных потоков: файлы, на которые нет ссылок."""
+    referenced = iter(referenced)
+    current = previous = next(referenced, None)
+    for entry in entries:
+        while current is not None and current < entry.name:
+            current = next(referenced, None)
+            if current is not None and current < previous:
+                raise ValueError(
+                    'имена файлов из базы должны идти в порядке сравнения '
+                    'строк, проверьте сортировку (collation) столбца',
+                )
+            previous = current
+        if current != entry.name:
+            yield entry
@@ -1,4 +1,7 @@
+from typing import List, Union
+
 from django import forms, template
+from django.core.paginator import Page
 from django.http import HttpResponse
 
 register = template.Library()
@@ -11,3 +14,8 @@ def addclass(field: forms.Field, css) -> HttpResponse:
             'class': css,
         },
     )
+
+
+@register.filter
+def elided_page_range(page: Page) -> List[Union[int, str]]:
+    return list(page.paginator.get_elided_page_range(page.number))
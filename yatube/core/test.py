@@ -1,10 +1,35 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
 from http import HTTPStatus
+from unittest import mock, skipUnless
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.test import TestCase
-from django.urls import reverse
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.http import HttpRequest, HttpResponse
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.urls import get_resolver, reverse
+from django.utils.http import urlsafe_base64_encode
+from mixer.backend.django import mixer
 
+from core import metrics, profiling, queries, thumbnails
+from core.cache import (
+    bump_versions,
+    conditional_page,
+    get_versions,
+    page_cache_key,
+    versioned_cache_page,
+)
+from core.paginator import CachedCountPaginator, KeysetPage, KeysetPaginator
 from posts.models import Group, Post
+from posts.tests.common import image
 
 User = get_user_model()
 
@@ -53,6 +78,707 @@ class PaginatorViewsTest(TestCase):
                 self.assertEqual(len(response.context['page_obj']), template)
 
 
+class CachedCountPaginatorTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='test_count')
+        for num in range(13):
+            Post.objects.create(author=cls.user, text=f'Тестовый пост {num}')
+
+    def setUp(self):
+        cache.clear()
+        # версии таблиц повышаются после фиксации транзакции
+        patcher = mock.patch(
+            'django.db.transaction.on_commit',
+            side_effect=lambda callback: callback(),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_count_is_cached(self) -> None:
+        self.assertEqual(CachedCountPaginator(Post.objects.all(), 5).count, 13)
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                CachedCountPaginator(Post.objects.all(), 5).count,
+                13,
+            )
+
+    def test_count_invalidated_on_create_and_delete(self) -> None:
+        CachedCountPaginator(Post.objects.all(), 5).count
+        post = Post.objects.create(author=self.user, text='Новый пост')
+        self.assertEqual(CachedCountPaginator(Post.objects.all(), 5).count, 14)
+        post.delete()
+        self.assertEqual(CachedCountPaginator(Post.objects.all(), 5).count, 13)
+
+    def test_count_estimated_above_threshold(self) -> None:
+        paginator = CachedCountPaginator(
+            Post.objects.all(),
+            5,
+            estimate_threshold=10,
+        )
+        self.assertEqual(paginator.count, 13)
+        Post.objects.create(author=self.user, text='Новый пост')
+        paginator = CachedCountPaginator(
+            Post.objects.all(),
+            5,
+            estimate_threshold=10,
+        )
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                paginator.count,
+                13,
+                'оценка выше порога должна браться из кэша',
+            )
+
+    def test_elided_page_range(self) -> None:
+        paginator = CachedCountPaginator(range(1000), 10)
+        ellipsis = CachedCountPaginator.ELLIPSIS
+        self.assertEqual(
+            list(paginator.get_elided_page_range(50)),
+            [1, 2, ellipsis, 47, 48, 49, 50, 51, 52, 53, ellipsis, 99, 100],
+        )
+        self.assertEqual(
+            list(paginator.get_elided_page_range(1)),
+            [1, 2, 3, 4, ellipsis, 99, 100],
+        )
+
+    def test_paginator_renders_window_of_links(self) -> None:
+        for num in range(300):
+            Post.objects.create(author=self.user, text=f'Пост {num}')
+        response = self.client.get(
+            reverse('posts:profile', args=(self.user.username,)) + '?page=15',
+        )
+        self.assertContains(response, 'class="page-link"', count=17)
+
+
+class KeysetPaginatorTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='test_keyset')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_keyset',
+            description='Тестовое описание',
+        )
+        cls.posts = [
+            Post.objects.create(
+                author=cls.user,
+                text=f'Тестовый пост {num}',
+                group=cls.group,
+            )
+            for num in range(13)
+        ][::-1]
+
+    def setUp(self):
+        self.paginator = KeysetPaginator(Post.objects.all(), 5)
+
+    def test_pages_follow_each_other(self) -> None:
+        first = self.paginator.page()
+        second = self.paginator.page(after=first.next_cursor)
+        third = self.paginator.page(after=second.next_cursor)
+        self.assertEqual(
+            list(first) + list(second) + list(third),
+            self.posts,
+            'страницы по курсору не покрывают ленту по порядку',
+        )
+        self.assertFalse(first.has_previous())
+        self.assertTrue(third.has_previous())
+        self.assertFalse(third.has_next())
+
+    def test_previous_cursor_returns_previous_page(self) -> None:
+        first = self.paginator.page()
+        second = self.paginator.page(after=first.next_cursor)
+        previous = self.paginator.page(before=second.previous_cursor)
+        self.assertEqual(list(previous), list(first))
+        self.assertFalse(previous.has_previous())
+        self.assertEqual(previous.next_cursor, first.next_cursor)
+
+    def test_invalid_cursor_returns_first_page(self) -> None:
+        impossible = urlsafe_base64_encode(b'["2020-13-45T00:00:00", 1]')
+        huge = urlsafe_base64_encode(b'["2020-01-01T00:00:00", 1e400]')
+        mistyped = (
+            b'["2020-01-01T00:00:00", "2020-01-01T00:00:00"]',
+            b'[1, "2020-01-01T00:00:00"]',
+            b'["2020-01-01T00:00:00", null]',
+            b'["2020-01-01T00:00:00", [1]]',
+        )
+        for cursor in (
+            'garbage',
+            'W10',
+            'WyJ4IiwgMV0',
+            impossible,
+            huge,
+            *map(urlsafe_base64_encode, mistyped),
+        ):
+            with self.subTest(cursor=cursor):
+                page = self.paginator.get_page(after=cursor)
+                self.assertEqual(list(page), self.posts[:5])
+
+    @override_settings(FEED_KEYSET_PAGINATION=True)
+    def test_malformed_cursor_in_views(self) -> None:
+        cursors = (
+            b'["2020-13-45T00:00:00", 1]',
+            b'["2020-01-01T00:00:00", "2020-01-01T00:00:00"]',
+            b'[0.5, "x"]',
+        )
+        for address, params in (
+            (reverse('posts:post_comments', args=(self.posts[0].id,)), {}),
+            (reverse('posts:post_search'), {'q': 'пост'}),
+            (reverse('posts:post_search'), {'q': 'x'}),
+            (reverse('posts:index'), {}),
+        ):
+            for cursor in map(urlsafe_base64_encode, cursors):
+                with self.subTest(address=address, cursor=cursor):
+                    response = self.client.get(
+                        address,
+                        {**params, 'after': cursor},
+                    )
+                    self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_deep_page_costs_single_query(self) -> None:
+        page = self.paginator.page()
+        while page.has_next():
+            with self.assertNumQueries(1):
+                page = self.paginator.page(after=page.next_cursor)
+
+    @override_settings(FEED_KEYSET_PAGINATION=True)
+    def test_feed_views_use_cursor_pages(self) -> None:
+        templates = (
+            ('posts:index', None),
+            ('posts:group_list', (self.group.slug,)),
+            ('posts:profile', (self.user.username,)),
+        )
+        for views, args in templates:
+            with self.subTest(views=views):
+                cache.clear()
+                response = self.client.get(reverse(views, args=args))
+                page = response.context['page_obj']
+                self.assertIsInstance(page, KeysetPage)
+                self.assertEqual(len(page), 10)
+                self.assertContains(response, f'?after={page.next_cursor}')
+                response = self.client.get(
+                    reverse(views, args=args) + f'?after={page.next_cursor}',
+                )
+                self.assertEqual(len(response.context['page_obj']), 3)
+
+
+class VersionedCachePageTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+        self.request = self.get()
+
+    def get(self, **extra) -> HttpRequest:
+        request = RequestFactory().get('/cached/', **extra)
+        request.user = AnonymousUser()
+        return request
+
+    def view(self, request: HttpRequest) -> HttpResponse:
+        self.calls += 1
+        return HttpResponse(f'страница {self.calls}')
+
+    def cached(self, **kwargs):
+        return versioned_cache_page(
+            60,
+            'test',
+            lambda request: ('test:scope',),
+            **kwargs,
+        )(self.view)
+
+    def test_fresh_copy_served_from_cache(self) -> None:
+        view = self.cached(beta=0)
+        view(self.request)
+        response = view(self.request)
+        self.assertEqual(response.content.decode(), 'страница 1')
+        self.assertEqual(self.calls, 1)
+
+    def test_bump_regenerates_page(self) -> None:
+        view = self.cached(beta=0)
+        view(self.request)
+        bump_versions('test:scope')
+        self.assertEqual(view(self.request).content.decode(), 'страница 2')
+
+    def test_stale_copy_served_while_locked(self) -> None:
+        view = self.cached(beta=0)
+        view(self.request)
+        bump_versions('test:scope')
+        cache.add(f'{page_cache_key("test", self.request)}:lock', True)
+        response = view(self.request)
+        self.assertEqual(response.content.decode(), 'страница 1')
+        self.assertEqual(self.calls, 1, 'страница перестроена без блокировки')
+
+    def test_stale_copy_keeps_its_validators(self) -> None:
+        view = conditional_page(lambda request: (None, ('test:scope',)))(
+            self.cached(beta=0),
+        )
+        first = view(self.request)
+        bump_versions('test:scope')
+        cache.add(f'{page_cache_key("test", self.request)}:lock', True)
+        stale = view(self.get())
+        self.assertEqual(stale.content.decode(), 'страница 1')
+        self.assertEqual(stale['ETag'], first['ETag'])
+        cache.delete(f'{page_cache_key("test", self.request)}:lock')
+        response = view(self.get(HTTP_IF_NONE_MATCH=stale['ETag']))
+        self.assertEqual(
+            response.status_code,
+            HTTPStatus.OK,
+            '304 на устаревшую копию после перестроения страницы',
+        )
+        self.assertEqual(response.content.decode(), 'страница 2')
+
+    @override_settings(PAGE_CACHE_LOCK_WAIT=0.1)
+    def test_page_rendered_when_lock_held_without_copy(self) -> None:
+        cache.add(f'{page_cache_key("test", self.request)}:lock', True)
+        response = self.cached(beta=0)(self.request)
+        self.assertEqual(response.content.decode(), 'страница 1')
+
+    def test_early_refresh(self) -> None:
+        view = self.cached(beta=10**9)
+        view(self.request)
+        key = page_cache_key('test', self.request)
+        entry = cache.get(key)
+        entry['delta'] = 1.0
+        cache.set(key, entry)
+        view(self.request)
+        self.assertEqual(self.calls, 2, 'XFetch не обновил копию заранее')
+
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailBackendTest(TestCase):
+    geometry = '960x339'
+    options = {'crop': 'center', 'upscale': True}
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.name = default_storage.save('posts/source.gif', image())
+        self.backend = thumbnails.EagerThumbnailBackend()
+
+    def get_thumbnail(self):
+        return self.backend.get_thumbnail(
+            Post(image=self.name).image,
+            self.geometry,
+            **self.options,
+        )
+
+    def test_pregenerated_thumbnail_used(self) -> None:
+        thumbnails.pregenerate(Post(image=self.name).image)
+        with mock.patch.object(
+            thumbnails.EagerThumbnailBackend,
+            'generate_many',
+        ) as generate:
+            thumbnail = self.get_thumbnail()
+        generate.assert_not_called()
+        self.assertNotIsInstance(thumbnail, thumbnails.Placeholder)
+        self.assertTrue(default_storage.exists(thumbnail.name))
+
+    @override_settings(THUMBNAIL_WORKERS=2)
+    def test_missing_thumbnail_queued_once(self) -> None:
+        pool = mock.Mock()
+        with mock.patch.object(thumbnails, 'executor', return_value=pool):
+            first = self.get_thumbnail()
+            second = self.get_thumbnail()
+        self.assertIsInstance(first, thumbnails.Placeholder)
+        self.assertIsInstance(second, thumbnails.Placeholder)
+        self.assertEqual((first.width, first.height), (960, 339))
+        self.assertTrue(first.url.startswith('data:image/svg+xml,'))
+        pool.submit.assert_called_once()
+        pool.submit.call_args[0][0](
+            *pool.submit.call_args[0][1:],
+            **pool.submit.call_args[1],
+        )
+        self.assertNotIsInstance(
+            self.get_thumbnail(),
+            thumbnails.Placeholder,
+        )
+
+    @override_settings(THUMBNAIL_WORKERS=2)
+    def test_ready_thumbnail_bumps_only_its_pages(self) -> None:
+        scopes = ('test:post', 'test:other')
+        versions = get_versions(scopes)
+        pool = mock.Mock()
+        with mock.patch.object(thumbnails, 'executor', return_value=pool):
+            thumbnails.prefetch(
+                (Post(image=self.name),),
+                scopes=lambda post: ('test:post',),
+            )
+        for _, kwargs in pool.submit.call_args_list:
+            self.assertEqual(kwargs, {'scopes': ('test:post',)})
+        args, kwargs = pool.submit.call_args
+        args[0](*args[1:], **kwargs)
+        found = get_versions(scopes)
+        self.assertNotEqual(found['test:post'], versions['test:post'])
+        self.assertEqual(found['test:other'], versions['test:other'])
+
+    def test_prefetch_page_in_one_lookup(self) -> None:
+        posts = [Post(image=self.name), Post(), Post(image=self.name)]
+        thumbnails.pregenerate(Post(image=self.name).image)
+        cache.clear()
+        with self.assertNumQueries(1):
+            thumbnails.prefetch(posts)
+        with self.assertNumQueries(0):
+            thumbnails.prefetch(posts)
+        self.assertEqual(posts[1].thumbnails, {})
+        self.assertEqual(
+            posts[0].thumbnails['original-960'].url,
+            self.get_thumbnail().url,
+        )
+        self.assertNotIsInstance(
+            posts[2].thumbnails['webp-320'],
+            thumbnails.Placeholder,
+        )
+        self.assertTrue(
+            posts[2].thumbnails['webp-320'].name.endswith('.webp'),
+        )
+
+    def test_picture_srcset(self) -> None:
+        post = Post(image=self.name)
+        thumbnails.prefetch((post,))
+        picture = post.picture
+        self.assertEqual((picture.width, picture.height), (960, 339))
+        self.assertEqual(picture.sources[0].type, 'image/webp')
+        for srcset in (picture.sources[0].srcset, picture.srcset):
+            with self.subTest(srcset=srcset):
+                self.assertEqual(
+                    [entry.split()[-1] for entry in srcset.split(', ')],
+                    ['320w', '640w', '960w'],
+                )
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class MediaServeTest(TestCase):
+    content = bytes(range(256)) * 4
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.name = default_storage.save(
+            f'posts/ab/ab/{"ab" * 32}.png',
+            ContentFile(cls.content),
+        )
+        cls.url = settings.MEDIA_URL + cls.name
+
+    def test_full_file_with_validators(self) -> None:
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertEqual(response['Content-Length'], str(len(self.content)))
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn('immutable', response['Cache-Control'])
+        response = self.client.get(
+            self.url,
+            HTTP_IF_NONE_MATCH=response['ETag'],
+        )
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+
+    def test_byte_ranges(self) -> None:
+        ranges = (
+            ('bytes=10-19', 10, 19),
+            ('bytes=1000-', 1000, 1023),
+            ('bytes=-4', 1020, 1023),
+            ('bytes=1020-5000', 1020, 1023),
+        )
+        for header, start, end in ranges:
+            stop = end + 1
+            with self.subTest(header=header):
+                response = self.client.get(self.url, HTTP_RANGE=header)
+                self.assertEqual(
+                    response.status_code,
+                    HTTPStatus.PARTIAL_CONTENT,
+                )
+                self.assertEqual(
+                    b''.join(response.streaming_content),
+                    self.content[start:stop],
+                )
+                self.assertEqual(
+                    response['Content-Range'],
+                    f'bytes {start}-{end}/{len(self.content)}',
+                )
+                self.assertEqual(response['Content-Length'], str(stop - start))
+        response = self.client.get(self.url, HTTP_RANGE='bytes=2000-')
+        self.assertEqual(
+            response.status_code,
+            HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE,
+        )
+        response = self.client.get(
+            self.url,
+            HTTP_RANGE='bytes=0-9',
+            HTTP_IF_RANGE='"stale"',
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_missing_and_outside_files(self) -> None:
+        for path in ('posts/nope.png', '../settings.py', 'posts'):
+            with self.subTest(path=path):
+                response = self.client.get(settings.MEDIA_URL + path)
+                self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+
+@override_settings(QUERY_BUDGET_STRICT=True, MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class QueryBudgetTest(TestCase):
+    namespaces = ('posts', 'users', 'about')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user, cls.author = mixer.cycle(2).blend(User)
+        cls.group = mixer.blend('posts.group')
+        cls.posts = mixer.cycle(12).blend(
+            'posts.post',
+            author=cls.author,
+            group=cls.group,
+            image='',
+        )
+        cls.post = cls.posts[-1]
+        mixer.cycle(5).blend('posts.comment', post=cls.post)
+        mixer.blend('posts.follow', user=cls.user, author=cls.author)
+        cls.kwargs = {
+            'id': cls.post.id,
+            'slug': cls.group.slug,
+            'username': cls.author.username,
+        }
+
+    def setUp(self) -> None:
+        cache.clear()
+
+    def addresses(self):
+        resolver = get_resolver()
+        for namespace in self.namespaces:
+            for pattern in resolver.namespace_dict[namespace][1].url_patterns:
+                kwargs = {
+                    name: self.kwargs[name]
+                    for name in pattern.pattern.converters
+                }
+                yield f'{namespace}:{pattern.name}', kwargs
+
+    def test_views_within_budget(self) -> None:
+        clients = {'anon': Client(), 'auth': Client()}
+        clients['auth'].force_login(self.user)
+        for name, kwargs in self.addresses():
+            # выход из аккаунта разлогинил бы клиента для остальных адресов
+            if name == 'users:logout':
+                continue
+            for client_name, client in clients.items():
+                with self.subTest(name=name, client=client_name):
+                    response = client.get(
+                        reverse(name, kwargs=kwargs),
+                        {'q': 'a'},
+                    )
+                    self.assertLess(response.status_code, 500)
+
+    def test_writes_within_budget(self) -> None:
+        client = Client()
+        client.force_login(self.user)
+        other = mixer.blend(User)
+        requests = (
+            (
+                'posts:post_create',
+                {},
+                {'text': 'Пост', 'group': self.group.id, 'image': image()},
+            ),
+            ('posts:add_comment', {'id': self.post.id}, {'text': 'Коммент'}),
+            # первая подписка создаёт счётчики и ленту
+            ('posts:profile_follow', {'username': other.username}, None),
+            ('posts:profile_unfollow', {'username': other.username}, None),
+        )
+        # колбэки on_commit в TestCase не вызываются, а в работе
+        # выполняются в том же запросе
+        with mock.patch(
+            'django.db.transaction.on_commit',
+            side_effect=lambda callback: callback(),
+        ):
+            for name, kwargs, data in requests:
+                with self.subTest(name=name):
+                    address = reverse(name, kwargs=kwargs)
+                    if data is None:
+                        response = client.get(address)
+                    else:
+                        response = client.post(address, data)
+                    self.assertEqual(response.status_code, HTTPStatus.FOUND)
+        post = Post.objects.latest('id')
+        thumbnails.prefetch((post,))
+        self.assertNotIsInstance(
+            post.thumbnails['webp-320'],
+            thumbnails.Placeholder,
+        )
+        response = client.post(
+            reverse('posts:post_edit', kwargs={'id': post.id}),
+            {'text': 'Новый текст', 'group': ''},
+        )
+        self.assertEqual(response.status_code, HTTPStatus.FOUND)
+
+    def test_repeated_queries_detected(self) -> None:
+        with self.assertRaises(queries.QueryBudgetExceeded) as raised:
+            with queries.assert_budget():
+                for post in Post.objects.all()[:5]:
+                    post.author.username
+        self.assertIn('выполнен 5 раз', str(raised.exception))
+        with queries.assert_budget() as log:
+            list(Post.objects.filter(id__in=(1, 2)))
+            list(Post.objects.filter(id__in=(1, 2, 3)))
+        self.assertEqual(len(log.shapes), 1)
+        self.assertEqual(log.count, 2)
+        with queries.assert_budget() as log:
+            for _ in range(5):
+                with transaction.atomic():
+                    pass
+        self.assertEqual(log.count, 10, 'SAVEPOINT и RELEASE не учтены')
+        self.assertEqual(len(log.shapes), 0)
+
+
+class MetricsTest(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+
+    def samples(self, text: str):
+        return dict(
+            line.rsplit(' ', 1)
+            for line in text.splitlines()
+            if not line.startswith('#')
+        )
+
+    @override_settings(METRICS_ALLOWED_IPS=['127.0.0.1'])
+    def test_request_metrics_exported(self) -> None:
+        before = self.samples(metrics.render(metrics.collect()))
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('posts:index'))
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response['Content-Type'], metrics.CONTENT_TYPE)
+        after = self.samples(response.content.decode())
+        view = 'view="posts:index"'
+        for sample in (
+            f'yatube_requests_total{{{view},method="GET",status="200"}}',
+            f'yatube_request_duration_seconds_count{{{view}}}',
+            f'yatube_request_duration_seconds_bucket{{{view},le="+Inf"}}',
+            f'yatube_db_queries_count{{{view}}}',
+            f'yatube_template_duration_seconds_count{{{view}}}',
+        ):
+            with self.subTest(sample=sample):
+                self.assertEqual(
+                    float(after[sample]) - float(before.get(sample, 0)),
+                    2,
+                )
+        hits = f'yatube_cache_reads_total{{{view},result="hit"}}'
+        self.assertGreater(float(after[hits]), float(before.get(hits, 0)))
+        response = self.client.get(reverse('metrics'), REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+    def test_metrics_disabled_by_default(self) -> None:
+        self.assertEqual(settings.METRICS_ALLOWED_IPS, [])
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+    def test_file_store_grows_and_merges(self) -> None:
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        first = metrics.FileStore(os.path.join(directory, '1.db'))
+        keys = [f'{num}:' + 'x' * 200 for num in range(500)]
+        for key in keys:
+            first.add(key, 1.0)
+        first.add(keys[0], 0.5)
+        self.assertGreater(first.capacity, metrics.FileStore.INITIAL_SIZE)
+        metrics.FileStore(os.path.join(directory, '2.db')).add(keys[0], 2)
+        reopened = metrics.FileStore(os.path.join(directory, '1.db'))
+        self.assertEqual(reopened.values(), first.values())
+        total = metrics.merged(directory)
+        self.assertEqual(len(total), len(keys))
+        self.assertEqual(total[keys[0]], 3.5)
+
+    @skipUnless(hasattr(os, 'fork'), 'нужен fork')
+    def test_worker_processes_share_directory(self) -> None:
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        with override_settings(METRICS_DIR=directory):
+            for _ in range(2):
+                pid = os.fork()
+                if pid == 0:
+                    metrics.requests.inc('posts:index', 'GET', '200')
+                    os._exit(0)
+                os.waitpid(pid, 0)
+            text = metrics.render(metrics.collect())
+        self.assertIn(
+            'yatube_requests_total{view="posts:index",method="GET",'
+            'status="200"} 2.0',
+            text,
+        )
+
+
+class ProfilingTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.profile_dir = tempfile.mkdtemp()
+        cls.staff = mixer.blend(User, is_staff=True)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.profile_dir, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self) -> None:
+        cache.clear()
+
+    def profiled(self, client: Client, data=None, **extra):
+        with override_settings(
+            PROFILE_DIR=self.profile_dir,
+            PROFILE_INTERVAL=0.0005,
+        ):
+            response = client.get(reverse('posts:index'), data, **extra)
+        return response.get(profiling.RESPONSE_HEADER)
+
+    def test_report_written(self) -> None:
+        staff = Client()
+        staff.force_login(self.staff)
+        name = self.profiled(staff, {'profile': ''})
+        self.assertIsNotNone(name)
+        path = os.path.join(self.profile_dir, name)
+        with open(f'{path}.json') as file_:
+            report = json.load(file_)
+        self.assertEqual(report['view'], 'posts:index')
+        self.assertEqual(report['status'], HTTPStatus.OK)
+        self.assertTrue(report['queries'])
+        with open(f'{path}.folded') as file_:
+            lines = file_.read().splitlines()
+        self.assertEqual(len(lines) > 0, report['samples'] > 0)
+        for line in lines:
+            stack, count = line.rsplit(' ', 1)
+            self.assertTrue(count.isdigit())
+        self.assertTrue(
+            profiling.collapse(sys._getframe()).endswith(
+                'core.test:test_report_written',
+            ),
+        )
+
+    def test_request_selection(self) -> None:
+        self.assertIsNone(self.profiled(self.client, {'profile': ''}))
+        self.assertIsNone(self.profiled(self.client, HTTP_X_PROFILE='bad'))
+        self.assertIsNotNone(
+            self.profiled(self.client, HTTP_X_PROFILE=profiling.token()),
+        )
+        with override_settings(PROFILE_SAMPLE_RATE=1):
+            self.assertIsNotNone(self.profiled(self.client))
+
+
 class ViewTestClass(TestCase):
     def test_error_page(self) -> None:
         response = self.client.get('/unexisting_page/')
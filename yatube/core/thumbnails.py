@@ -0,0 +1,510 @@
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, NamedTuple, Optional, Tuple
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import Storage
+from django.db import connections
+from django.db.models import Model
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.helpers import deserialize, serialize
+from sorl.thumbnail.images import (
+    BaseImageFile,
+    DummyImageFile,
+    ImageFile,
+    deserialize_image_file,
+    serialize_image_file,
+)
+from sorl.thumbnail.kvstores import cached_db_kvstore
+from sorl.thumbnail.kvstores.base import add_prefix, del_prefix
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from core.cache import bump_versions
+from core.storage import StoredEntry
+
+logger = logging.getLogger(__name__)
+
+PENDING_KEY = 'thumbnail:pending:{}'
+
+MIME_TYPES = {'WEBP': 'image/webp'}
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+class Placeholder(DummyImageFile):
+    """Прозрачная заглушка нужного размера, пока миниатюра не готова."""
+
+    @property
+    def url(self) -> str:
+        return 'data:image/svg+xml,' + quote(
+            "<svg xmlns='http://www.w3.org/2000/svg' "
+            f"width='{self.x}' height='{self.y}'/>",
+        )
+
+
+class EagerThumbnailBackend(ThumbnailBackend):
+    """Бэкенд sorl-thumbnail, который никогда не создаёт миниатюры в запросе.
+
+    Готовая миниатюра берётся из хранилища ключей sorl, а отсутствующая
+    ставится в очередь фоновых потоков, и шаблон получает заглушку.
+    """
+
+    def get_thumbnail(
+        self,
+        file_: Any,
+        geometry_string: str,
+        **options,
+    ) -> BaseImageFile:
+        if not file_:
+            raise ValueError('falsey file_ argument in get_thumbnail()')
+        found = self.get_many((file_,), {None: (geometry_string, options)})
+        return found[ImageFile(file_).name][None]
+
+    def get_many(
+        self,
+        files: Iterable[Any],
+        aliases: Dict[Any, Tuple[str, Dict[str, Any]]],
+        scopes: Optional[Dict[str, Iterable[str]]] = None,
+    ) -> Dict[str, Dict[Any, BaseImageFile]]:
+        """Миниатюры всех вариантов `aliases` для нескольких файлов.
+
+        Возвращает {имя исходного файла: {псевдоним: миниатюра}}. Ключи всех
+        миниатюр читаются из кэша одним `get_many`, а промахи добираются из
+        таблицы хранилища sorl одним запросом. `scopes` - области кэша
+        страниц с каждым файлом, их версии повышаются, когда отсутствующая
+        миниатюра будет готова.
+        """
+        scopes = scopes or {}
+        keys, sources = {}, {}
+        for file_ in files:
+            source = sources[file_.name] = ImageFile(file_)
+            for alias, (geometry_string, options) in aliases.items():
+                name = self._get_thumbnail_filename(
+                    source,
+                    geometry_string,
+                    self._with_defaults(source, dict(options)),
+                )
+                keys[source.name, alias] = add_prefix(
+                    ImageFile(name, default.storage).key,
+                )
+        found = _get_raw_many(set(keys.values()))
+        thumbnails, missing = {}, {}
+        for (name, alias), key in keys.items():
+            geometry_string, options = aliases[alias]
+            if key in found:
+                thumbnail = deserialize_image_file(found[key])
+            else:
+                missing.setdefault(name, {})[alias] = aliases[alias]
+                thumbnail = Placeholder(geometry_string)
+            thumbnails.setdefault(name, {})[alias] = thumbnail
+        for name, source_aliases in missing.items():
+            schedule(sources[name], source_aliases, scopes.get(name, ()))
+        return thumbnails
+
+    def generate_many(
+        self,
+        source: ImageFile,
+        aliases: Dict[Any, Tuple[str, Dict[str, Any]]],
+    ) -> int:
+        """Создаёт недостающие миниатюры вариантов `aliases` одного файла.
+
+        Исходное изображение декодируется один раз, а записи хранилища sorl
+        читаются и пишутся пачками, а не несколькими запросами на каждый
+        вариант, как в `ThumbnailBackend.get_thumbnail`. Возвращает число
+        созданных миниатюр.
+        """
+        thumbnails = {}
+        for geometry_string, options in aliases.values():
+            options = self._with_defaults(source, dict(options))
+            thumbnail = ImageFile(
+                self._get_thumbnail_filename(source, geometry_string, options),
+                default.storage,
+            )
+            thumbnails[add_prefix(thumbnail.key)] = (
+                thumbnail,
+                geometry_string,
+                options,
+            )
+        source_key = add_prefix(source.key)
+        list_key = add_prefix(source.key, 'thumbnails')
+        found = _get_raw_many([*thumbnails, source_key, list_key])
+        missing = {
+            key: value for key, value in thumbnails.items() if key not in found
+        }
+        if not missing:
+            return 0
+        source_image = default.engine.get_image(source)
+        try:
+            source.set_size(default.engine.get_image_size(source_image))
+            image_info = default.engine.get_image_info(source_image)
+            for thumbnail, geometry_string, options in missing.values():
+                if (
+                    sorl_settings.THUMBNAIL_FORCE_OVERWRITE
+                    or not thumbnail.exists()
+                ):
+                    options['image_info'] = image_info
+                    self._create_thumbnail(
+                        source_image,
+                        geometry_string,
+                        options,
+                        thumbnail,
+                    )
+                    self._create_alternative_resolutions(
+                        source_image,
+                        geometry_string,
+                        options,
+                        thumbnail.name,
+                    )
+                else:
+                    thumbnail.set_size()
+        finally:
+            default.engine.cleanup(source_image)
+        values = {
+            key: serialize_image_file(thumbnail)
+            for key, (thumbnail, _, _) in missing.items()
+        }
+        if source_key not in found:
+            values[source_key] = serialize_image_file(source)
+        # список миниатюр файла нужен sorl, чтобы удалить их вместе с ним
+        listed = deserialize(found[list_key]) if list_key in found else []
+        values[list_key] = serialize(
+            sorted({*listed, *(del_prefix(key) for key in missing)}),
+        )
+        _set_raw_many(values)
+        return len(missing)
+
+    def _with_defaults(
+        self,
+        source: ImageFile,
+        options: Dict[str, Any],
+    ) -> Dict[str, Any]:
+        # те же умолчания, что и в ThumbnailBackend.get_thumbnail,
+        # иначе имя миниатюры не совпадёт с созданной в фоне
+        if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(sorl_settings, attr)
+            if value != getattr(sorl_defaults, attr):
+                options.setdefault(key, value)
+        return options
+
+
+def variant_alias(width: int, format_: Optional[str]) -> str:
+    return f'{(format_ or "original").lower()}-{width}'
+
+
+def variants() -> Dict[str, Tuple[str, Dict[str, Any]]]:
+    """Размеры и параметры sorl-thumbnail всех вариантов изображения поста."""
+    base_width, base_height = settings.POST_IMAGE_SIZE
+    aliases = {}
+    for format_ in settings.POST_IMAGE_FORMATS:
+        for width in settings.POST_IMAGE_WIDTHS:
+            options = dict(settings.POST_IMAGE_OPTIONS)
+            if format_:
+                options['format'] = format_
+            height = round(width * base_height / base_width)
+            aliases[variant_alias(width, format_)] = (
+                f'{width}x{height}',
+                options,
+            )
+    return aliases
+
+
+class Source(NamedTuple):
+    type: Optional[str]
+    srcset: str
+
+
+class Picture(NamedTuple):
+    sources: Tuple[Source, ...]
+    src: str
+    srcset: str
+    sizes: str
+    width: int
+    height: int
+
+
+def picture(thumbnails: Dict[str, BaseImageFile]) -> Optional[Picture]:
+    """Данные для <picture> с `srcset` по всем ширинам каждого формата.
+
+    Последний формат из `POST_IMAGE_FORMATS` используется в самом <img>,
+    остальные выводятся как <source> для браузеров, которые их понимают.
+    """
+    if not thumbnails:
+        return None
+    sources = []
+    for format_ in settings.POST_IMAGE_FORMATS:
+        files = [
+            thumbnails[variant_alias(width, format_)]
+            for width in settings.POST_IMAGE_WIDTHS
+        ]
+        sources.append(
+            Source(
+                type=MIME_TYPES.get(format_),
+                srcset=', '.join(f'{im.url} {im.width}w' for im in files),
+            ),
+        )
+    largest = files[-1]
+    return Picture(
+        sources=tuple(sources[:-1]),
+        src=largest.url,
+        srcset=sources[-1].srcset,
+        sizes=settings.POST_IMAGE_SIZES,
+        width=largest.width,
+        height=largest.height,
+    )
+
+
+def prefetch(
+    objects: Iterable[Model],
+    field: str = 'image',
+    aliases: Optional[Dict[str, Tuple[str, Dict[str, Any]]]] = None,
+    scopes: Optional[Callable[[Model], Iterable[str]]] = None,
+) -> None:
+    """Прикрепляет к объектам миниатюры всех вариантов и `picture`.
+
+    `thumbnails` - словарь {псевдоним: файл} по `aliases` (по умолчанию
+    все варианты изображения поста). Все варианты всей страницы читаются
+    одним обращением к кэшу, поэтому шаблонам не нужен тег {% thumbnail %}
+    для каждого поста. `scopes` возвращает области кэша страниц, на которых
+    виден объект: их перестроят, когда недостающие миниатюры будут готовы.
+    """
+    aliases = variants() if aliases is None else aliases
+    objects = list(objects)
+    files = [getattr(obj, field) for obj in objects if getattr(obj, field)]
+    found_scopes: Dict[str, set] = {}
+    if scopes is not None:
+        for obj in objects:
+            file_ = getattr(obj, field)
+            if file_:
+                # один файл может быть у нескольких объектов
+                found_scopes.setdefault(file_.name, set()).update(scopes(obj))
+    found = (
+        default.backend.get_many(files, aliases, found_scopes) if files else {}
+    )
+    for obj in objects:
+        file_ = getattr(obj, field)
+        obj.thumbnails = found[file_.name] if file_ else {}
+        obj.picture = picture(obj.thumbnails)
+
+
+def _get_raw_many(keys: Iterable[str]) -> Dict[str, str]:
+    kvstore = default.kvstore
+    if not isinstance(kvstore, cached_db_kvstore.KVStore):
+        found = {key: kvstore._get_raw(key) for key in keys}
+        return {key: value for key, value in found.items() if value}
+    keys = list(keys)
+    found = kvstore.cache.get_many(keys)
+    missing = [key for key in keys if key not in found]
+    if missing:
+        stored = dict(
+            KVStoreModel.objects.filter(key__in=missing).values_list(
+                'key',
+                'value',
+            ),
+        )
+        # отсутствие тоже кэшируется, как в самом хранилище sorl
+        kvstore.cache.set_many(
+            {
+                key: stored.get(key, cached_db_kvstore.EMPTY_VALUE)
+                for key in missing
+            },
+            sorl_settings.THUMBNAIL_CACHE_TIMEOUT,
+        )
+        found.update(stored)
+    return {
+        key: value
+        for key, value in found.items()
+        if value != cached_db_kvstore.EMPTY_VALUE
+    }
+
+
+def _set_raw_many(values: Dict[str, str]) -> None:
+    kvstore = default.kvstore
+    if not isinstance(kvstore, cached_db_kvstore.KVStore):
+        for key, value in values.items():
+            kvstore._set_raw(key, value)
+        return
+    existing = set(
+        KVStoreModel.objects.filter(key__in=values).values_list(
+            'key',
+            flat=True,
+        ),
+    )
+    # запись могла появиться в другом процессе, пока создавались миниатюры
+    KVStoreModel.objects.bulk_create(
+        [
+            KVStoreModel(key=key, value=value)
+            for key, value in values.items()
+            if key not in existing
+        ],
+        ignore_conflicts=True,
+    )
+    for key in existing:
+        KVStoreModel.objects.filter(key=key).update(value=values[key])
+    kvstore.cache.set_many(values, sorl_settings.THUMBNAIL_CACHE_TIMEOUT)
+
+
+def forget(name: str, storage: Storage) -> None:
+    """Удаляет файлы миниатюр исходного файла и его записи в хранилище sorl."""
+    default.kvstore.delete(ImageFile(name, storage))
+
+
+def missing_sources(batch_size: int) -> Iterable[ImageFile]:
+    """Исходные файлы с миниатюрами в хранилище sorl, которых нет на диске.
+
+    Ключи читаются пачками по возрастанию, поэтому найденные записи можно
+    удалять, не дожидаясь конца обхода.
+    """
+    prefix = add_prefix('', 'thumbnails')
+    last = prefix
+    while True:
+        keys = list(
+            KVStoreModel.objects.filter(
+                key__startswith=prefix,
+                key__gt=last,
+            )
+            .order_by('key')
+            .values_list('key', flat=True)[:batch_size],
+        )
+        if not keys:
+            return
+        last = keys[-1]
+        found = _get_raw_many(add_prefix(del_prefix(key)) for key in keys)
+        for value in found.values():
+            source = deserialize_image_file(value)
+            if not source.exists():
+                yield source
+
+
+def untracked(
+    entries: Iterable[StoredEntry],
+    batch_size: int,
+) -> Iterable[StoredEntry]:
+    """Файлы из каталога миниатюр, о которых не знает хранилище sorl."""
+    batch: Dict[str, StoredEntry] = {}
+    for entry in entries:
+        key = add_prefix(ImageFile(entry.name, default.storage).key)
+        batch[key] = entry
+        if len(batch) >= batch_size:
+            yield from _untracked(batch)
+            batch = {}
+    yield from _untracked(batch)
+
+
+def _untracked(batch: Dict[str, StoredEntry]) -> Iterable[StoredEntry]:
+    if not batch:
+        return
+    known = set(
+        KVStoreModel.objects.filter(key__in=batch).values_list(
+            'key',
+            flat=True,
+        ),
+    )
+    for key, entry in batch.items():
+        if key not in known:
+            yield entry
+
+
+def executor() -> Optional[ThreadPoolExecutor]:
+    global _executor
+    if not settings.THUMBNAIL_WORKERS:
+        return None
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                settings.THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails',
+            )
+    return _executor
+
+
+def schedule(
+    source: ImageFile,
+    aliases: Dict[Any, Tuple[str, Dict[str, Any]]],
+    scopes: Iterable[str] = (),
+) -> None:
+    """Ставит создание миниатюр файла в очередь, если оно не запланировано.
+
+    Готовые миниатюры повышают версии `scopes`. При `THUMBNAIL_WORKERS = 0`
+    очереди нет, и миниатюры создадут только `pregenerate` или команды
+    управления.
+    """
+    pool = executor()
+    if pool is None:
+        return
+    pending = PENDING_KEY.format(
+        hashlib.md5(
+            repr(
+                (
+                    source.key,
+                    sorted(
+                        (geometry_string, sorted(options.items()))
+                        for geometry_string, options in aliases.values()
+                    ),
+                ),
+            ).encode(),
+        ).hexdigest(),
+    )
+    if not cache.add(pending, True, settings.THUMBNAIL_PENDING_TIMEOUT):
+        return
+    pool.submit(
+        _run_in_worker,
+        pending,
+        source,
+        aliases,
+        scopes=tuple(scopes),
+    )
+
+
+def pregenerate(
+    file_: Any,
+    scopes: Iterable[str] = (),
+    inline: bool = False,
+) -> None:
+    """Создаёт все варианты изображения поста для загруженного файла.
+
+    Без фоновых потоков или с `inline` варианты создаются сразу в текущем
+    потоке, готовые при этом не пересоздаются. Фоновые потоки повышают
+    версии `scopes`, как `schedule`.
+    """
+    source = ImageFile(file_)
+    if inline or executor() is None:
+        _generate(None, source, variants())
+    else:
+        schedule(source, variants(), scopes)
+
+
+def _generate(
+    pending: Optional[str],
+    source: ImageFile,
+    aliases: Dict[Any, Tuple[str, Dict[str, Any]]],
+) -> int:
+    try:
+        return default.backend.generate_many(source, aliases)
+    except Exception:
+        logger.exception('Не удалось создать миниатюры %s', source.name)
+        return 0
+    finally:
+        if pending is not None:
+            cache.delete(pending)
+
+
+def _run_in_worker(*args, scopes: Tuple[str, ...]) -> None:
+    try:
+        if _generate(*args) and scopes:
+            # страницы с заглушкой вместо этой миниатюры нужно перестроить
+            bump_versions(*scopes)
+    finally:
+        # у каждого потока своё соединение с базой, его нужно закрыть
+        connections.close_all()
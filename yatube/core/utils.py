@@ -1,15 +1,28 @@
+from typing import Sequence, Tuple, Union
+
 from django.conf import settings
-from django.core.paginator import Paginator
+from django.core.paginator import Page
 from django.db.models import QuerySet
 from django.http import HttpRequest
 
+from core.paginator import CachedCountPaginator, KeysetPage, KeysetPaginator
+
 
 def paginate(
     request: HttpRequest,
-    queryset: QuerySet,
+    queryset: Union[QuerySet, Sequence],
     pagesize: int = settings.PAGE_SIZE,
-) -> QuerySet:
-    return Paginator(queryset, pagesize).get_page(request.GET.get('page'))
+    keyset: bool = False,
+    keys: Tuple[str, ...] = ('created', 'id'),
+) -> Union[Page, KeysetPage]:
+    if keyset and isinstance(queryset, QuerySet):
+        return KeysetPaginator(queryset, pagesize, keys).get_page(
+            after=request.GET.get('after'),
+            before=request.GET.get('before'),
+        )
+    return CachedCountPaginator(queryset, pagesize).get_page(
+        request.GET.get('page'),
+    )
 
 
 def truncatechars(chars: str, chars_limit: int = settings.NUMCATECHARS) -> str:
@@ -1,8 +1,11 @@
 from http import HTTPStatus
 
-from django.http import HttpRequest
+from django.conf import settings
+from django.http import Http404, HttpRequest
 from django.shortcuts import HttpResponse, render
 
+from core import metrics
+
 
 def page_not_found(request: HttpRequest, exception: Exception) -> HttpResponse:
     del exception
@@ -30,3 +33,13 @@ def server_error(request: HttpRequest) -> HttpResponse:
 
 def permission_denied(request: HttpRequest, *_) -> HttpResponse:
     return render(request, 'core/403.html', status=HTTPStatus.FORBIDDEN)
+
+
+def export_metrics(request: HttpRequest) -> HttpResponse:
+    """Метрики всех процессов в формате Prometheus для внутренней сети."""
+    if request.META.get('REMOTE_ADDR') not in settings.METRICS_ALLOWED_IPS:
+        raise Http404
+    return HttpResponse(
+        metrics.render(metrics.collect()),
+        content_type=metrics.CONTENT_TYPE,
+    )
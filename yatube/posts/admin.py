@@ -1,6 +1,8 @@
 from django.contrib import admin
+from django.db import connections
 
 from core.admin import BaseAdmin
+from posts import autocomplete, search
 from posts.models import Comment, Follow, Group, Post
 
 
@@ -14,9 +16,25 @@ class PostAdmin(BaseAdmin):
         'group',
     )
     list_editable = ('group',)
+    autocomplete_fields = ('author', 'group')
+    readonly_fields = (
+        'image_width',
+        'image_height',
+        'image_size',
+        'image_color',
+    )
     search_fields = ('text',)
     list_filter = ('created',)
 
+    def get_search_results(self, request, queryset, search_term):
+        # вместо LIKE по всей таблице - полнотекстовый индекс
+        if not search.supported(connections[queryset.db]):
+            return super().get_search_results(request, queryset, search_term)
+        expression = search.match_expression(search_term)
+        if expression is None:
+            return queryset, False
+        return search.matching(queryset, expression), False
+
 
 @admin.register(Group)
 class GroupAdmin(BaseAdmin):
@@ -27,6 +45,15 @@ class GroupAdmin(BaseAdmin):
     search_fields = ('title',)
     list_filter = ('title',)
 
+    def get_search_results(self, request, queryset, search_term):
+        if not autocomplete.admin_autocomplete(request):
+            return super().get_search_results(request, queryset, search_term)
+        return autocomplete.search_results(
+            autocomplete.groups,
+            queryset,
+            search_term,
+        )
+
 
 @admin.register(Comment)
 class CommentAdmin(BaseAdmin):
@@ -0,0 +1,305 @@
+import bisect
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connections
+from django.db.models import Model, Q, QuerySet
+from django.http import HttpRequest
+from django.urls import reverse
+
+from posts.models import Group
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+Entry = Tuple[int, Iterable[str], Dict[str, Any]]
+
+
+def normalize(keys: Iterable[str]) -> Tuple[str, ...]:
+    return tuple(sorted({key.lower() for key in keys if key}))
+
+
+class PrefixIndex:
+    """Отсортированный список пар (ключ, id) с поиском по префиксу.
+
+    Префикс ищется двоичным поиском, поэтому запрос стоит O(log n + limit)
+    и не зависит от размера таблицы. У записи может быть несколько ключей
+    (логин, имя, фамилия), а найдена она будет один раз.
+    """
+
+    def __init__(self) -> None:
+        self.keys: List[Tuple[str, int]] = []
+        self.items: Dict[int, Tuple[Tuple[str, ...], Dict[str, Any]]] = {}
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    @classmethod
+    def from_entries(cls, entries: Iterable[Entry]) -> 'PrefixIndex':
+        """Индекс из записей (id, ключи, данные) с разными id.
+
+        Пары собираются целиком и сортируются один раз: O(n log n) вместо
+        O(n²) у вставки каждой пары через `put`.
+        """
+        index = cls()
+        for id_, keys, payload in entries:
+            keys = normalize(keys)
+            index.items[id_] = (keys, payload)
+            index.keys.extend((key, id_) for key in keys)
+        index.keys.sort()
+        return index
+
+    def put(self, id_: int, keys: Iterable[str], payload: Dict) -> None:
+        self.remove(id_)
+        keys = normalize(keys)
+        self.items[id_] = (keys, payload)
+        for key in keys:
+            bisect.insort(self.keys, (key, id_))
+
+    def remove(self, id_: int) -> None:
+        keys, _ = self.items.pop(id_, ((), None))
+        for key in keys:
+            position = bisect.bisect_left(self.keys, (key, id_))
+            if position < len(self.keys) and self.keys[position] == (
+                key,
+                id_,
+            ):
+                del self.keys[position]
+
+    def search(self, prefix: str, limit: int) -> List[Dict[str, Any]]:
+        prefix = prefix.lower()
+        found: Dict[int, Dict[str, Any]] = {}
+        position = bisect.bisect_left(self.keys, (prefix,))
+        while position < len(self.keys) and len(found) < limit:
+            key, id_ = self.keys[position]
+            if not key.startswith(prefix):
+                break
+            # чтение идёт без блокировки, запись могли только что удалить
+            item = self.items.get(id_)
+            if item is not None:
+                found.setdefault(id_, item[1])
+            position += 1
+        return list(found.values())
+
+
+class Source:
+    """Индекс одной модели: строится при первом обращении и по таймеру.
+
+    Сигналы сохранения обновляют индекс своего процесса сразу, а индексы
+    других процессов догоняют изменения при перестроении раз в
+    `AUTOCOMPLETE_REBUILD_INTERVAL` секунд. Перестроение идёт в фоновом
+    потоке, запросы тем временем читают старый индекс. Если записей больше
+    `AUTOCOMPLETE_MAX_ENTRIES`, индекс не строится и поиск идёт в базе.
+    """
+
+    def __init__(
+        self,
+        queryset: Callable[[], QuerySet],
+        keys: Callable[[Model], Iterable[str]],
+        payload: Callable[[Model], Dict[str, Any]],
+        lookups: Tuple[str, ...],
+    ) -> None:
+        self.queryset = queryset
+        self.keys = keys
+        self.payload = payload
+        self.lookups = lookups
+        self.index: Optional[PrefixIndex] = None
+        self.built = 0.0
+        self.lock = threading.Lock()
+        self.first_build = threading.Lock()
+        self.refreshing = False
+        # изменения, пришедшие во время построения, пока оно идёт
+        self.changes: Optional[List[Callable[[PrefixIndex], None]]] = None
+
+    def search(self, prefix: str, limit: int) -> List[Dict[str, Any]]:
+        index = self.current()
+        if index is not None:
+            return index.search(prefix, limit)
+        return [
+            self.payload(obj)
+            for obj in self.matching(self.queryset(), prefix)[:limit]
+        ]
+
+    def ids(self, prefix: str, limit: int) -> List[int]:
+        index = self.current()
+        if index is None:
+            return list(
+                self.matching(self.queryset(), prefix)[:limit].values_list(
+                    'id',
+                    flat=True,
+                ),
+            )
+        return [item['id'] for item in index.search(prefix, limit)]
+
+    def matching(self, queryset: QuerySet, prefix: str) -> QuerySet:
+        condition = Q()
+        for lookup in self.lookups:
+            condition |= Q(**{f'{lookup}__istartswith': prefix})
+        return queryset.filter(condition).order_by(self.lookups[0])
+
+    def current(self) -> Optional[PrefixIndex]:
+        if not settings.AUTOCOMPLETE_INDEX:
+            return None
+        if not self.built:
+            # первое построение в процессе: остальные потоки ждут его
+            with self.first_build:
+                if not self.built:
+                    self.rebuild()
+        elif (
+            time.monotonic() - self.built
+            > settings.AUTOCOMPLETE_REBUILD_INTERVAL
+        ):
+            self.refresh()
+        return self.index
+
+    def refresh(self) -> None:
+        with self.lock:
+            if self.refreshing:
+                return
+            self.refreshing = True
+        threading.Thread(
+            target=self.refresh_in_background,
+            name='autocomplete',
+            daemon=True,
+        ).start()
+
+    def refresh_in_background(self) -> None:
+        try:
+            self.rebuild()
+        except Exception:
+            logger.exception('Не удалось перестроить индекс автодополнения')
+            # следующая попытка через интервал, а не в каждом запросе
+            self.built = time.monotonic()
+        finally:
+            self.refreshing = False
+            # у потока своё соединение с базой, его нужно закрыть
+            connections.close_all()
+
+    def rebuild(self) -> None:
+        with self.lock:
+            self.changes = []
+        try:
+            index = self.build()
+        except Exception:
+            with self.lock:
+                self.changes = None
+            raise
+        with self.lock:
+            if index is not None:
+                for change in self.changes:
+                    change(index)
+            self.changes = None
+            self.index = index
+            self.built = time.monotonic()
+
+    def build(self) -> Optional[PrefixIndex]:
+        queryset = self.queryset()
+        if queryset.count() > settings.AUTOCOMPLETE_MAX_ENTRIES:
+            return None
+        return PrefixIndex.from_entries(
+            (obj.id, self.keys(obj), self.payload(obj))
+            for obj in queryset.iterator()
+        )
+
+    def saved(self, obj: Model) -> None:
+        keys, payload = self.keys(obj), self.payload(obj)
+        self.apply(lambda index: index.put(obj.id, keys, payload))
+
+    def deleted(self, obj: Model) -> None:
+        self.apply(lambda index: index.remove(obj.id))
+
+    def apply(self, change: Callable[[PrefixIndex], None]) -> None:
+        with self.lock:
+            if self.index is not None:
+                change(self.index)
+            if self.changes is not None:
+                self.changes.append(change)
+
+    def reset(self) -> None:
+        with self.lock:
+            self.index = None
+            self.built = 0.0
+            self.changes = None
+            self.refreshing = False
+
+
+def user_keys(user: User) -> Iterable[str]:
+    return (
+        user.username,
+        user.first_name,
+        user.last_name,
+        user.get_full_name(),
+    )
+
+
+def user_payload(user: User) -> Dict[str, Any]:
+    return {
+        'id': user.id,
+        'username': user.username,
+        'name': user.get_full_name(),
+        'url': reverse('posts:profile', args=(user.username,)),
+    }
+
+
+def group_payload(group: Group) -> Dict[str, Any]:
+    return {
+        'id': group.id,
+        'slug': group.slug,
+        'title': group.title,
+        'url': reverse('posts:group_list', args=(group.slug,)),
+    }
+
+
+users = Source(
+    lambda: User.objects.only(
+        'id',
+        'username',
+        'first_name',
+        'last_name',
+    ),
+    user_keys,
+    user_payload,
+    ('username', 'first_name', 'last_name'),
+)
+
+groups = Source(
+    lambda: Group.objects.only('id', 'slug', 'title'),
+    lambda group: (group.slug, group.title),
+    group_payload,
+    ('slug', 'title'),
+)
+
+
+def suggest(query: str, limit: Optional[int] = None) -> Dict[str, List]:
+    query = query.strip()
+    if not query:
+        return {'users': [], 'groups': []}
+    limit = settings.AUTOCOMPLETE_LIMIT if limit is None else limit
+    return {
+        'users': users.search(query, limit),
+        'groups': groups.search(query, limit),
+    }
+
+
+def admin_autocomplete(request: HttpRequest) -> bool:
+    # поля autocomplete_fields ищут через /admin/<app>/<model>/autocomplete/,
+    # а список объектов ищет как обычно: по подстроке и всем search_fields
+    return request.path.endswith('/autocomplete/')
+
+
+def search_results(
+    source: Source,
+    queryset: QuerySet,
+    search_term: str,
+) -> Tuple[QuerySet, bool]:
+    """Подсказки виджета автодополнения админки из индекса префиксов."""
+    search_term = search_term.strip()
+    if not search_term:
+        return queryset, False
+    ids = source.ids(search_term, settings.AUTOCOMPLETE_ADMIN_LIMIT)
+    return queryset.filter(id__in=ids), False
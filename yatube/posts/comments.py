@@ -0,0 +1,38 @@
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import cache
+
+from core.paginator import KeysetPage, KeysetPaginator
+from posts.models import Comment
+
+FIRST_PAGE_KEY = 'comments:first:{}'
+
+
+def paginator(post_id: int) -> KeysetPaginator:
+    return KeysetPaginator(
+        Comment.objects.filter(post_id=post_id).select_related('author'),
+        settings.COMMENTS_PAGE_SIZE,
+    )
+
+
+def page(post_id: int, after: Optional[str] = None) -> KeysetPage:
+    """Страница комментариев к посту, новые сначала.
+
+    Первая страница хранится в кэше до добавления или удаления комментария,
+    следующие выбираются по курсору `after` одним запросом.
+    """
+    comments = paginator(post_id)
+    if after:
+        return comments.get_page(after=after)
+    key = FIRST_PAGE_KEY.format(post_id)
+    cached = cache.get(key)
+    if cached is None:
+        first = comments.page()
+        cached = (first.object_list, first.next_cursor)
+        cache.set(key, cached, settings.COMMENTS_CACHE_TIMEOUT)
+    return KeysetPage(cached[0], comments, next_cursor=cached[1])
+
+
+def forget_first_page(post_id: int) -> None:
+    cache.delete(FIRST_PAGE_KEY.format(post_id))
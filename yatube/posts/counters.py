@@ -0,0 +1,114 @@
+from typing import Dict
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, F, Model, OuterRef, Q, QuerySet, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from posts.models import AuthorStats, Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+def change(queryset: QuerySet, **deltas: int) -> int:
+    return queryset.update(
+        **{
+            field: Greatest(F(field) + delta, 0)
+            for field, delta in deltas.items()
+        },
+    )
+
+
+def change_author(user_id: int, **deltas: int) -> None:
+    with transaction.atomic(savepoint=False):
+        updated = change(AuthorStats.objects.filter(user_id=user_id), **deltas)
+        # при уменьшении строки может не быть, если автор удаляется каскадно
+        if not updated and min(deltas.values()) > 0:
+            reconcile_authors(User.objects.filter(id=user_id))
+
+
+def post_created(post: Post) -> None:
+    with transaction.atomic(savepoint=False):
+        change_author(post.author_id, posts_count=1)
+        if post.group_id:
+            change(Group.objects.filter(id=post.group_id), posts_count=1)
+
+
+def post_deleted(post: Post) -> None:
+    with transaction.atomic(savepoint=False):
+        change_author(post.author_id, posts_count=-1)
+        if post.group_id:
+            change(Group.objects.filter(id=post.group_id), posts_count=-1)
+
+
+def post_moved(post: Post, previous_group_id: int) -> None:
+    with transaction.atomic(savepoint=False):
+        if previous_group_id:
+            change(Group.objects.filter(id=previous_group_id), posts_count=-1)
+        if post.group_id:
+            change(Group.objects.filter(id=post.group_id), posts_count=1)
+
+
+def comment_changed(comment: Comment, delta: int) -> None:
+    change(Post.objects.filter(id=comment.post_id), comments_count=delta)
+
+
+def follow_changed(follow: Follow, delta: int) -> None:
+    with transaction.atomic(savepoint=False):
+        change_author(follow.author_id, followers_count=delta)
+        change_author(follow.user_id, following_count=delta)
+
+
+def count_of(model: Model, field: str) -> Coalesce:
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef('pk')})
+            .order_by()
+            .values(field)
+            .annotate(count=Count('pk'))
+            .values('count'),
+        ),
+        0,
+    )
+
+
+def repair(queryset: QuerySet, **counters: Coalesce) -> int:
+    drift = Q()
+    for field, actual in counters.items():
+        drift |= ~Q(**{field: actual})
+    return queryset.filter(drift).update(**counters)
+
+
+def reconcile_authors(users: QuerySet) -> int:
+    AuthorStats.objects.bulk_create(
+        (
+            AuthorStats(user_id=user_id)
+            for user_id in users.filter(stats__isnull=True).values_list(
+                'id',
+                flat=True,
+            )
+        ),
+        # размер пачки по пределу параметров базы выберет сам Django
+        ignore_conflicts=True,
+    )
+    return repair(
+        AuthorStats.objects.filter(user__in=users),
+        posts_count=count_of(Post, 'author'),
+        followers_count=count_of(Follow, 'author'),
+        following_count=count_of(Follow, 'user'),
+    )
+
+
+def reconcile() -> Dict[str, int]:
+    with transaction.atomic():
+        return {
+            'authors': reconcile_authors(User.objects.all()),
+            'groups': repair(
+                Group.objects.all(),
+                posts_count=count_of(Post, 'group'),
+            ),
+            'posts': repair(
+                Post.objects.all(),
+                comments_count=count_of(Comment, 'post'),
+            ),
+        }
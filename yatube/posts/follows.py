@@ -0,0 +1,61 @@
+from typing import FrozenSet, Iterable, Optional, Set
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+
+from posts.models import Follow
+
+User = get_user_model()
+
+FOLLOWED_KEY = 'follows:{}'
+
+
+def cached_followed_ids(user_id: int) -> Optional[FrozenSet[int]]:
+    return cache.get(FOLLOWED_KEY.format(user_id))
+
+
+def followed_ids(user_id: int) -> FrozenSet[int]:
+    """Множество id авторов, на которых подписан пользователь.
+
+    Загружается одним запросом по индексу подписок и хранится в кэше до
+    следующей подписки или отписки.
+    """
+    ids = cached_followed_ids(user_id)
+    if ids is None:
+        ids = frozenset(
+            Follow.objects.filter(user_id=user_id).values_list(
+                'author_id',
+                flat=True,
+            ),
+        )
+        cache.set(FOLLOWED_KEY.format(user_id), ids, settings.FOLLOWS_TIMEOUT)
+    return ids
+
+
+def forget_followed_ids(user_id: int) -> None:
+    cache.delete(FOLLOWED_KEY.format(user_id))
+
+
+def following(user: User, author_ids: Iterable[int]) -> Set[int]:
+    """Оставляет из `author_ids` тех, на кого подписан пользователь.
+
+    Если множество подписок уже в кэше, запросов нет, иначе выполняется один
+    запрос `author_id IN (...)` только по переданным авторам.
+    """
+    author_ids = set(author_ids)
+    if not user.is_authenticated or not author_ids:
+        return set()
+    ids = cached_followed_ids(user.pk)
+    if ids is not None:
+        return author_ids & ids
+    return set(
+        Follow.objects.filter(
+            user_id=user.pk,
+            author_id__in=author_ids,
+        ).values_list('author_id', flat=True),
+    )
+
+
+def is_following(user: User, author_id: int) -> bool:
+    return author_id in following(user, (author_id,))
@@ -0,0 +1,127 @@
+import os
+from io import BytesIO
+from typing import IO, NamedTuple, Tuple
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+
+class NormalizedImage(NamedTuple):
+    file: ContentFile
+    width: int
+    height: int
+    color: str
+
+
+class ImageInfo(NamedTuple):
+    width: int
+    height: int
+    size: int
+    color: str
+
+
+def pixel_size(file_: IO) -> Tuple[int, int]:
+    """Размер изображения по заголовку файла, без декодирования пикселей.
+
+    Отклоняет файлы, в которых больше `POST_IMAGE_MAX_PIXELS` пикселей.
+    """
+    file_.seek(0)
+    try:
+        with Image.open(file_) as image:
+            size = image.size
+    except Image.DecompressionBombError:
+        size = None
+    finally:
+        file_.seek(0)
+    if size is None or size[0] * size[1] > settings.POST_IMAGE_MAX_PIXELS:
+        raise ValidationError(
+            'Изображение слишком большое: не больше %(limit)s пикселей',
+            code='too_many_pixels',
+            params={'limit': settings.POST_IMAGE_MAX_PIXELS},
+        )
+    return size
+
+
+def validate_pixel_size(file_: IO) -> None:
+    """Проверка `pixel_size` для новых, ещё не сохранённых файлов.
+
+    Это валидатор поля модели, поэтому ограничение действует и в админке.
+    """
+    if not getattr(file_, '_committed', True):
+        pixel_size(file_)
+
+
+def dominant_color(image: Image.Image) -> str:
+    """Самый частый цвет уменьшенной копии в виде #rrggbb."""
+    small = image.convert('RGB')
+    small.thumbnail((64, 64))
+    quantized = small.quantize(colors=5)
+    _, index = max(quantized.getcolors())
+    palette = quantized.getpalette()
+    return '#' + ''.join(
+        f'{palette[index * 3 + channel]:02x}' for channel in range(3)
+    )
+
+
+def inspect(file_: IO) -> ImageInfo:
+    """Размер и основной цвет уже сохранённого изображения."""
+    file_.seek(0, os.SEEK_END)
+    size = file_.tell()
+    file_.seek(0)
+    with Image.open(file_) as image:
+        width, height = image.size
+        image.draft('RGB', (64, 64))
+        color = dominant_color(image)
+    return ImageInfo(width, height, size, color)
+
+
+def normalize(file_: IO, name: str) -> NormalizedImage:
+    """Уменьшает изображение, удаляет метаданные и пережимает его.
+
+    Длинная сторона ограничивается `POST_IMAGE_MAX_SIDE`. Изображения с
+    прозрачностью сохраняются в оптимизированный PNG, остальные - в
+    прогрессивный JPEG. EXIF не переносится, поворот из него применяется
+    к пикселям заранее.
+    """
+    pixel_size(file_)
+    limit = (settings.POST_IMAGE_MAX_SIDE, settings.POST_IMAGE_MAX_SIDE)
+    with Image.open(file_) as source:
+        # JPEG можно декодировать сразу в уменьшенном масштабе
+        source.draft('RGB', limit)
+        image = ImageOps.exif_transpose(source)
+        transparent = (
+            image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+        )
+        icc_profile = source.info.get('icc_profile')
+    image = image.convert('RGBA' if transparent else 'RGB')
+    image.thumbnail(limit, Image.LANCZOS)
+    # остальные метаданные (EXIF, XMP, комментарии) не сохраняются
+    image.info = {}
+    buffer = BytesIO()
+    if transparent:
+        image.save(
+            buffer,
+            'PNG',
+            optimize=True,
+            icc_profile=icc_profile,
+        )
+        extension = '.png'
+    else:
+        image.save(
+            buffer,
+            'JPEG',
+            quality=settings.POST_IMAGE_QUALITY,
+            progressive=True,
+            optimize=True,
+            icc_profile=icc_profile,
+        )
+        extension = '.jpg'
+    stem = os.path.splitext(os.path.basename(name))[0]
+    return NormalizedImage(
+        ContentFile(buffer.getvalue(), name=stem + extension),
+        image.width,
+        image.height,
+        dominant_color(image),
+    )
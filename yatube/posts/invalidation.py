@@ -0,0 +1,108 @@
+from typing import Iterable, Tuple
+
+from django.db.models import Max
+
+from core.cache import PageState, bump_versions
+from posts.models import Post
+
+INDEX = 'posts:index'
+GROUPS = 'posts:groups'
+
+
+def group_scope(slug: str) -> str:
+    return f'posts:group:{slug}'
+
+
+def profile_scope(username: str) -> str:
+    return f'posts:profile:{username}'
+
+
+def follows_scope(user_id: int) -> str:
+    return f'posts:follows:{user_id}'
+
+
+def user_scopes(request) -> Tuple[str, ...]:
+    # кнопки подписки в карточках зависят от подписок пользователя
+    if request.user.is_authenticated:
+        return (follows_scope(request.user.pk),)
+    return ()
+
+
+def index_scopes(request) -> Tuple[str, ...]:
+    return (INDEX, GROUPS, *user_scopes(request))
+
+
+def group_scopes(request, slug: str) -> Tuple[str, ...]:
+    return (group_scope(slug), GROUPS, *user_scopes(request))
+
+
+def profile_scopes(request, username: str) -> Tuple[str, ...]:
+    return (profile_scope(username), GROUPS)
+
+
+def post_scopes(post: Post) -> Tuple[str, ...]:
+    # страницы, на которых виден пост; страница поста зависит от профиля
+    scopes = (INDEX, profile_scope(post.author.username))
+    if post.group_id:
+        scopes += (group_scope(post.group.slug),)
+    return scopes
+
+
+def invalidate_feeds(
+    usernames: Iterable[str] = (),
+    slugs: Iterable[str] = (),
+    index: bool = True,
+) -> None:
+    scopes = [profile_scope(username) for username in usernames]
+    scopes += [group_scope(slug) for slug in slugs]
+    if index:
+        scopes.append(INDEX)
+    bump_versions(*scopes)
+
+
+def invalidate_follows(user_id: int, *usernames: str) -> None:
+    # профили подписчика и автора показывают число подписок и подписчиков
+    bump_versions(
+        follows_scope(user_id),
+        *(profile_scope(username) for username in usernames),
+    )
+
+
+def invalidate_groups() -> None:
+    bump_versions(GROUPS)
+
+
+# ленты меняются только вместе с версиями своих областей: сигналы повышают
+# их при каждой записи, поэтому валидаторы не требуют запросов к базе
+def index_state(request) -> PageState:
+    return None, index_scopes(request)
+
+
+def group_state(request, slug: str) -> PageState:
+    return None, group_scopes(request, slug)
+
+
+def profile_state(request, username: str) -> PageState:
+    return None, profile_scopes(request, username)
+
+
+def post_state(request, id: int) -> PageState:
+    post = (
+        Post.objects.filter(id=id)
+        .order_by()
+        .values('author__username')
+        .annotate(
+            created=Max('created'),
+            modified=Max('modified'),
+            commented=Max('comments__created'),
+            comment_modified=Max('comments__modified'),
+        )
+        .first()
+    )
+    if post is None:
+        return None
+    username = post.pop('author__username')
+    return (
+        max(filter(None, post.values())),
+        (profile_scope(username), GROUPS),
+    )
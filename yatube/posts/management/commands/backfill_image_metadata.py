@@ -0,0 +1,97 @@
+import os
+from multiprocessing import Pool
+from typing import Optional, Tuple
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.models import Q
+
+from posts import images
+from posts.models import Post
+
+Job = Tuple[int, str]
+
+
+def inspect(job: Job) -> Tuple[int, Optional[images.ImageInfo]]:
+    post_id, name = job
+    # файлы постов лежат в хранилище поля, а не обязательно в default_storage
+    storage = Post._meta.get_field('image').storage
+    try:
+        with storage.open(name) as file_:
+            return post_id, images.inspect(file_)
+    except Exception:
+        return post_id, None
+
+
+class Command(BaseCommand):
+    help = 'Заполняет размеры и основной цвет изображений старых постов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count(),
+            help='число процессов, 0 - обрабатывать в текущем процессе',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='сколько постов сохранять одним запросом',
+        )
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            dest='everything',
+            help='пересчитать и уже заполненные посты',
+        )
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='')
+        if not options['everything']:
+            posts = posts.filter(
+                Q(image_width__isnull=True) | Q(image_color=''),
+            )
+        jobs = list(posts.order_by('id').values_list('id', 'image'))
+        if options['workers']:
+            # дочерние процессы не должны унаследовать открытые соединения
+            connections.close_all()
+            with Pool(options['workers']) as pool:
+                self.save(
+                    pool.imap_unordered(inspect, jobs, chunksize=16),
+                    options['batch_size'],
+                )
+        else:
+            self.save(map(inspect, jobs), options['batch_size'])
+
+    def save(self, results, batch_size):
+        batch, updated, failed = [], 0, 0
+        for post_id, info in results:
+            if info is None:
+                failed += 1
+                continue
+            batch.append(
+                Post(
+                    id=post_id,
+                    image_width=info.width,
+                    image_height=info.height,
+                    image_size=info.size,
+                    image_color=info.color,
+                ),
+            )
+            if len(batch) >= batch_size:
+                updated += self.flush(batch)
+        updated += self.flush(batch)
+        if failed:
+            self.stderr.write(f'Не удалось прочитать изображений: {failed}')
+        self.stdout.write(self.style.SUCCESS(f'Обновлено постов: {updated}'))
+
+    @staticmethod
+    def flush(batch) -> int:
+        Post.objects.bulk_update(
+            batch,
+            ('image_width', 'image_height', 'image_size', 'image_color'),
+        )
+        flushed = len(batch)
+        batch.clear()
+        return flushed
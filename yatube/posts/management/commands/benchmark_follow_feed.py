@@ -0,0 +1,108 @@
+import time
+from statistics import median
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.core.paginator import Paginator
+from django.db import connection
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext
+
+from posts.feeds import MergedFeed, forget_author_posts
+from posts.follows import followed_ids
+from posts.models import Post
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает ленту подписок через ORM запрос и слиянием '
+        'кэшированных списков авторов'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            action='append',
+            dest='usernames',
+            help='логин пользователя, ленту которого нужно измерить',
+        )
+        parser.add_argument(
+            '--users',
+            type=int,
+            default=5,
+            help='сколько пользователей с наибольшим числом подписок взять',
+        )
+        parser.add_argument(
+            '--page',
+            type=int,
+            action='append',
+            dest='pages',
+            help='номер страницы ленты (по умолчанию 1 и 10)',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=20,
+            help='число повторов каждого замера',
+        )
+
+    def handle(self, *args, **options):
+        users = User.objects.annotate(follows_count=Count('follower'))
+        if options['usernames']:
+            users = users.filter(username__in=options['usernames'])
+        else:
+            users = users.filter(follows_count__gt=0).order_by(
+                '-follows_count',
+            )[: options['users']]
+        engines = (
+            ('orm', self.orm_page, False),
+            ('merge (холодный кэш)', self.merge_page, True),
+            ('merge', self.merge_page, False),
+        )
+        self.stdout.write(
+            f'{"пользователь":<20}{"подписок":>10}{"стр.":>6}'
+            f'{"движок":>24}{"медиана, мс":>14}{"запросов":>10}',
+        )
+        for user in users:
+            for number in options['pages'] or (1, 10):
+                for name, engine, cold in engines:
+                    elapsed, queries = self.measure(
+                        engine,
+                        user,
+                        number,
+                        options['repeat'],
+                        cold,
+                    )
+                    self.stdout.write(
+                        f'{user.username:<20}{user.follows_count:>10}'
+                        f'{number:>6}{name:>24}{elapsed:>14.2f}'
+                        f'{queries:>10}',
+                    )
+
+    def measure(self, engine, user, number, repeat, cold):
+        timings = []
+        for _ in range(repeat):
+            if cold:
+                for author_id in user.follower.values_list(
+                    'author_id',
+                    flat=True,
+                ):
+                    forget_author_posts(author_id)
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                engine(user, number)
+                timings.append(time.perf_counter() - started)
+        return median(timings) * 1000, len(queries)
+
+    def orm_page(self, user, number):
+        queryset = Post.objects.select_related('group', 'author').filter(
+            author__following__user=user,
+        )
+        list(Paginator(queryset, settings.PAGE_SIZE).get_page(number))
+
+    def merge_page(self, user, number):
+        feed = MergedFeed(followed_ids(user.pk))
+        list(Paginator(feed, settings.PAGE_SIZE).get_page(number))
@@ -0,0 +1,145 @@
+import time
+from typing import Callable, Iterable, List
+
+from django.core.files.storage import Storage
+from django.core.management.base import BaseCommand, CommandError
+from django.template.defaultfilters import filesizeformat
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import settings as sorl_settings
+
+from core import storage, thumbnails
+from core.models import StoredFile
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет изображения постов, на которые не ссылается ни один пост, '
+        'и миниатюры удалённых изображений'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='только показать, что будет удалено',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='сколько файлов удалять за один раз',
+        )
+        parser.add_argument(
+            '--min-age',
+            type=int,
+            default=3600,
+            help=(
+                'не трогать файлы моложе стольких секунд: загруженный файл '
+                'попадает на диск раньше, чем сохраняется пост'
+            ),
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть больше нуля')
+        self.dry_run = options['dry_run']
+        self.verbose = options['verbosity'] > 1
+        self.batch_size = options['batch_size']
+        self.deadline = time.time() - options['min_age']
+        field = Post._meta.get_field('image')
+        media = field.storage
+        # оба потока отсортированы по имени и сливаются за один проход
+        referenced = (
+            Post.objects.exclude(image='')
+            .order_by('image')
+            .values_list('image', flat=True)
+            .distinct()
+            .iterator()
+        )
+        try:
+            images = self.collect(
+                storage.unreferenced(
+                    storage.walk(media, field.upload_to.strip('/')),
+                    referenced,
+                ),
+                lambda names: self.delete_images(names, media),
+            )
+        except ValueError as error:
+            raise CommandError(error)
+        sources = self.sweep_sources()
+        cached = self.collect(
+            thumbnails.untracked(
+                storage.walk(
+                    default.storage,
+                    sorl_settings.THUMBNAIL_PREFIX.strip('/'),
+                ),
+                self.batch_size,
+            ),
+            self.delete_cached,
+        )
+        verb = 'Будет удалено' if self.dry_run else 'Удалено'
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'{verb} изображений: {images[0]} '
+                f'({filesizeformat(images[1])}), '
+                f'миниатюр без записей: {cached[0]} '
+                f'({filesizeformat(cached[1])}), '
+                f'миниатюр пропавших изображений: {sources}',
+            ),
+        )
+
+    def collect(
+        self,
+        orphans: Iterable[storage.StoredEntry],
+        delete: Callable[[List[str]], object],
+    ) -> List[int]:
+        found, size, batch = 0, 0, []
+        for entry in orphans:
+            if entry.modified > self.deadline:
+                continue
+            found += 1
+            size += entry.size
+            if self.verbose:
+                self.stdout.write(entry.name)
+            if self.dry_run:
+                continue
+            batch.append(entry.name)
+            if len(batch) >= self.batch_size:
+                delete(batch)
+                batch = []
+        if batch:
+            delete(batch)
+        return [found, size]
+
+    def delete_images(self, names: List[str], media: Storage) -> None:
+        # пока шёл обход, такой же файл могли загрузить снова
+        used = set(
+            Post.objects.filter(image__in=names).values_list(
+                'image',
+                flat=True,
+            ),
+        )
+        for name in names:
+            if name in used:
+                continue
+            thumbnails.forget(name, media)
+            media.delete(name)
+        StoredFile.objects.filter(name__in=names).exclude(
+            name__in=used,
+        ).delete()
+
+    def delete_cached(self, names: List[str]) -> None:
+        for name in names:
+            default.storage.delete(name)
+
+    def sweep_sources(self) -> int:
+        # изображения, удалённые без сборщика, оставляют миниатюры на диске
+        swept = 0
+        for source in thumbnails.missing_sources(self.batch_size):
+            swept += 1
+            if self.verbose:
+                self.stdout.write(source.name)
+            if not self.dry_run:
+                thumbnails.forget(source.name, source.storage)
+        return swept
@@ -0,0 +1,144 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from posts import synthetic
+
+
+class Command(BaseCommand):
+    help = (
+        'Создаёт синтетический набор данных: пользователей, группы, посты, '
+        'комментарии, подписки и изображения с неравномерным распределением'
+    )
+
+    def add_arguments(self, parser):
+        for name, default, help_text in (
+            ('users', 1000, 'число пользователей'),
+            ('groups', 20, 'число групп'),
+            ('posts', 10000, 'число постов'),
+            ('comments', 30000, 'число комментариев (в среднем)'),
+            ('follows', 20000, 'число подписок (в среднем)'),
+            ('images', 0, 'число разных изображений'),
+        ):
+            parser.add_argument(
+                f'--{name}',
+                type=int,
+                default=default,
+                help=help_text,
+            )
+        parser.add_argument(
+            '--image-share',
+            type=float,
+            default=0.3,
+            help='доля постов с изображением',
+        )
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=365,
+            help='за сколько дней распределить посты',
+        )
+        parser.add_argument(
+            '--skew',
+            type=float,
+            default=1.0,
+            help=(
+                'показатель степенного закона популярности авторов, групп '
+                'и постов'
+            ),
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            help='зерно генератора для воспроизводимого набора',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=5000,
+            help='сколько записей создаётся в одной транзакции',
+        )
+        parser.add_argument(
+            '--processes',
+            type=int,
+            default=1,
+            help='число процессов, пишущих в базу',
+        )
+
+    def handle(self, *args, **options):
+        counts = {
+            name: options[name]
+            for name in (
+                'users',
+                'groups',
+                'posts',
+                'comments',
+                'follows',
+                'images',
+            )
+        }
+        if min(counts.values()) < 0 or options['days'] < 1:
+            raise CommandError('Числа должны быть неотрицательными')
+        if options['chunk_size'] < 1 or options['processes'] < 1:
+            raise CommandError(
+                '--chunk-size и --processes должны быть больше нуля',
+            )
+        if counts['posts'] and not counts['users']:
+            raise CommandError('Для постов нужны пользователи')
+        if counts['follows'] and counts['users'] < 2:
+            raise CommandError('Для подписок нужно хотя бы два пользователя')
+        processes = options['processes']
+        if processes > 1 and connection.vendor == 'sqlite':
+            # SQLite допускает одного писателя, процессы ждали бы блокировку
+            self.stdout.write(
+                self.style.WARNING(
+                    'SQLite: данные создаются в одном процессе',
+                ),
+            )
+            processes = 1
+        seed = options['seed']
+        if seed is None:
+            seed = random.randrange(2**32)
+        started = time.monotonic()
+        plan = synthetic.make_plan(
+            image_count=counts.pop('images'),
+            image_share=options['image_share'],
+            days=options['days'],
+            skew=options['skew'],
+            seed=seed,
+            **counts,
+        )
+        self.stdout.write(f'Зерно: {seed}, изображений: {len(plan.images)}')
+        synthetic.make_groups(plan)
+        for kind, title, base, total in (
+            ('users', 'пользователи', plan.user_base, plan.users),
+            ('posts', 'посты и комментарии', plan.post_base, plan.posts),
+            (
+                'follows',
+                'подписки',
+                plan.user_base,
+                plan.users if plan.follows else 0,
+            ),
+        ):
+            jobs = synthetic.units(
+                kind,
+                plan,
+                base,
+                total,
+                options['chunk_size'],
+            )
+            created = sum(
+                rows for _, rows in synthetic.execute(jobs, processes)
+            )
+            self.stdout.write(
+                f'{title}: {created} записей, '
+                f'{time.monotonic() - started:.1f} с',
+            )
+        synthetic.finish(plan)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Данные созданы за {time.monotonic() - started:.1f} с',
+            ),
+        )
@@ -0,0 +1,105 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from core import storage, thumbnails
+from core.cache import bump_versions
+from core.models import StoredFile
+from posts import invalidation
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит изображения постов в хранилище с именами по хэшу '
+        'содержимого и пересчитывает ссылки на файлы'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='только показать, сколько файлов будет перенесено',
+        )
+        parser.add_argument(
+            '--keep-originals',
+            action='store_true',
+            help='не удалять файлы со старыми именами',
+        )
+
+    def handle(self, *args, **options):
+        media = Post._meta.get_field('image').storage
+        legacy = sorted(
+            {
+                name
+                for name in Post.objects.exclude(image='')
+                .values_list('image', flat=True)
+                .iterator()
+                if not storage.is_hashed(name)
+            },
+        )
+        if options['dry_run']:
+            self.stdout.write(f'Файлов к переносу: {len(legacy)}')
+            return
+        moved, missing, scopes = 0, 0, set()
+        for name in legacy:
+            if not media.exists(name):
+                missing += 1
+                continue
+            with media.open(name) as file_:
+                hashed = media.save(name, file_)
+            posts = Post.objects.filter(image=name)
+            # update() обходит сигналы: страницы постов и миниатюры под
+            # новым именем обновляются здесь
+            for post in posts.select_related('author', 'group'):
+                scopes.update(invalidation.post_scopes(post))
+            with transaction.atomic():
+                storage.retain(hashed, posts.update(image=hashed))
+            thumbnails.pregenerate(Post(image=hashed).image, inline=True)
+            if not options['keep_originals']:
+                media.delete(name)
+            moved += 1
+        bump_versions(*scopes)
+        recounted = self.recount()
+        if missing:
+            self.stderr.write(f'Файлы не найдены: {missing}')
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Перенесено файлов: {moved}, исправлено ссылок: {recounted}',
+            ),
+        )
+
+    @staticmethod
+    def recount() -> int:
+        refs = dict(
+            Post.objects.exclude(image='')
+            .order_by()
+            .values('image')
+            .annotate(refs=Count('id'))
+            .values_list('image', 'refs'),
+        )
+        refs = {
+            name: count
+            for name, count in refs.items()
+            if storage.is_hashed(name)
+        }
+        repaired = 0
+        with transaction.atomic():
+            for stored in StoredFile.objects.select_for_update().iterator():
+                count = refs.pop(stored.name, 0)
+                if stored.refs == count:
+                    continue
+                # файлы без ссылок удалит сборщик неиспользуемых файлов
+                if count:
+                    stored.refs = count
+                    stored.save(update_fields=('refs',))
+                else:
+                    stored.delete()
+                repaired += 1
+            StoredFile.objects.bulk_create(
+                (
+                    StoredFile(name=name, refs=count)
+                    for name, count in refs.items()
+                ),
+            )
+        return repaired + len(refs)
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from core import thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Создаёт недостающие варианты изображений постов'
+
+    def handle(self, *args, **options):
+        names = (
+            Post.objects.exclude(image='')
+            .order_by('image')
+            .values_list('image', flat=True)
+            .distinct()
+        )
+        count = 0
+        for name in names.iterator():
+            thumbnails.pregenerate(Post(image=name).image, inline=True)
+            count += 1
+        self.stdout.write(
+            self.style.SUCCESS(f'Обработано изображений: {count}'),
+        )
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from posts import timelines
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает материализованные ленты подписок'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            type=int,
+            action='append',
+            dest='user_ids',
+            help='id пользователя, ленту которого нужно пересобрать',
+        )
+        parser.add_argument(
+            '--trim-only',
+            action='store_true',
+            help='только обрезать ленты до TIMELINE_LENGTH',
+        )
+
+    def handle(self, *args, **options):
+        user_ids = options['user_ids']
+        if options['trim_only']:
+            timelines.trim(user_ids or timelines.owners())
+            self.stdout.write(self.style.SUCCESS('Ленты обрезаны'))
+            return
+        rebuilt = timelines.rebuild(user_ids)
+        self.stdout.write(self.style.SUCCESS(f'Пересобрано лент: {rebuilt}'))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from posts import counters
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает денормализованные счётчики постов, групп и авторов'
+
+    def handle(self, *args, **options):
+        for name, repaired in counters.reconcile().items():
+            self.stdout.write(f'{name}: исправлено {repaired}')
+        self.stdout.write(self.style.SUCCESS('Счётчики сверены'))
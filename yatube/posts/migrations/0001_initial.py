@@ -0,0 +1,412 @@
+# Generated by Django 2.2.16 on 2026-10-18 20:03
+
+import django.db.models.deletion
+import django.db.models.expressions
+from django.conf import settings
+from django.db import migrations, models
+
+import core.storage
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('auth', '0011_update_proxy_permissions'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthorStats',
+            fields=[
+                (
+                    'user',
+                    models.OneToOneField(
+                        help_text='автор, для которого ведутся счётчики',
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name='stats',
+                        serialize=False,
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name='автор',
+                    ),
+                ),
+                (
+                    'posts_count',
+                    models.PositiveIntegerField(
+                        default=0,
+                        help_text='число постов автора',
+                        verbose_name='число постов',
+                    ),
+                ),
+                (
+                    'followers_count',
+                    models.PositiveIntegerField(
+                        default=0,
+                        help_text='число подписчиков автора',
+                        verbose_name='число подписчиков',
+                    ),
+                ),
+                (
+                    'following_count',
+                    models.PositiveIntegerField(
+                        default=0,
+                        help_text='число авторов, на которых подписан пользователь',
+                        verbose_name='число подписок',
+                    ),
+                ),
+            ],
+            options={
+                'verbose_name': 'счётчики автора',
+                'verbose_name_plural': 'счётчики авторов',
+            },
+        ),
+        migrations.CreateModel(
+            name='Group',
+            fields=[
+                (
+                    'id',
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name='ID',
+                    ),
+                ),
+                (
+                    'title',
+                    models.CharField(
+                        help_text='название группы',
+                        max_length=200,
+                        verbose_name='название',
+                    ),
+                ),
+                (
+                    'slug',
+                    models.SlugField(
+                        help_text='текстовый идентификатор страницы',
+                        unique=True,
+                        verbose_name='текстовый идентификатор страницы',
+                    ),
+                ),
+                (
+                    'description',
+                    models.TextField(
+                        help_text='описание группы', verbose_name='описание'
+                    ),
+                ),
+                (
+                    'posts_count',
+                    models.PositiveIntegerField(
+                        default=0,
+                        editable=False,
+                        help_text='число постов группы',
+                        verbose_name='число постов',
+                    ),
+                ),
+            ],
+            options={
+                'verbose_name': 'группа',
+                'verbose_name_plural': 'группы',
+            },
+        ),
+        migrations.CreateModel(
+            name='Post',
+            fields=[
+                (
+                    'id',
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name='ID',
+                    ),
+                ),
+                (
+                    'created',
+                    models.DateTimeField(auto_now_add=True, db_index=True),
+                ),
+                (
+                    'modified',
+                    models.DateTimeField(blank=True, db_index=True, null=True),
+                ),
+                (
+                    'text',
+                    models.TextField(
+                        help_text='введите текст', verbose_name='текст'
+                    ),
+                ),
+                (
+                    'image',
+                    models.ImageField(
+                        blank=True,
+                        help_text='добавьте изображение',
+                        storage=core.storage.ContentAddressedStorage(),
+                        upload_to='posts/',
+                        verbose_name='изображение',
+                    ),
+                ),
+                (
+                    'image_width',
+                    models.PositiveIntegerField(
+                        editable=False,
+                        null=True,
+                        verbose_name='ширина изображения',
+                    ),
+                ),
+                (
+                    'image_height',
+                    models.PositiveIntegerField(
+                        editable=False,
+                        null=True,
+                        verbose_name='высота изображения',
+                    ),
+                ),
+                (
+                    'image_size',
+                    models.PositiveIntegerField(
+                        editable=False,
+                        null=True,
+                        verbose_name='размер изображения, байт',
+                    ),
+                ),
+                (
+                    'image_color',
+                    models.CharField(
+                        blank=True,
+                        editable=False,
+                        max_length=7,
+                        verbose_name='основной цвет изображения',
+                    ),
+                ),
+                (
+                    'comments_count',
+                    models.PositiveIntegerField(
+                        default=0,
+                        editable=False,
+                        help_text='число комментариев к посту',
+                        verbose_name='число комментариев',
+                    ),
+                ),
+                (
+                    'author',
+                    models.ForeignKey(
+                        help_text='укажите автора',
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name='posts',
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name='автор',
+                    ),
+                ),
+                (
+                    'group',
+                    models.ForeignKey(
+                        blank=True,
+                        db_index=False,
+                        help_text='выберите группу',
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name='posts',
+                        to='posts.Group',
+                        verbose_name='группа',
+                    ),
+                ),
+            ],
+            options={
+                'verbose_name': 'пост',
+                'verbose_name_plural': 'посты',
+                'ordering': ('-created',),
+                'abstract': False,
+                'default_related_name': 'posts',
+            },
+        ),
+        migrations.CreateModel(
+            name='Timeline',
+            fields=[
+                (
+                    'id',
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name='ID',
+                    ),
+                ),
+                (
+                    'created',
+                    models.DateTimeField(
+                        help_text='дата создания поста',
+                        verbose_name='дата создания',
+                    ),
+                ),
+                (
+                    'post',
+                    models.ForeignKey(
+                        help_text='пост в ленте подписчика',
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name='timelines',
+                        to='posts.Post',
+                        verbose_name='пост',
+                    ),
+                ),
+                (
+                    'user',
+                    models.ForeignKey(
+                        help_text='владелец ленты',
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name='timeline',
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name='подписчик',
+                    ),
+                ),
+            ],
+            options={
+                'verbose_name': 'запись ленты',
+                'verbose_name_plural': 'ленты подписок',
+                'ordering': ('-created',),
+            },
+        ),
+        migrations.CreateModel(
+            name='Follow',
+            fields=[
+                (
+                    'id',
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name='ID',
+                    ),
+                ),
+                (
+                    'author',
+                    models.ForeignKey(
+                        help_text='укажите автора на которого подписываются',
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name='following',
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name='автор',
+                    ),
+                ),
+                (
+                    'user',
+                    models.ForeignKey(
+                        db_index=False,
+                        help_text='укажите подписчика',
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name='follower',
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name='подписчик',
+                    ),
+                ),
+            ],
+            options={
+                'verbose_name': 'подписчик',
+                'verbose_name_plural': 'подписчики',
+            },
+        ),
+        migrations.CreateModel(
+            name='Comment',
+            fields=[
+                (
+                    'id',
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name='ID',
+                    ),
+                ),
+                (
+                    'created',
+                    models.DateTimeField(auto_now_add=True, db_index=True),
+                ),
+                (
+                    'modified',
+                    models.DateTimeField(blank=True, db_index=True, null=True),
+                ),
+                (
+                    'text',
+                    models.TextField(
+                        help_text='введите текст', verbose_name='текст'
+                    ),
+                ),
+                (
+                    'author',
+                    models.ForeignKey(
+                        help_text='укажите автора',
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name='comments',
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name='автор',
+                    ),
+                ),
+                (
+                    'post',
+                    models.ForeignKey(
+                        db_index=False,
+                        help_text='укажите пост для комментария',
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name='comments',
+                        to='posts.Post',
+                        verbose_name='пост',
+                    ),
+                ),
+            ],
+            options={
+                'verbose_name': 'комментарий',
+                'verbose_name_plural': 'комментарии',
+                'ordering': ('-created',),
+                'abstract': False,
+                'default_related_name': 'comments',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='timeline',
+            index=models.Index(
+                fields=['user', '-created'], name='timeline_user_created_idx'
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name='timeline',
+            constraint=models.UniqueConstraint(
+                fields=('user', 'post'), name='unique_timeline_post'
+            ),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(
+                fields=['author', 'created'], name='post_author_created_idx'
+            ),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(
+                fields=['group', 'created'], name='post_group_created_idx'
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name='follow',
+            constraint=models.UniqueConstraint(
+                fields=('user', 'author'), name='unique_follow'
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name='follow',
+            constraint=models.CheckConstraint(
+                check=models.Q(
+                    _negated=True,
+                    user=django.db.models.expressions.F('author'),
+                ),
+                name='follow_not_self',
+            ),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(
+                fields=['post', 'created'], name='comment_post_created_idx'
+            ),
+        ),
+    ]
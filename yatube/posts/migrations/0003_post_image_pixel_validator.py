@@ -0,0 +1,34 @@
+# Generated by Django 2.2.16 on 2026-10-18 21:01
+
+from django.db import migrations, models
+
+import core.storage
+import posts.images
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0002_post_search'),
+    ]
+
+    # валидаторы не меняют схему, а AlterField в SQLite пересоздаёт таблицу
+    # и теряет триггеры полнотекстового индекса из 0002
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='post',
+                    name='image',
+                    field=models.ImageField(
+                        blank=True,
+                        help_text='добавьте изображение',
+                        storage=core.storage.ContentAddressedStorage(),
+                        upload_to='posts/',
+                        validators=[posts.images.validate_pixel_size],
+                        verbose_name='изображение',
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -1,10 +1,12 @@
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.db import models
-from django.db.models import UniqueConstraint
+from django.db.models import CheckConstraint, F, Q, UniqueConstraint
 
 from core.models import DefaultModel, TextAuthorModel
+from core.storage import ContentAddressedStorage
 from core.utils import truncatechars
+from posts import images
 
 User = get_user_model()
 
@@ -24,6 +26,14 @@ class Group(DefaultModel):
         'описание',
         help_text='описание группы',
     )
+    posts_count = models.PositiveIntegerField(
+        'число постов',
+        default=0,
+        editable=False,
+        help_text='число постов группы',
+    )
+
+    counter_fields = ('posts_count',)
 
     class Meta:
         verbose_name = 'группа'
@@ -39,35 +49,103 @@ class Post(TextAuthorModel):
         on_delete=models.SET_NULL,
         null=True,
         blank=True,
+        db_index=False,
         verbose_name='группа',
         help_text='выберите группу',
     )
     image = models.ImageField(
         'изображение',
         upload_to='posts/',
+        storage=ContentAddressedStorage(),
         blank=True,
+        validators=(images.validate_pixel_size,),
         help_text='добавьте изображение',
     )
+    # метаданные оригинала, чтобы не открывать файл: размеры в пикселях
+    # показывает админка, а в шаблоне они не нужны - все варианты
+    # обрезаются до POST_IMAGE_SIZE. width_field/height_field у ImageField
+    # не подходят: при пустых размерах он читает файл в каждом post_init
+    image_width = models.PositiveIntegerField(
+        'ширина изображения',
+        null=True,
+        editable=False,
+    )
+    image_height = models.PositiveIntegerField(
+        'высота изображения',
+        null=True,
+        editable=False,
+    )
+    image_size = models.PositiveIntegerField(
+        'размер изображения, байт',
+        null=True,
+        editable=False,
+    )
+    image_color = models.CharField(
+        'основной цвет изображения',
+        max_length=7,
+        blank=True,
+        editable=False,
+    )
+    comments_count = models.PositiveIntegerField(
+        'число комментариев',
+        default=0,
+        editable=False,
+        help_text='число комментариев к посту',
+    )
+
+    counter_fields = ('comments_count',)
 
     class Meta(DefaultModel.Meta, TextAuthorModel.Meta):
         default_related_name = 'posts'
+        # обратный проход по (x, created) даёт ORDER BY created DESC, id DESC
+        # без сортировки: id в SQLite - скрытый последний столбец индекса
+        indexes = (
+            models.Index(
+                fields=('author', 'created'),
+                name='post_author_created_idx',
+            ),
+            models.Index(
+                fields=('group', 'created'),
+                name='post_group_created_idx',
+            ),
+        )
         verbose_name = 'пост'
         verbose_name_plural = 'посты'
 
     def __str__(self) -> str:
         return truncatechars(self.text, settings.NUMCATECHARS)
 
+    def save(self, *args, **kwargs) -> None:
+        if self.image and not self.image._committed:
+            normalized = images.normalize(self.image.file, self.image.name)
+            self.image = normalized.file
+            self.image_width = normalized.width
+            self.image_height = normalized.height
+            self.image_size = normalized.file.size
+            self.image_color = normalized.color
+        elif not self.image:
+            self.image_width = self.image_height = self.image_size = None
+            self.image_color = ''
+        super().save(*args, **kwargs)
+
 
 class Comment(TextAuthorModel):
     post = models.ForeignKey(
         Post,
         on_delete=models.CASCADE,
+        db_index=False,
         verbose_name='пост',
         help_text='укажите пост для комментария',
     )
 
     class Meta(DefaultModel.Meta, TextAuthorModel.Meta):
         default_related_name = 'comments'
+        indexes = (
+            models.Index(
+                fields=('post', 'created'),
+                name='comment_post_created_idx',
+            ),
+        )
         verbose_name = 'комментарий'
         verbose_name_plural = 'комментарии'
 
@@ -80,6 +158,7 @@ class Follow(DefaultModel):
         User,
         related_name='follower',
         on_delete=models.CASCADE,
+        db_index=False,
         verbose_name='подписчик',
         help_text='укажите подписчика',
     )
@@ -92,12 +171,92 @@ class Follow(DefaultModel):
     )
 
     class Meta:
-        UniqueConstraint(
-            fields=['user', 'author'],
-            name='unique_follow',
+        constraints = (
+            UniqueConstraint(
+                fields=('user', 'author'),
+                name='unique_follow',
+            ),
+            CheckConstraint(
+                check=~Q(user=F('author')),
+                name='follow_not_self',
+            ),
         )
         verbose_name = 'подписчик'
         verbose_name_plural = 'подписчики'
 
     def __str__(self) -> str:
         return f'{self.user.username} подписан на {self.author.username}'
+
+
+class Timeline(DefaultModel):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='подписчик',
+        help_text='владелец ленты',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timelines',
+        verbose_name='пост',
+        help_text='пост в ленте подписчика',
+    )
+    created = models.DateTimeField(
+        'дата создания',
+        help_text='дата создания поста',
+    )
+
+    class Meta:
+        ordering = ('-created',)
+        indexes = (
+            models.Index(
+                fields=('user', '-created'),
+                name='timeline_user_created_idx',
+            ),
+        )
+        constraints = (
+            UniqueConstraint(
+                fields=('user', 'post'),
+                name='unique_timeline_post',
+            ),
+        )
+        verbose_name = 'запись ленты'
+        verbose_name_plural = 'ленты подписок'
+
+    def __str__(self) -> str:
+        return f'{self.post} в ленте {self.user.username}'
+
+
+class AuthorStats(DefaultModel):
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='автор',
+        help_text='автор, для которого ведутся счётчики',
+    )
+    posts_count = models.PositiveIntegerField(
+        'число постов',
+        default=0,
+        help_text='число постов автора',
+    )
+    followers_count = models.PositiveIntegerField(
+        'число подписчиков',
+        default=0,
+        help_text='число подписчиков автора',
+    )
+    following_count = models.PositiveIntegerField(
+        'число подписок',
+        default=0,
+        help_text='число авторов, на которых подписан пользователь',
+    )
+
+    class Meta:
+        verbose_name = 'счётчики автора'
+        verbose_name_plural = 'счётчики авторов'
+
+    def __str__(self) -> str:
+        return f'Счётчики {self.user.username}'
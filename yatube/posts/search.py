@@ -0,0 +1,84 @@
+import re
+from typing import Optional
+
+from django.db import connections
+from django.db.backends.base.base import BaseDatabaseWrapper
+from django.db.models import FloatField, QuerySet
+from django.db.models.expressions import RawSQL
+
+from core.paginator import KeysetPaginator
+from posts.models import Post
+
+# таблицу FTS5 и триггеры, которые её обновляют, создаёт миграция
+# posts.0002_post_search
+TABLE = 'posts_post_fts'
+
+TOKEN = re.compile(r'\w+')
+
+
+def supported(connection: BaseDatabaseWrapper) -> bool:
+    return connection.vendor == 'sqlite'
+
+
+def match_expression(query: str) -> Optional[str]:
+    """Запрос FTS5 из пользовательского ввода: все слова как префиксы.
+
+    Синтаксис FTS5 (кавычки, NEAR, OR, столбцы) из ввода не передаётся,
+    поэтому любой текст даёт корректный запрос. Поиск по префиксу
+    заменяет стемминг, которого нет у токенизатора для русского языка.
+    """
+    tokens = TOKEN.findall(query.lower())
+    if not tokens:
+        return None
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def matching(queryset: QuerySet, expression: str) -> QuerySet:
+    """Фильтр по индексу без ранжирования и без изменения сортировки."""
+    # RawSQL в `id__in` оборачивается в лишние скобки, и SQLite
+    # сравнивает id только с первой строкой подзапроса
+    return queryset.extra(
+        where=(
+            f'posts_post.id IN '
+            f'(SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s)',
+        ),
+        params=(expression,),
+    )
+
+
+def search(query: str, queryset: Optional[QuerySet] = None) -> QuerySet:
+    """Посты, подходящие под запрос, с релевантностью в поле `rank`.
+
+    Чем меньше `rank` (BM25 в FTS5), тем выше пост, поэтому выдача
+    отсортирована по (`rank`, `id`) по возрастанию. На базах без FTS5
+    работает обычный поиск по вхождению с сортировкой по дате.
+    """
+    queryset = Post.objects.all() if queryset is None else queryset
+    expression = match_expression(query)
+    if expression is None:
+        return queryset.none()
+    if not supported(connections[queryset.db]):
+        return queryset.filter(text__icontains=query.strip()).order_by(
+            '-created',
+            '-id',
+        )
+    return (
+        queryset.extra(
+            tables=(TABLE,),
+            where=(f'{TABLE}.rowid = posts_post.id', f'{TABLE} MATCH %s'),
+            params=(expression,),
+        )
+        .annotate(rank=RawSQL(f'{TABLE}.rank', (), output_field=FloatField()))
+        .order_by('rank', 'id')
+    )
+
+
+def paginator(queryset: QuerySet, per_page: int) -> KeysetPaginator:
+    if 'rank' in queryset.query.annotations:
+        return KeysetPaginator(
+            queryset,
+            per_page,
+            keys=('rank', 'id'),
+            descending=False,
+        )
+    return KeysetPaginator(queryset, per_page)
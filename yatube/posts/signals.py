@@ -0,0 +1,234 @@
+from functools import partial
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from core import storage, thumbnails
+from core.cache import bump_tables
+from posts import (
+    autocomplete,
+    comments,
+    counters,
+    feeds,
+    follows,
+    invalidation,
+    timelines,
+)
+from posts.models import AuthorStats, Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+@receiver(post_delete, sender=Group)
+def invalidate_post_counts(**kwargs) -> None:
+    transaction.on_commit(partial(bump_tables, Post))
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow_counts(**kwargs) -> None:
+    transaction.on_commit(partial(bump_tables, Follow))
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def forget_author_posts(instance: Post, **kwargs) -> None:
+    transaction.on_commit(
+        partial(feeds.forget_author_posts, instance.author_id),
+    )
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(instance: Post, created: bool, **kwargs) -> None:
+    if created and timelines.enabled():
+        timelines.fan_out(instance)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(instance: Follow, created: bool, **kwargs) -> None:
+    if created and timelines.enabled():
+        timelines.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def clear_timeline(instance: Follow, **kwargs) -> None:
+    if timelines.enabled():
+        timelines.remove(instance.user_id, instance.author_id)
+
+
+@receiver(pre_save, sender=Post)
+def remember_previous_post(instance: Post, **kwargs) -> None:
+    previous = (
+        Post.objects.filter(pk=instance.pk)
+        .values_list('group_id', 'image')
+        .first()
+        if instance.pk
+        else None
+    )
+    previous = previous or (None, None)
+    instance._previous_group_id, instance._previous_image = previous
+
+
+@receiver(post_save, sender=Post)
+def pregenerate_thumbnails(instance: Post, **kwargs) -> None:
+    image = instance.image.name
+    if image and image != getattr(instance, '_previous_image', None):
+        transaction.on_commit(
+            partial(
+                thumbnails.pregenerate,
+                instance.image,
+                invalidation.post_scopes(instance),
+            ),
+        )
+
+
+@receiver(post_save, sender=Post)
+def count_image_refs(instance: Post, **kwargs) -> None:
+    image = instance.image.name
+    previous = getattr(instance, '_previous_image', None)
+    if image != previous:
+        storage.retain(image)
+        storage.release(previous, instance.image.storage)
+
+
+@receiver(post_delete, sender=Post)
+def release_image(instance: Post, **kwargs) -> None:
+    storage.release(instance.image.name, instance.image.storage)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_pages(instance: Post, **kwargs) -> None:
+    group_ids = {
+        instance.group_id,
+        getattr(instance, '_previous_group_id', None),
+    } - {None}
+    slugs = (
+        list(
+            Group.objects.filter(pk__in=group_ids).values_list(
+                'slug',
+                flat=True,
+            ),
+        )
+        if group_ids
+        else ()
+    )
+    transaction.on_commit(
+        partial(
+            invalidation.invalidate_feeds,
+            usernames=(instance.author.username,),
+            slugs=slugs,
+        ),
+    )
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment_pages(instance: Comment, **kwargs) -> None:
+    post = instance.post
+    # в карточках главной ленты нет ничего о комментариях
+    transaction.on_commit(
+        partial(
+            invalidation.invalidate_feeds,
+            usernames=(post.author.username,),
+            slugs=(post.group.slug,) if post.group_id else (),
+            index=False,
+        ),
+    )
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_group_pages(**kwargs) -> None:
+    transaction.on_commit(invalidation.invalidate_groups)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow_pages(instance: Follow, **kwargs) -> None:
+    transaction.on_commit(
+        partial(follows.forget_followed_ids, instance.user_id),
+    )
+    transaction.on_commit(
+        partial(
+            invalidation.invalidate_follows,
+            instance.user_id,
+            instance.user.username,
+            instance.author.username,
+        ),
+    )
+
+
+@receiver(post_save, sender=User)
+def create_author_stats(instance: User, created: bool, **kwargs) -> None:
+    if created and not kwargs.get('raw'):
+        AuthorStats.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=Post)
+def count_saved_post(instance: Post, created: bool, **kwargs) -> None:
+    if created:
+        counters.post_created(instance)
+        return
+    previous_group_id = getattr(instance, '_previous_group_id', None)
+    if previous_group_id != instance.group_id:
+        counters.post_moved(instance, previous_group_id)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(instance: Post, **kwargs) -> None:
+    counters.post_deleted(instance)
+
+
+@receiver(post_save, sender=Comment)
+def count_saved_comment(instance: Comment, created: bool, **kwargs) -> None:
+    if created:
+        counters.comment_changed(instance, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(instance: Comment, **kwargs) -> None:
+    counters.comment_changed(instance, -1)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def forget_comments_page(instance: Comment, **kwargs) -> None:
+    transaction.on_commit(
+        partial(comments.forget_first_page, instance.post_id),
+    )
+
+
+@receiver(post_save, sender=Follow)
+def count_saved_follow(instance: Follow, created: bool, **kwargs) -> None:
+    if created:
+        counters.follow_changed(instance, 1)
+
+
+@receiver(post_delete, sender=Follow)
+def count_deleted_follow(instance: Follow, **kwargs) -> None:
+    counters.follow_changed(instance, -1)
+
+
+@receiver(post_save, sender=User)
+def index_user(instance: User, **kwargs) -> None:
+    autocomplete.users.saved(instance)
+
+
+@receiver(post_delete, sender=User)
+def unindex_user(instance: User, **kwargs) -> None:
+    autocomplete.users.deleted(instance)
+
+
+@receiver(post_save, sender=Group)
+def index_group(instance: Group, **kwargs) -> None:
+    autocomplete.groups.saved(instance)
+
+
+@receiver(post_delete, sender=Group)
+def unindex_group(instance: Group, **kwargs) -> None:
+    autocomplete.groups.deleted(instance)
@@ -0,0 +1,434 @@
+import multiprocessing
+import random
+from datetime import datetime, timedelta
+from io import BytesIO
+from typing import Callable, Dict, Iterator, List, NamedTuple, Tuple
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.color import no_style
+from django.db import connection, connections, transaction
+from django.db.models import Count, Max
+from django.utils import timezone
+from faker import Faker
+from PIL import Image, ImageDraw
+
+from core import storage
+from posts import counters, images, invalidation, timelines
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+# хвост распределения Парето: у немногих постов и пользователей
+# комментариев и подписок в десятки раз больше среднего
+PARETO_SHAPE = 1.5
+PARETO_MEAN = PARETO_SHAPE / (PARETO_SHAPE - 1)
+
+# посты пишутся сериями: в серии в среднем BURST_MEAN постов
+# с промежутками около BURST_GAP
+BURST_MEAN = 3
+BURST_GAP = timedelta(minutes=10)
+
+COMMENT_DELAY = timedelta(hours=6)
+
+GROUP_SHARE = 0.7
+
+
+class Plan(NamedTuple):
+    """Параметры набора данных, общие для всех процессов."""
+
+    users: int
+    groups: int
+    posts: int
+    comments: int
+    follows: int
+    image_share: float
+    skew: float
+    seed: int
+    start: datetime
+    end: datetime
+    user_base: int
+    group_base: int
+    post_base: int
+    images: Tuple[Tuple[str, images.ImageInfo], ...]
+    words: Tuple[str, ...]
+    first_names: Tuple[str, ...]
+    last_names: Tuple[str, ...]
+
+
+def zipf(rng: random.Random, size: int, skew: float) -> int:
+    """Номер n от 0 до size - 1 с вероятностью ~ 1 / (n + 1) ** skew.
+
+    Непрерывное приближение обратной функцией распределения, без таблицы
+    весов: память не зависит от числа пользователей.
+    """
+    if skew == 1:
+        value = (size + 1) ** rng.random()
+    else:
+        power = 1 - skew
+        value = (((size + 1) ** power - 1) * rng.random() + 1) ** (1 / power)
+    return min(int(value) - 1, size - 1)
+
+
+def heavy_count(rng: random.Random, mean: float, limit: int) -> int:
+    """Случайное число с заданным средним и тяжёлым хвостом."""
+    value = mean * rng.paretovariate(PARETO_SHAPE) / PARETO_MEAN
+    return min(int(value + rng.random()), limit)
+
+
+def text(
+    rng: random.Random,
+    words: Tuple[str, ...],
+    low: int,
+    high: int,
+) -> str:
+    return ' '.join(rng.choices(words, k=rng.randint(low, high))).capitalize()
+
+
+def moment(rng: random.Random, plan: Plan) -> datetime:
+    return plan.start + (plan.end - plan.start) * rng.random()
+
+
+def seeded(plan: Plan, kind: str, start: int) -> random.Random:
+    # одинаковый результат при любом числе процессов
+    return random.Random(f'{plan.seed}:{kind}:{start}')
+
+
+def insert(model, columns: Tuple[str, ...], rows: List[tuple]) -> None:
+    """Вставляет строки многострочными INSERT, минуя объекты моделей.
+
+    bulk_create создаёт объект и готовит каждое значение через поле
+    модели, на миллионах строк это дороже самой записи. Значения в `rows`
+    уже должны быть в виде для базы, даты - после `stamp`.
+    """
+    quote = connection.ops.quote_name
+    fields = [model._meta.get_field(column) for column in columns]
+    names = ', '.join(quote(field.column) for field in fields)
+    row = f'({", ".join(["%s"] * len(fields))})'
+    size = max(connection.ops.bulk_batch_size(fields, rows), 1)
+    with connection.cursor() as cursor:
+        for begin in range(0, len(rows), size):
+            end = begin + size
+            batch = rows[begin:end]
+            cursor.execute(
+                f'INSERT INTO {quote(model._meta.db_table)} ({names}) '
+                f'VALUES {", ".join([row] * len(batch))}',
+                [value for values in batch for value in values],
+            )
+
+
+def stamp(value: datetime):
+    return connection.ops.adapt_datetimefield_value(value)
+
+
+def make_users(plan: Plan, start: int, count: int) -> int:
+    rng = seeded(plan, 'users', start)
+    password = make_password(None)
+    joined = stamp(plan.start)
+    insert(
+        User,
+        (
+            'id',
+            'username',
+            'first_name',
+            'last_name',
+            'email',
+            'password',
+            'is_superuser',
+            'is_staff',
+            'is_active',
+            'date_joined',
+        ),
+        [
+            (
+                user_id,
+                f'user{user_id}',
+                rng.choice(plan.first_names),
+                rng.choice(plan.last_names),
+                '',
+                password,
+                False,
+                False,
+                True,
+                joined,
+            )
+            for user_id in range(start, start + count)
+        ],
+    )
+    return count
+
+
+def make_posts(plan: Plan, start: int, count: int) -> int:
+    """Посты с номерами start..start + count - 1 и комментарии к ним.
+
+    Авторы, группы и популярность постов распределены по степенному
+    закону, а посты одного автора идут сериями.
+    """
+    rng = seeded(plan, 'posts', start)
+    posts = []
+    comments = []
+    mean = plan.comments / plan.posts
+    no_image = ('', None, None, None, '')
+    while len(posts) < count:
+        author_id = plan.user_base + zipf(rng, plan.users, plan.skew)
+        created = moment(rng, plan)
+        for _ in range(1 + int(rng.expovariate(1 / (BURST_MEAN - 1)))):
+            if len(posts) == count:
+                break
+            post_id = start + len(posts)
+            created = min(created + BURST_GAP * rng.expovariate(1), plan.end)
+            group_id = None
+            if plan.groups and rng.random() < GROUP_SHARE:
+                group_id = plan.group_base + zipf(rng, plan.groups, plan.skew)
+            image = no_image
+            if plan.images and rng.random() < plan.image_share:
+                name, info = rng.choice(plan.images)
+                image = (name, *info)
+            comments_count = heavy_count(rng, mean, int(mean * 100) + 1)
+            posts.append(
+                (
+                    post_id,
+                    author_id,
+                    group_id,
+                    text(rng, plan.words, 5, 60),
+                    stamp(created),
+                    *image,
+                    comments_count,
+                ),
+            )
+            comments.extend(
+                (
+                    post_id,
+                    plan.user_base + zipf(rng, plan.users, plan.skew),
+                    text(rng, plan.words, 3, 25),
+                    stamp(
+                        min(
+                            created + COMMENT_DELAY * rng.expovariate(1),
+                            plan.end,
+                        ),
+                    ),
+                )
+                for _ in range(comments_count)
+            )
+    insert(
+        Post,
+        (
+            'id',
+            'author',
+            'group',
+            'text',
+            'created',
+            'image',
+            'image_width',
+            'image_height',
+            'image_size',
+            'image_color',
+            'comments_count',
+        ),
+        posts,
+    )
+    insert(Comment, ('post', 'author', 'text', 'created'), comments)
+    return count + len(comments)
+
+
+def make_follows(plan: Plan, start: int, count: int) -> int:
+    """Подписки пользователей start..start + count - 1.
+
+    Число подписок у пользователя распределено с тяжёлым хвостом, а
+    авторов выбирают по степенному закону: у немногих авторов
+    большинство подписчиков.
+    """
+    rng = seeded(plan, 'follows', start)
+    mean = plan.follows / plan.users
+    follows = []
+    for user_id in range(start, start + count):
+        wanted = heavy_count(rng, mean, plan.users - 1)
+        authors = set()
+        for _ in range(wanted * 4):
+            if len(authors) == wanted:
+                break
+            author_id = plan.user_base + zipf(rng, plan.users, plan.skew)
+            if author_id != user_id:
+                authors.add(author_id)
+        follows.extend((user_id, author_id) for author_id in authors)
+    insert(Follow, ('user', 'author'), follows)
+    return len(follows)
+
+
+STEPS: Dict[str, Callable[[Plan, int, int], int]] = {
+    'users': make_users,
+    'posts': make_posts,
+    'follows': make_follows,
+}
+
+
+def run_unit(unit: Tuple[str, Plan, int, int]) -> Tuple[str, int]:
+    kind, plan, start, count = unit
+    with transaction.atomic():
+        return kind, STEPS[kind](plan, start, count)
+
+
+def units(
+    kind: str,
+    plan: Plan,
+    base: int,
+    total: int,
+    chunk_size: int,
+) -> List[Tuple[str, Plan, int, int]]:
+    return [
+        (kind, plan, start, min(chunk_size, base + total - start))
+        for start in range(base, base + total, chunk_size)
+    ]
+
+
+def execute(
+    jobs: List[Tuple[str, Plan, int, int]],
+    processes: int,
+) -> Iterator[Tuple[str, int]]:
+    """Выполняет части по очереди или в `processes` процессах.
+
+    Части независимы: номера записей заданы заранее, поэтому процессы
+    пишут в базу параллельно без согласования.
+    """
+    if processes <= 1:
+        yield from map(run_unit, jobs)
+        return
+    # дочерним процессам нельзя наследовать открытые соединения
+    connections.close_all()
+    with multiprocessing.get_context('fork').Pool(processes) as pool:
+        yield from pool.imap_unordered(run_unit, jobs)
+
+
+def next_id(model) -> int:
+    return (model.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+
+
+def make_images(
+    count: int,
+    seed: int,
+) -> Tuple[Tuple[str, images.ImageInfo], ...]:
+    """Сохраняет `count` разных картинок и возвращает их имена и метаданные."""
+    rng = random.Random(f'{seed}:images')
+    field = Post._meta.get_field('image')
+    found = []
+    for number in range(count):
+        picture = Image.new(
+            'RGB',
+            settings.POST_IMAGE_SIZE,
+            tuple(rng.randrange(256) for _ in range(3)),
+        )
+        draw = ImageDraw.Draw(picture)
+        for _ in range(8):
+            x, y = (rng.randrange(side) for side in picture.size)
+            draw.ellipse(
+                (x, y, x + rng.randrange(50, 300), y + rng.randrange(50, 300)),
+                fill=tuple(rng.randrange(256) for _ in range(3)),
+            )
+        buffer = BytesIO()
+        picture.save(buffer, 'PNG')
+        normalized = images.normalize(buffer, f'synthetic-{number}.png')
+        name = field.storage.save(
+            field.generate_filename(None, normalized.file.name),
+            normalized.file,
+        )
+        found.append(
+            (
+                name,
+                images.ImageInfo(
+                    normalized.width,
+                    normalized.height,
+                    normalized.file.size,
+                    normalized.color,
+                ),
+            ),
+        )
+    return tuple(found)
+
+
+def make_plan(
+    users: int,
+    groups: int,
+    posts: int,
+    comments: int,
+    follows: int,
+    image_count: int,
+    image_share: float,
+    days: int,
+    skew: float,
+    seed: int,
+) -> Plan:
+    fake = Faker('ru_RU')
+    fake.seed_instance(seed)
+    end = timezone.now()
+    return Plan(
+        users=users,
+        groups=groups,
+        posts=posts,
+        comments=comments,
+        follows=follows,
+        image_share=image_share,
+        skew=skew,
+        seed=seed,
+        start=end - timedelta(days=days),
+        end=end,
+        user_base=next_id(User),
+        group_base=next_id(Group),
+        post_base=next_id(Post),
+        images=make_images(image_count, seed),
+        words=tuple(fake.words(2000)),
+        first_names=tuple(fake.first_name() for _ in range(300)),
+        last_names=tuple(fake.last_name() for _ in range(300)),
+    )
+
+
+def make_groups(plan: Plan) -> int:
+    rng = seeded(plan, 'groups', plan.group_base)
+    Group.objects.bulk_create(
+        (
+            Group(
+                id=group_id,
+                title=text(rng, plan.words, 1, 3)[:200],
+                slug=f'group-{group_id}',
+                description=text(rng, plan.words, 10, 40),
+            )
+            for group_id in range(
+                plan.group_base,
+                plan.group_base + plan.groups,
+            )
+        ),
+    )
+    return plan.groups
+
+
+def finish(plan: Plan) -> None:
+    """Приводит в порядок всё, что обычно поддерживают сигналы.
+
+    bulk_create не отправляет post_save, поэтому здесь сдвигаются
+    последовательности ключей, считаются ссылки на картинки, счётчики
+    авторов и групп, ленты подписок и сбрасываются кэши страниц.
+    """
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(
+            no_style(),
+            [User, Group, Post, Comment, Follow],
+        ):
+            cursor.execute(sql)
+    references = (
+        Post.objects.filter(
+            id__gte=plan.post_base,
+            image__in=[name for name, _ in plan.images],
+        )
+        .order_by()
+        .values_list('image')
+        .annotate(count=Count('id'))
+    )
+    for name, count in references:
+        storage.retain(name, count)
+    counters.reconcile()
+    if settings.FOLLOW_FEED == 'timeline':
+        timelines.rebuild(
+            range(plan.user_base, plan.user_base + plan.users),
+        )
+    invalidation.invalidate_feeds()
+    invalidation.invalidate_groups()
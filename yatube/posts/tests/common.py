@@ -1,7 +1,9 @@
 from io import BytesIO
 from typing import Tuple
+from unittest import mock
 
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase
 from PIL import Image
 
 from posts.models import Post
@@ -18,6 +20,17 @@ def image(name: str = 'giffy.gif') -> SimpleUploadedFile:
     )
 
 
+def run_on_commit(test: TestCase) -> None:
+    # TestCase не фиксирует транзакции, и колбэки on_commit теряются;
+    # в работе они выполняются в том же запросе после фиксации
+    patcher = mock.patch(
+        'django.db.transaction.on_commit',
+        side_effect=lambda callback: callback(),
+    )
+    patcher.start()
+    test.addCleanup(patcher.stop)
+
+
 def postfields_check(
     self,
     got: Post,
@@ -0,0 +1,155 @@
+import time
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts import autocomplete
+from posts.models import Group
+
+User = get_user_model()
+
+
+class PrefixIndexTests(TestCase):
+    def test_prefix_search(self) -> None:
+        index = autocomplete.PrefixIndex()
+        index.put(1, ('anna', 'Анна'), {'id': 1})
+        index.put(2, ('annette',), {'id': 2})
+        index.put(3, ('boris', 'anatoly'), {'id': 3})
+        self.assertEqual(index.search('ANN', 10), [{'id': 1}, {'id': 2}])
+        self.assertEqual(index.search('an', 2), [{'id': 3}, {'id': 1}])
+        self.assertEqual(index.search('ан', 10), [{'id': 1}])
+        index.put(1, ('zoe',), {'id': 1})
+        index.remove(2)
+        self.assertEqual(index.search('ann', 10), [])
+        self.assertEqual(len(index.keys), 3)
+
+    def test_built_at_once_like_put(self) -> None:
+        entries = [
+            (3, ('boris', 'anatoly'), {'id': 3}),
+            (1, ('anna', 'Анна', ''), {'id': 1}),
+            (2, ('annette',), {'id': 2}),
+        ]
+        built = autocomplete.PrefixIndex.from_entries(entries)
+        incremental = autocomplete.PrefixIndex()
+        for entry in entries:
+            incremental.put(*entry)
+        self.assertEqual(built.keys, incremental.keys)
+        self.assertEqual(built.items, incremental.items)
+
+
+class AutocompleteTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(
+            username='leo',
+            first_name='Лев',
+            last_name='Толстой',
+        )
+        cls.group = Group.objects.create(
+            title='Литература',
+            slug='lit',
+            description='Книги',
+        )
+
+    def setUp(self) -> None:
+        for source in (autocomplete.users, autocomplete.groups):
+            source.reset()
+            self.addCleanup(source.reset)
+
+    def test_endpoint_served_from_index(self) -> None:
+        address = reverse('posts:autocomplete')
+        self.client.get(address, {'q': 'l'})
+        with self.assertNumQueries(0):
+            response = self.client.get(address, {'q': 'Л'})
+        found = response.json()
+        self.assertEqual(found['users'][0]['username'], 'leo')
+        self.assertEqual(found['groups'][0]['slug'], 'lit')
+        self.assertEqual(
+            found['groups'][0]['url'],
+            reverse('posts:group_list', args=('lit',)),
+        )
+
+    def test_index_follows_signals(self) -> None:
+        autocomplete.suggest('x')
+        User.objects.create_user(username='lermontov')
+        self.group.slug = 'books'
+        self.group.save()
+        with self.assertNumQueries(0):
+            found = autocomplete.suggest('le')
+            self.assertEqual(
+                [user['username'] for user in found['users']],
+                ['leo', 'lermontov'],
+            )
+            found = autocomplete.suggest('books')
+            self.assertEqual(found['groups'][0]['id'], self.group.id)
+        Group.objects.filter(id=self.group.id).delete()
+        self.assertEqual(autocomplete.suggest('books')['groups'], [])
+
+    def test_expired_index_refreshed_in_background(self) -> None:
+        autocomplete.suggest('x')
+        index = autocomplete.users.index
+        autocomplete.users.built = time.monotonic() - 3600
+        with mock.patch('posts.autocomplete.threading.Thread') as thread:
+            with self.assertNumQueries(0):
+                autocomplete.suggest('l')
+                autocomplete.suggest('l')
+        thread.assert_called_once()
+        thread.return_value.start.assert_called_once()
+        self.assertIs(autocomplete.users.index, index)
+
+    def test_changes_during_rebuild_kept(self) -> None:
+        build = autocomplete.users.build
+
+        def build_and_change():
+            index = build()
+            # пользователь создан, пока построенный индекс ещё не подменён
+            User.objects.create_user(username='lermontov')
+            return index
+
+        with mock.patch.object(
+            autocomplete.users,
+            'build',
+            side_effect=build_and_change,
+        ):
+            autocomplete.users.rebuild()
+        found = autocomplete.suggest('ler')['users']
+        self.assertEqual([user['username'] for user in found], ['lermontov'])
+
+    @override_settings(AUTOCOMPLETE_MAX_ENTRIES=0)
+    def test_database_fallback(self) -> None:
+        # LIKE в SQLite не различает регистр только у латиницы
+        found = autocomplete.suggest('Тол')
+        self.assertEqual(found['users'][0]['username'], 'leo')
+        self.assertIsNone(autocomplete.users.index)
+
+    def test_admin_lookup(self) -> None:
+        admin = Client()
+        admin.force_login(
+            User.objects.create_superuser('admin', 'a@a.ru', 'pass'),
+        )
+        User.objects.filter(id=self.user.id).update(email='leo@tolstoy.ru')
+        # список объектов ищет по подстроке во всех search_fields
+        for term in ('tolstoy.ru', 'eo'):
+            with self.subTest(term=term):
+                response = admin.get(
+                    reverse('admin:auth_user_changelist'),
+                    {'q': term},
+                )
+                self.assertEqual(
+                    list(response.context['cl'].result_list),
+                    [self.user],
+                )
+        # виджет автодополнения - по префиксам из индекса
+        for name, term, found in (
+            ('admin:auth_user_autocomplete', 'лев', self.user),
+            ('admin:posts_group_autocomplete', 'лит', self.group),
+        ):
+            with self.subTest(name=name):
+                response = admin.get(reverse(name), {'term': term})
+                self.assertEqual(
+                    [item['id'] for item in response.json()['results']],
+                    [str(found.id)],
+                )
@@ -0,0 +1,103 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from mixer.backend.django import mixer
+
+from posts.models import AuthorStats, Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class CountersTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user, cls.author = mixer.cycle(2).blend(User)
+        cls.group, cls.other_group = mixer.cycle(2).blend('posts.group')
+
+    def assertCounters(self, obj, **expected) -> None:
+        obj.refresh_from_db()
+        for field, value in expected.items():
+            with self.subTest(field=field):
+                self.assertEqual(
+                    getattr(obj, field),
+                    value,
+                    f'счётчик {field} не совпадает с ожидаемым',
+                )
+
+    def test_post_counters(self) -> None:
+        post = Post.objects.create(
+            author=self.author,
+            group=self.group,
+            text='Пост',
+        )
+        self.assertCounters(self.author.stats, posts_count=1)
+        self.assertCounters(self.group, posts_count=1)
+        post.group = self.other_group
+        post.save()
+        self.assertCounters(self.group, posts_count=0)
+        self.assertCounters(self.other_group, posts_count=1)
+        post.delete()
+        self.assertCounters(self.author.stats, posts_count=0)
+        self.assertCounters(self.other_group, posts_count=0)
+
+    def test_comment_counter_not_overwritten_by_stale_save(self) -> None:
+        post = Post.objects.create(author=self.author, text='Пост')
+        stale = Post.objects.get(id=post.id)
+        Comment.objects.create(post=post, author=self.user, text='Коммент')
+        stale.text = 'Изменённый пост'
+        stale.save()
+        self.assertCounters(post, comments_count=1, text='Изменённый пост')
+        Comment.objects.get().delete()
+        self.assertCounters(post, comments_count=0)
+
+    def test_follow_counters(self) -> None:
+        follow = Follow.objects.create(user=self.user, author=self.author)
+        self.assertCounters(self.author.stats, followers_count=1)
+        self.assertCounters(self.user.stats, following_count=1)
+        follow.delete()
+        self.assertCounters(self.author.stats, followers_count=0)
+        self.assertCounters(self.user.stats, following_count=0)
+
+    def test_missing_stats_recreated(self) -> None:
+        Post.objects.create(author=self.author, text='Пост')
+        AuthorStats.objects.filter(user=self.author).delete()
+        Post.objects.create(author=self.author, text='Пост')
+        self.assertCounters(self.author.stats, posts_count=2)
+
+    def test_user_deletion_cascades(self) -> None:
+        Post.objects.create(author=self.author, group=self.group, text='Пост')
+        Follow.objects.create(user=self.user, author=self.author)
+        self.author.delete()
+        self.assertCounters(self.group, posts_count=0)
+        self.assertCounters(self.user.stats, following_count=0)
+
+    def test_reconcile_command_repairs_drift(self) -> None:
+        post = Post.objects.create(author=self.author, group=self.group)
+        Comment.objects.create(post=post, author=self.user, text='Коммент')
+        Follow.objects.create(user=self.user, author=self.author)
+        AuthorStats.objects.update(
+            posts_count=7,
+            followers_count=7,
+            following_count=7,
+        )
+        Group.objects.update(posts_count=7)
+        Post.objects.update(comments_count=7)
+        AuthorStats.objects.filter(user=self.user).delete()
+        out = StringIO()
+        call_command('reconcile_counters', stdout=out)
+        self.assertIn('posts: исправлено 1', out.getvalue())
+        self.assertCounters(
+            self.author.stats,
+            posts_count=1,
+            followers_count=1,
+            following_count=0,
+        )
+        self.assertCounters(
+            AuthorStats.objects.get(user=self.user),
+            following_count=1,
+        )
+        self.assertCounters(self.group, posts_count=1)
+        self.assertCounters(post, comments_count=1)
@@ -0,0 +1,222 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from mixer.backend.django import mixer
+
+from posts import timelines
+from posts.feeds import MergedFeed, author_posts, follow_feed
+from posts.models import Follow, Post, Timeline
+from posts.tests.common import run_on_commit
+
+User = get_user_model()
+
+
+@override_settings(FOLLOW_FEED='timeline', TIMELINE_LENGTH=3)
+class TimelineFeedTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user, cls.author_user, cls.other_user = mixer.cycle(3).blend(User)
+        cls.auth = Client()
+        cls.auth.force_login(cls.user)
+
+    def setUp(self) -> None:
+        cache.clear()
+        run_on_commit(self)
+
+    def timeline(self) -> list:
+        return list(
+            Timeline.objects.filter(user=self.user).values_list(
+                'post_id',
+                flat=True,
+            ),
+        )
+
+    def test_new_post_fanned_out_to_followers(self) -> None:
+        Follow.objects.create(user=self.user, author=self.author_user)
+        post = Post.objects.create(author=self.author_user, text='Пост')
+        Post.objects.create(author=self.other_user, text='Чужой пост')
+        self.assertEqual(self.timeline(), [post.id])
+        response = self.auth.get(reverse('posts:follow_index'))
+        self.assertEqual(list(response.context['page_obj']), [post])
+
+    def test_follow_backfills_and_unfollow_clears(self) -> None:
+        posts = [
+            Post.objects.create(author=self.author_user, text=f'Пост {num}')
+            for num in range(5)
+        ]
+        follow = Follow.objects.create(user=self.user, author=self.author_user)
+        self.assertEqual(
+            self.timeline(),
+            [post.id for post in posts[::-1][:3]],
+            'лента должна заполниться последними постами автора',
+        )
+        follow.delete()
+        self.assertEqual(self.timeline(), [])
+
+    def test_timeline_trimmed_to_length(self) -> None:
+        Follow.objects.create(user=self.user, author=self.author_user)
+        posts = [
+            Post.objects.create(author=self.author_user, text=f'Пост {num}')
+            for num in range(5)
+        ]
+        self.assertEqual(
+            self.timeline(),
+            [post.id for post in posts[::-1][:3]],
+        )
+
+    def test_follow_updates_feed_count(self) -> None:
+        posts = [
+            Post.objects.create(author=self.author_user, text=f'Пост {num}')
+            for num in range(3)
+        ]
+        address = reverse('posts:follow_index')
+        page = self.auth.get(address).context['page_obj']
+        self.assertEqual(page.paginator.count, 0)
+        self.auth.get(
+            reverse('posts:profile_follow', args=(self.author_user.username,)),
+        )
+        page = self.auth.get(address).context['page_obj']
+        self.assertEqual(page.paginator.count, 3)
+        self.assertEqual(list(page), posts[::-1])
+
+    def test_batch_size_fits_query_parameters(self) -> None:
+        with override_settings(TIMELINE_BATCH_SIZE=10_000):
+            size = timelines.batch_size()
+        fields = len(Timeline._meta.concrete_fields) - 1
+        self.assertLessEqual(
+            size * fields,
+            connection.features.max_query_params or size * fields,
+        )
+
+    def test_fan_out_trims_in_one_statement(self) -> None:
+        followers = mixer.cycle(3).blend(User)
+        for follower in followers:
+            Follow.objects.create(user=follower, author=self.author_user)
+        for num in range(4):
+            Post.objects.create(author=self.author_user, text=f'Пост {num}')
+        with CaptureQueriesContext(connection) as queries:
+            Post.objects.create(author=self.author_user, text='Новый')
+        deletes = [
+            query['sql']
+            for query in queries
+            if query['sql'].startswith('DELETE')
+        ]
+        self.assertEqual(len(deletes), 1)
+        for follower in followers:
+            self.assertEqual(
+                Timeline.objects.filter(user=follower).count(),
+                3,
+            )
+
+    @override_settings(FEED_KEYSET_PAGINATION=True, PAGE_SIZE=2)
+    def test_feed_ordered_by_timeline(self) -> None:
+        Follow.objects.create(user=self.user, author=self.author_user)
+        posts = [
+            Post.objects.create(author=self.author_user, text=f'Пост {num}')
+            for num in range(3)
+        ]
+        sql = str(follow_feed(self.user).query)
+        self.assertEqual(sql.count('JOIN "posts_timeline"'), 1)
+        self.assertIn('"posts_timeline"."created" AS "feed_created"', sql)
+        self.assertIn('ORDER BY "feed_created" DESC', sql)
+        address = reverse('posts:follow_index')
+        first = self.auth.get(address).context['page_obj']
+        with CaptureQueriesContext(connection) as queries:
+            second = self.auth.get(
+                address,
+                {'after': first.next_cursor},
+            ).context['page_obj']
+        # курсор ищется по той же записи ленты, без второго JOIN
+        feed_sql = next(
+            query['sql']
+            for query in queries
+            if 'AS "feed_created"' in query['sql']
+        )
+        self.assertEqual(feed_sql.count('JOIN "posts_timeline"'), 1)
+        self.assertEqual(
+            list(first) + list(second),
+            posts[::-1],
+        )
+
+    def test_rebuild_command(self) -> None:
+        Follow.objects.create(user=self.user, author=self.author_user)
+        post = Post.objects.create(author=self.author_user, text='Пост')
+        Timeline.objects.all().delete()
+        call_command('rebuild_timelines', stdout=StringIO())
+        self.assertEqual(self.timeline(), [post.id])
+
+
+@override_settings(FOLLOW_FEED='merge')
+class MergedFeedTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user, *cls.authors = mixer.cycle(4).blend(User)
+        cls.auth = Client()
+        cls.auth.force_login(cls.user)
+        for author in cls.authors[:2]:
+            Follow.objects.create(user=cls.user, author=author)
+        for num in range(21):
+            Post.objects.create(
+                author=cls.authors[num % 3],
+                text=f'Пост {num}',
+            )
+
+    def setUp(self):
+        cache.clear()
+        run_on_commit(self)
+
+    def test_merged_feed_matches_orm_feed(self) -> None:
+        expected = list(
+            Post.objects.filter(author__following__user=self.user),
+        )
+        pages = []
+        for number in (1, 2):
+            response = self.auth.get(
+                reverse('posts:follow_index') + f'?page={number}',
+            )
+            pages += list(response.context['page_obj'])
+        self.assertEqual(pages, expected)
+
+    def test_warm_feed_skips_posts_join(self) -> None:
+        self.auth.get(reverse('posts:follow_index'))
+        with self.assertNumQueries(2):
+            feed = MergedFeed(
+                self.user.follower.values_list('author_id', flat=True),
+            )
+            feed[0:10]
+
+    @override_settings(FEED_AUTHOR_LENGTH=2)
+    def test_cold_authors_loaded_in_one_query(self) -> None:
+        author_ids = [author.id for author in self.authors]
+        with self.assertNumQueries(1):
+            lists = author_posts(author_ids)
+        for author_id in author_ids:
+            self.assertEqual(
+                [post_id for _, post_id in lists[author_id]],
+                list(
+                    Post.objects.filter(author_id=author_id)
+                    .order_by('-created', '-id')
+                    .values_list('id', flat=True)[:2],
+                ),
+            )
+        with self.assertNumQueries(0):
+            self.assertEqual(author_posts(author_ids), lists)
+
+    def test_new_post_invalidates_author_list(self) -> None:
+        self.auth.get(reverse('posts:follow_index'))
+        post = Post.objects.create(author=self.authors[0], text='Новый')
+        response = self.auth.get(reverse('posts:follow_index'))
+        self.assertEqual(response.context['page_obj'][0], post)
+
+    def test_benchmark_command(self) -> None:
+        out = StringIO()
+        call_command('benchmark_follow_feed', '--repeat', '1', stdout=out)
+        self.assertIn(self.user.username, out.getvalue())
@@ -0,0 +1,86 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+from mixer.backend.django import mixer
+
+from posts import follows
+from posts.models import Follow, Post
+from posts.tests.common import run_on_commit
+
+User = get_user_model()
+
+
+class FollowStateTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user, cls.author, cls.other = mixer.cycle(3).blend(User)
+        cls.auth = Client()
+        cls.auth.force_login(cls.user)
+
+    def setUp(self) -> None:
+        cache.clear()
+        run_on_commit(self)
+        Follow.objects.create(user=self.user, author=self.author)
+
+    def test_batch_lookup_single_query(self) -> None:
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                follows.following(self.user, (self.author.id, self.other.id)),
+                {self.author.id},
+            )
+        with self.assertNumQueries(0):
+            self.assertFalse(
+                follows.is_following(AnonymousUser(), self.author.id),
+            )
+
+    def test_cached_set_used_and_invalidated(self) -> None:
+        follows.followed_ids(self.user.id)
+        with self.assertNumQueries(0):
+            self.assertTrue(follows.is_following(self.user, self.author.id))
+        Follow.objects.create(user=self.user, author=self.other)
+        self.assertTrue(follows.is_following(self.user, self.other.id))
+        Follow.objects.filter(user=self.user, author=self.author).delete()
+        self.assertEqual(
+            follows.followed_ids(self.user.id),
+            {self.other.id},
+            'множество подписок должно сбрасываться при отписке',
+        )
+
+    def test_feed_cards_follow_state(self) -> None:
+        Post.objects.create(author=self.author, text='Пост')
+        Post.objects.create(author=self.other, text='Пост')
+        response = self.auth.get(reverse('posts:index'))
+        self.assertEqual(
+            response.context['followed_authors'],
+            {self.author.id},
+        )
+        self.assertContains(
+            response,
+            reverse('posts:profile_follow', args=(self.other.username,)),
+        )
+        self.auth.get(
+            reverse('posts:profile_follow', args=(self.other.username,)),
+        )
+        response = self.auth.get(reverse('posts:index'))
+        self.assertEqual(
+            response.context['followed_authors'],
+            {self.author.id, self.other.id},
+            'кэш страницы должен сбрасываться после подписки',
+        )
+
+    def test_follower_profile_invalidated(self) -> None:
+        address = reverse('posts:profile', args=(self.user.username,))
+        etag = self.client.get(address)['ETag']
+        self.assertContains(self.client.get(address), 'подписок: 1')
+        for view, count in (
+            ('posts:profile_follow', 2),
+            ('posts:profile_unfollow', 1),
+        ):
+            with self.subTest(view=view):
+                self.auth.get(reverse(view, args=(self.other.username,)))
+                response = self.client.get(address, HTTP_IF_NONE_MATCH=etag)
+                self.assertContains(response, f'подписок: {count}')
+                etag = response['ETag']
@@ -1,12 +1,15 @@
 import shutil
 import tempfile
+from io import BytesIO
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.views import redirect_to_login
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 from mixer.backend.django import mixer
+from PIL import Image
 
 from posts.models import Comment, Follow, Post
 from posts.tests.common import image, postfields_check
@@ -15,6 +18,8 @@ User = get_user_model()
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
+HASHED_PNG = r'^posts/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.png$'
+
 
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
 class PostFormTests(TestCase):
@@ -60,11 +65,14 @@ class PostFormTests(TestCase):
             'После создания поста количество постов в базе не равно единице',
         )
         post = Post.objects.select_related('author', 'group').first()
+        self.assertRegex(post.image.name, HASHED_PNG)
         field_values = (
             ('text', 'Тестовый пост'),
             ('author', self.user),
             ('group', self.group),
-            ('image', 'posts/giffy.gif'),
+            ('image_width', 1),
+            ('image_height', 1),
+            ('image_size', post.image.size),
         )
         for field, expected in field_values:
             with self.subTest(field=field):
@@ -77,6 +85,90 @@ class PostFormTests(TestCase):
                     ),
                 )
 
+    @override_settings(POST_IMAGE_MAX_SIDE=100)
+    def test_uploaded_photo_normalized(self) -> None:
+        exif = Image.Exif()
+        exif[0x010F] = 'Камера'
+        file = BytesIO()
+        Image.new('RGB', (400, 200), (10, 200, 30)).save(
+            file,
+            'JPEG',
+            exif=exif,
+        )
+        self.auth.post(
+            reverse('posts:post_create'),
+            {
+                'text': 'Фото',
+                'image': SimpleUploadedFile('photo.jpeg', file.getvalue()),
+            },
+        )
+        post = Post.objects.get()
+        self.assertRegex(post.image.name, HASHED_PNG.replace('png', 'jpg'))
+        self.assertEqual((post.image_width, post.image_height), (100, 50))
+        with Image.open(post.image.path) as stored:
+            self.assertEqual(stored.size, (100, 50))
+            self.assertTrue(stored.info.get('progressive'))
+            self.assertNotIn('exif', stored.info)
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=100)
+    def test_too_many_pixels_rejected(self) -> None:
+        file = BytesIO()
+        Image.new('RGB', (20, 20)).save(file, 'PNG')
+        response = self.auth.post(
+            reverse('posts:post_create'),
+            {
+                'text': 'Бомба',
+                'image': SimpleUploadedFile('bomb.png', file.getvalue()),
+            },
+        )
+        self.assertFormError(
+            response,
+            'form',
+            'image',
+            'Изображение слишком большое: не больше 100 пикселей',
+        )
+        self.assertFalse(Post.objects.exists())
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=100)
+    def test_too_many_pixels_rejected_in_admin(self) -> None:
+        admin = Client()
+        admin.force_login(
+            User.objects.create_superuser('admin', 'a@a.ru', 'pass'),
+        )
+        file = BytesIO()
+        Image.new('RGB', (20, 20)).save(file, 'PNG')
+        response = admin.post(
+            reverse('admin:posts_post_add'),
+            {
+                'text': 'Бомба',
+                'author': self.user.id,
+                'image': SimpleUploadedFile('bomb.png', file.getvalue()),
+            },
+        )
+        self.assertFormError(
+            response,
+            'adminform',
+            'image',
+            'Изображение слишком большое: не больше 100 пикселей',
+        )
+        self.assertFalse(Post.objects.exists())
+
+    def test_image_metadata_shown_in_admin(self) -> None:
+        admin = Client()
+        admin.force_login(
+            User.objects.create_superuser('admin', 'a@a.ru', 'pass'),
+        )
+        post = Post.objects.create(author=self.user, text='Пост')
+        Post.objects.filter(id=post.id).update(
+            image_width=4321,
+            image_height=1234,
+        )
+        response = admin.get(
+            reverse('admin:posts_post_change', args=(post.id,)),
+        )
+        self.assertContains(response, '4321')
+        self.assertContains(response, '1234')
+
     def test_anon_user_create_post_denied(self) -> None:
         self.anon.post(
             reverse('posts:post_create'),
@@ -99,6 +191,7 @@ class PostFormTests(TestCase):
             group=self.group,
             image=image('new_giffy'),
         )
+        image_name = post.image.name
         response = self.author.post(
             reverse('posts:post_edit', args=(post.id,)),
             {'text': 'Тестовый пост отредактирован'},
@@ -124,7 +217,7 @@ class PostFormTests(TestCase):
             ('text', 'Тестовый пост отредактирован'),
             ('author', self.author_user),
             ('group', None),
-            ('image', 'posts/new_giffy'),
+            ('image', image_name),
         )
         for field, expected in field_values:
             with self.subTest(field=field):
@@ -0,0 +1,74 @@
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db.models import Count, Sum
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from core.models import StoredFile
+from posts.models import AuthorStats, Comment, Follow, Group, Post
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class GenerateDataTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def test_skewed_dataset(self) -> None:
+        call_command(
+            'generate_data',
+            users=40,
+            groups=4,
+            posts=300,
+            comments=600,
+            follows=200,
+            images=2,
+            seed=1,
+            chunk_size=70,
+            stdout=StringIO(),
+        )
+        self.assertEqual(User.objects.count(), 40)
+        self.assertEqual(Group.objects.count(), 4)
+        self.assertEqual(Post.objects.count(), 300)
+        self.assertTrue(Comment.objects.exists())
+        self.assertTrue(Follow.objects.exists())
+        self.assertEqual(
+            AuthorStats.objects.aggregate(total=Sum('posts_count'))['total'],
+            300,
+        )
+        self.assertEqual(
+            Post.objects.aggregate(total=Sum('comments_count'))['total'],
+            Comment.objects.count(),
+        )
+        authors = list(
+            Post.objects.values('author')
+            .annotate(count=Count('id'))
+            .order_by('-count')
+            .values_list('count', flat=True),
+        )
+        self.assertGreater(authors[0], 5 * authors[len(authors) // 2])
+        self.assertLess(
+            Post.objects.order_by('created').first().created,
+            timezone.now() - timedelta(days=30),
+        )
+        with_images = Post.objects.exclude(image='')
+        self.assertEqual(StoredFile.objects.count(), 2)
+        self.assertEqual(
+            StoredFile.objects.aggregate(total=Sum('refs'))['total'],
+            with_images.count(),
+        )
+        image = with_images.first().image
+        self.assertTrue(image.storage.exists(image.name))
+        post = Post.objects.create(author=User.objects.first(), text='Новый')
+        self.assertEqual(post.id, 301)
@@ -0,0 +1,282 @@
+import os
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from mixer.backend.django import mixer
+from PIL import Image
+
+from core import thumbnails
+from core.cache import get_versions
+from core.models import StoredFile
+from posts import invalidation
+from posts.models import Post
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def picture(color=(200, 30, 30), size=(120, 80)) -> SimpleUploadedFile:
+    file = BytesIO()
+    image = Image.new('RGB', size, color)
+    image.paste((0, 0, 255), (0, 0, 10, 10))
+    image.save(file, 'PNG')
+    return SimpleUploadedFile('picture.png', file.getvalue())
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImageMetadataTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self) -> None:
+        self.author = mixer.blend('auth.user')
+
+    def test_metadata_recorded_on_upload(self) -> None:
+        post = Post.objects.create(
+            author=self.author,
+            text='Пост',
+            image=picture(),
+        )
+        post.refresh_from_db()
+        self.assertEqual((post.image_width, post.image_height), (120, 80))
+        self.assertEqual(post.image_color, '#c81e1e')
+        self.assertEqual(post.image_size, post.image.size)
+        post.image = ''
+        post.save()
+        post.refresh_from_db()
+        self.assertIsNone(post.image_width)
+        self.assertEqual(post.image_color, '')
+
+    def test_backfill_command(self) -> None:
+        name = default_storage.save('posts/old.png', picture((0, 128, 0)))
+        post = Post.objects.create(author=self.author, text='Пост')
+        Post.objects.filter(id=post.id).update(image=name)
+        Post.objects.create(
+            author=self.author,
+            text='Пост без файла',
+            image='posts/missing.png',
+        )
+        out, err = StringIO(), StringIO()
+        call_command(
+            'backfill_image_metadata',
+            workers=0,
+            stdout=out,
+            stderr=err,
+        )
+        self.assertIn('Обновлено постов: 1', out.getvalue())
+        self.assertIn('Не удалось прочитать изображений: 1', err.getvalue())
+        post.refresh_from_db()
+        self.assertEqual(
+            (post.image_width, post.image_height, post.image_color),
+            (120, 80, '#008000'),
+        )
+        self.assertEqual(post.image_size, default_storage.size(name))
+
+    def test_backfill_reads_field_storage(self) -> None:
+        storage = Post._meta.get_field('image').storage
+        post = Post.objects.create(author=self.author, image=picture())
+        Post.objects.filter(id=post.id).update(image_color='')
+        with mock.patch.object(storage, 'open', wraps=storage.open) as read:
+            call_command(
+                'backfill_image_metadata',
+                workers=0,
+                stdout=StringIO(),
+            )
+        read.assert_called_once_with(post.image.name)
+
+    def test_thumbnails_created_by_command_only(self) -> None:
+        cache.clear()
+        post = Post.objects.create(
+            author=self.author,
+            image=picture((40, 50, 60)),
+        )
+        with mock.patch.object(
+            thumbnails.EagerThumbnailBackend,
+            'generate_many',
+        ) as generate:
+            thumbnails.prefetch((post,))
+        generate.assert_not_called()
+        self.assertIsInstance(
+            post.thumbnails['webp-320'],
+            thumbnails.Placeholder,
+        )
+        call_command('pregenerate_thumbnails', stdout=StringIO())
+        thumbnails.prefetch((post,))
+        for alias, thumbnail in post.thumbnails.items():
+            with self.subTest(alias=alias):
+                self.assertNotIsInstance(thumbnail, thumbnails.Placeholder)
+                self.assertTrue(default_storage.exists(thumbnail.name))
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ContentAddressedStorageTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self) -> None:
+        self.author = mixer.blend('auth.user')
+        # файлы удаляются после фиксации транзакции
+        patcher = mock.patch(
+            'core.storage.transaction.on_commit',
+            side_effect=lambda callback: callback(),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def refs(self, name: str) -> int:
+        stored = StoredFile.objects.filter(name=name).first()
+        return stored.refs if stored else 0
+
+    def test_identical_uploads_deduplicated(self) -> None:
+        first, second = (
+            Post.objects.create(author=self.author, image=picture())
+            for _ in range(2)
+        )
+        name = first.image.name
+        self.assertEqual(second.image.name, name)
+        self.assertRegex(name, r'^posts/\w\w/\w\w/\w{64}\.jpg$')
+        self.assertEqual(self.refs(name), 2)
+        first.delete()
+        self.assertEqual(self.refs(name), 1)
+        self.assertTrue(default_storage.exists(name))
+        second.image = picture((0, 0, 0))
+        second.save()
+        self.assertEqual(self.refs(name), 0)
+        self.assertFalse(default_storage.exists(name))
+        self.assertEqual(self.refs(second.image.name), 1)
+
+    def test_identical_upload_racing_existing_file(self) -> None:
+        media = Post._meta.get_field('image').storage
+        name = media.save('posts/first.png', picture())
+        # параллельная загрузка уже прошла проверку exists()
+        with mock.patch.object(media, 'exists', return_value=False):
+            self.assertEqual(media.save('posts/second.png', picture()), name)
+        self.assertEqual(
+            os.listdir(os.path.dirname(media.path(name))),
+            [os.path.basename(name)],
+        )
+
+    def test_migrate_media_command(self) -> None:
+        legacy = default_storage.save('posts/legacy.png', picture())
+        Post.objects.bulk_create(
+            Post(author=self.author, text='Старый пост', image=legacy)
+            for _ in range(2)
+        )
+        call_command('migrate_media', dry_run=True, stdout=StringIO())
+        self.assertTrue(default_storage.exists(legacy))
+        profile = invalidation.profile_scope(self.author.username)
+        before = get_versions((profile,))[profile]
+        out = StringIO()
+        call_command('migrate_media', stdout=out)
+        # update() обходит сигналы, страницы сбрасывает сама команда
+        self.assertGreater(get_versions((profile,))[profile], before)
+        self.assertIn('Перенесено файлов: 1', out.getvalue())
+        self.assertFalse(default_storage.exists(legacy))
+        names = set(
+            Post.objects.filter(text='Старый пост').values_list(
+                'image',
+                flat=True,
+            ),
+        )
+        self.assertEqual(len(names), 1)
+        name = names.pop()
+        self.assertRegex(name, r'^posts/\w\w/\w\w/\w{64}\.png$')
+        self.assertTrue(default_storage.exists(name))
+        self.assertEqual(self.refs(name), 2)
+        post = Post.objects.filter(text='Старый пост').first()
+        thumbnails.prefetch((post,))
+        for alias, thumbnail in post.thumbnails.items():
+            with self.subTest(alias=alias):
+                self.assertNotIsInstance(thumbnail, thumbnails.Placeholder)
+
+    def test_migrate_media_recounts_many_files(self) -> None:
+        # SQLite ограничивает число строк в одном INSERT
+        names = [f'posts/ab/cd/{num:064x}.png' for num in range(501)]
+        Post.objects.bulk_create(
+            Post(author=self.author, text='Пост', image=name) for name in names
+        )
+        call_command('migrate_media', stdout=StringIO())
+        self.assertEqual(StoredFile.objects.count(), len(names))
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class MediaGarbageCollectorTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.author = mixer.blend('auth.user')
+        patcher = mock.patch(
+            'core.storage.transaction.on_commit',
+            side_effect=lambda callback: callback(),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def post_with_thumbnails(self, color) -> Post:
+        post = Post.objects.create(author=self.author, image=picture(color))
+        thumbnails.pregenerate(post.image)
+        return post
+
+    def thumbnail_names(self, post: Post):
+        found = thumbnails.default.backend.get_many(
+            (post.image,),
+            thumbnails.variants(),
+        )
+        return {image.name for image in found[post.image.name].values()}
+
+    def test_orphans_collected(self) -> None:
+        kept = self.post_with_thumbnails((10, 10, 10))
+        kept_thumbnails = self.thumbnail_names(kept)
+        detached = self.post_with_thumbnails((20, 20, 20))
+        detached_name = detached.image.name
+        detached_thumbnails = self.thumbnail_names(detached)
+        # обновление в обход сигналов оставляет файл без ссылок
+        Post.objects.filter(id=detached.id).update(image='')
+        deleted = self.post_with_thumbnails((30, 30, 30))
+        deleted_thumbnails = self.thumbnail_names(deleted)
+        deleted.delete()
+        stray = default_storage.save('cache/zz/stray.jpg', picture())
+        removed = detached_thumbnails | deleted_thumbnails | {detached_name}
+        for name in removed | {stray}:
+            self.assertTrue(default_storage.exists(name), name)
+
+        out = StringIO()
+        call_command('collect_media_garbage', dry_run=True, stdout=out)
+        self.assertIn('Будет удалено изображений: 0', out.getvalue())
+        out = StringIO()
+        call_command(
+            'collect_media_garbage',
+            dry_run=True,
+            min_age=0,
+            stdout=out,
+        )
+        self.assertIn('Будет удалено изображений: 1', out.getvalue())
+        self.assertTrue(default_storage.exists(detached_name))
+
+        call_command(
+            'collect_media_garbage',
+            min_age=0,
+            batch_size=2,
+            stdout=StringIO(),
+        )
+        for name in removed | {stray}:
+            self.assertFalse(default_storage.exists(name), name)
+        for name in kept_thumbnails | {kept.image.name}:
+            self.assertTrue(default_storage.exists(name), name)
+        self.assertEqual(self.thumbnail_names(kept), kept_thumbnails)
+        self.assertFalse(StoredFile.objects.filter(name=detached_name))
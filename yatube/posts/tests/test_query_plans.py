@@ -0,0 +1,65 @@
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, connection, transaction
+from django.db.models import QuerySet
+from django.test import TestCase
+from django.utils import timezone
+from mixer.backend.django import mixer
+
+from core.paginator import KeysetPaginator
+from posts import comments
+from posts.models import Follow, Post
+
+User = get_user_model()
+
+
+class QueryPlanTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = mixer.blend(User)
+        cls.group = mixer.blend('posts.group')
+        cls.post = mixer.blend('posts.post', author=cls.user, group=cls.group)
+
+    def plan(self, queryset: QuerySet) -> str:
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            return '\n'.join(row[-1] for row in cursor.fetchall())
+
+    def pages(self, queryset: QuerySet, per_page: int = 10):
+        paginator = KeysetPaginator(queryset, per_page)
+        cursor = (timezone.now(), self.post.id)
+        ordered = paginator._ordered(True)
+        return (
+            ordered[: per_page + 1],
+            ordered.filter(paginator._seek(cursor, True))[: per_page + 1],
+        )
+
+    def test_feeds_use_indexes_without_sorting(self) -> None:
+        posts = Post.objects.select_related('group', 'author')
+        feeds = (
+            (posts.filter(group=self.group), 'post_group_created_idx'),
+            (posts.filter(author=self.user), 'post_author_created_idx'),
+            (
+                comments.paginator(self.post.id).queryset,
+                'comment_post_created_idx',
+            ),
+        )
+        for queryset, index in feeds:
+            for page in self.pages(queryset):
+                with self.subTest(sql=str(page.query)):
+                    plan = self.plan(page)
+                    self.assertIn(f'USING INDEX {index}', plan)
+                    self.assertNotIn('TEMP B-TREE', plan)
+        self.assertNotIn('TEMP B-TREE', self.plan(self.pages(posts)[1]))
+
+    def test_follow_constraints(self) -> None:
+        author = mixer.blend(User)
+        plan = self.plan(Follow.objects.filter(user=self.user, author=author))
+        self.assertIn('(user_id=? AND author_id=?)', plan)
+        Follow.objects.create(user=self.user, author=author)
+        for duplicate in (author, self.user):
+            with self.subTest(author=duplicate):
+                with self.assertRaises(IntegrityError):
+                    with transaction.atomic():
+                        Follow.objects.create(user=self.user, author=duplicate)
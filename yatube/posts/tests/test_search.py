@@ -0,0 +1,78 @@
+from urllib.parse import quote
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from mixer.backend.django import mixer
+
+from posts import search
+from posts.models import Post
+
+User = get_user_model()
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = mixer.blend(User)
+        cls.relevant = Post.objects.create(
+            author=cls.author,
+            text='Ежик ищет ежика, ежики любят ежиков',
+        )
+        cls.other = Post.objects.create(
+            author=cls.author,
+            text=(
+                'Длинные заметки про море, горы, леса, поля, реки и '
+                'одного ежика, который встретился по дороге'
+            ),
+        )
+        cls.unrelated = Post.objects.create(
+            author=cls.author,
+            text='Совсем о другом',
+        )
+        Post.objects.bulk_create(
+            Post(author=cls.author, text=f'Пост номер {num}')
+            for num in range(10)
+        )
+
+    def setUp(self) -> None:
+        cache.clear()
+
+    def test_ranked_prefix_search(self) -> None:
+        found = list(search.search('ЕЖИК'))
+        self.assertEqual(found, [self.relevant, self.other])
+        self.assertLess(found[0].rank, found[1].rank)
+        self.assertEqual(list(search.search('" OR NEAR(')), [])
+        self.assertEqual(list(search.search('   ')), [])
+
+    def test_index_follows_changes(self) -> None:
+        Post.objects.filter(id=self.unrelated.id).update(text='Про ежей')
+        self.assertIn(self.unrelated, search.search('ежей'))
+        self.assertNotIn(self.unrelated, search.search('другом'))
+        Post.objects.filter(id=self.other.id).delete()
+        self.assertEqual(list(search.search('море')), [])
+
+    @override_settings(PAGE_SIZE=1)
+    def test_view_keyset_pages(self) -> None:
+        address = reverse('posts:post_search')
+        response = self.client.get(address, {'q': 'ежик'})
+        self.assertEqual(list(response.context['page_obj']), [self.relevant])
+        cursor = response.context['page_obj'].next_cursor
+        self.assertContains(response, f'q={quote("ежик")}&after={cursor}')
+        response = self.client.get(address, {'q': 'ежик', 'after': cursor})
+        self.assertEqual(list(response.context['page_obj']), [self.other])
+        self.assertFalse(response.context['page_obj'].has_next())
+
+    def test_admin_uses_index(self) -> None:
+        admin = Client()
+        admin.force_login(mixer.blend(User, is_staff=True, is_superuser=True))
+        response = admin.get(
+            reverse('admin:posts_post_changelist'),
+            {'q': 'ежик'},
+        )
+        self.assertEqual(
+            set(response.context['cl'].result_list),
+            {self.relevant, self.other},
+        )
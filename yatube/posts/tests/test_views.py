@@ -1,11 +1,17 @@
+from http import HTTPStatus
+from unittest import mock
+
 from django import forms
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
-from django.test import Client, TestCase
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 from mixer.backend.django import mixer
 
-from posts.models import Post
+from core.cache import get_versions
+from posts import comments, invalidation
+from posts.models import Group, Post
+from posts.tests.common import run_on_commit
 
 User = get_user_model()
 
@@ -51,6 +57,7 @@ class PostURLTests(TestCase):
 
     def setUp(self):
         cache.clear()
+        run_on_commit(self)
 
     def test_pages_index_group_list_profile_show_correct_context(self) -> None:
         paginated = (
@@ -145,18 +152,67 @@ class PostURLTests(TestCase):
                     )
 
     def test_cache_index_ok(self) -> None:
-        before_delete_posts = self.author.get(reverse('posts:index')).content
-        post = Post.objects.get(id=self.post.id)
-
-        post.delete()
-        after_delete_posts = self.author.get(reverse('posts:index')).content
-        self.assertEqual(before_delete_posts, after_delete_posts)
+        before_update_posts = self.author.get(reverse('posts:index')).content
+        Post.objects.filter(id=self.post.id).update(text='Изменён в обход')
+        after_update_posts = self.author.get(reverse('posts:index')).content
+        self.assertEqual(before_update_posts, after_update_posts)
 
         cache.clear()
         after_cache_clear_posts = self.author.get(
             reverse('posts:index'),
         ).content
-        self.assertNotEqual(before_delete_posts, after_cache_clear_posts)
+        self.assertNotEqual(before_update_posts, after_cache_clear_posts)
+
+    def test_cache_invalidated_by_post_changes(self) -> None:
+        addresses = (
+            self.urls.get('index'),
+            self.urls.get('group_list'),
+            self.urls.get('profile'),
+        )
+        responses = {
+            address: self.author.get(address) for address in addresses
+        }
+        before = {
+            address: response.content
+            for address, response in responses.items()
+        }
+        shown = {
+            address: list(response.context['page_obj'])
+            for address, response in responses.items()
+        }
+        post = mixer.blend(
+            'posts.post',
+            author=self.author_user,
+            group=self.group,
+        )
+        for address in addresses:
+            with self.subTest(address=address):
+                response = self.author.get(address)
+                self.assertNotEqual(before[address], response.content)
+                self.assertEqual(response.context['page_obj'][0], post)
+
+        post.delete()
+        for address in addresses:
+            with self.subTest(address=address):
+                # миниатюры общей картинки могли появиться после создания
+                # поста, поэтому сравниваются посты, а не разметка
+                response = self.author.get(address)
+                self.assertIsNotNone(
+                    response.context,
+                    'после удаления поста страница не обновилась',
+                )
+                self.assertEqual(
+                    list(response.context['page_obj']),
+                    shown[address],
+                )
+
+    def test_cache_of_other_pages_kept(self) -> None:
+        other_group = mixer.blend('posts.group')
+        address = reverse('posts:group_list', args=(other_group.slug,))
+        before = self.author.get(address).content
+        Group.objects.filter(id=other_group.id).update(title='Обход')
+        mixer.blend('posts.post', author=self.author_user, group=self.group)
+        self.assertEqual(before, self.author.get(address).content)
 
     def test_author_post_appeared_in_follow_index_follower(self) -> None:
         new_post = mixer.blend(
@@ -195,3 +251,176 @@ class PostURLTests(TestCase):
                 'подписанного пользователя'
             ),
         )
+
+
+class InvalidationTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = mixer.blend(User)
+        cls.group = mixer.blend('posts.group')
+        cls.post = mixer.blend('posts.post', author=cls.user, group=cls.group)
+        cls.scopes = (
+            invalidation.INDEX,
+            invalidation.profile_scope(cls.user.username),
+            invalidation.group_scope(cls.group.slug),
+        )
+
+    def setUp(self) -> None:
+        cache.clear()
+
+    def test_versions_bumped_after_commit(self) -> None:
+        before = get_versions(self.scopes)
+        callbacks = []
+        with mock.patch(
+            'django.db.transaction.on_commit',
+            side_effect=callbacks.append,
+        ):
+            Post.objects.create(author=self.user, group=self.group)
+        # до фиксации другой запрос не должен закэшировать старую страницу
+        # под новой версией
+        self.assertEqual(get_versions(self.scopes), before)
+        for callback in callbacks:
+            callback()
+        after = get_versions(self.scopes)
+        for scope in self.scopes:
+            with self.subTest(scope=scope):
+                self.assertGreater(after[scope], before[scope])
+
+    def test_comment_keeps_index(self) -> None:
+        run_on_commit(self)
+        before = get_versions(self.scopes)
+        mixer.blend('posts.comment', post=self.post)
+        after = get_versions(self.scopes)
+        self.assertEqual(
+            after[invalidation.INDEX],
+            before[invalidation.INDEX],
+        )
+        self.assertGreater(after[self.scopes[1]], before[self.scopes[1]])
+        self.assertGreater(after[self.scopes[2]], before[self.scopes[2]])
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = mixer.blend(User)
+        cls.group = mixer.blend('posts.group')
+        cls.post = mixer.blend('posts.post', author=cls.user, group=cls.group)
+        cls.urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=(cls.group.slug,)),
+            reverse('posts:profile', args=(cls.user.username,)),
+            reverse('posts:post_detail', args=(cls.post.id,)),
+        )
+
+    def setUp(self):
+        cache.clear()
+        run_on_commit(self)
+
+    def test_not_modified_without_rendering(self) -> None:
+        for address in self.urls:
+            with self.subTest(address=address):
+                etag = self.client.get(address)['ETag']
+                response = self.client.get(address, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+                self.assertIsNone(
+                    response.context,
+                    'при 304 шаблон не должен рендериться',
+                )
+
+    def test_feed_validators_without_queries(self) -> None:
+        for address in self.urls[:3]:
+            with self.subTest(address=address):
+                etag = self.client.get(address)['ETag']
+                with self.assertNumQueries(0):
+                    response = self.client.get(
+                        address,
+                        HTTP_IF_NONE_MATCH=etag,
+                    )
+                self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+
+    def test_validators_change_with_content(self) -> None:
+        etags = {
+            address: self.client.get(address)['ETag'] for address in self.urls
+        }
+        post = mixer.blend('posts.post', author=self.user, group=self.group)
+        mixer.blend('posts.comment', post=self.post)
+        for address in self.urls:
+            with self.subTest(address=address):
+                response = self.client.get(
+                    address,
+                    HTTP_IF_NONE_MATCH=etags[address],
+                )
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+        post.delete()
+        response = self.client.get(
+            self.urls[0],
+            HTTP_IF_NONE_MATCH=etags[self.urls[0]],
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_last_modified(self) -> None:
+        response = self.client.get(self.urls[3])
+        response = self.client.get(
+            self.urls[3],
+            HTTP_IF_MODIFIED_SINCE=response['Last-Modified'],
+        )
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+
+
+@override_settings(COMMENTS_PAGE_SIZE=3)
+class CommentsPaginationTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = mixer.blend(User)
+        cls.auth = Client()
+        cls.auth.force_login(cls.user)
+        cls.post = mixer.blend('posts.post', author=cls.user)
+        cls.comments = [
+            mixer.blend('posts.comment', post=cls.post, text=f'Коммент {num}')
+            for num in range(5)
+        ][::-1]
+
+    def setUp(self) -> None:
+        cache.clear()
+        run_on_commit(self)
+
+    def test_first_page_cached_and_invalidated(self) -> None:
+        address = reverse('posts:post_detail', args=(self.post.id,))
+        response = self.client.get(address)
+        self.assertEqual(
+            list(response.context['comments']),
+            self.comments[:3],
+        )
+        self.assertTrue(response.context['comments'].has_next())
+        with self.assertNumQueries(0):
+            comments.page(self.post.id)
+        self.auth.post(
+            reverse('posts:add_comment', args=(self.post.id,)),
+            {'text': 'Новый коммент'},
+        )
+        response = self.client.get(address)
+        self.assertEqual(
+            response.context['comments'][0].text,
+            'Новый коммент',
+            'первая страница комментариев должна сбрасываться',
+        )
+
+    def test_fragment_returns_next_batch(self) -> None:
+        cursor = comments.page(self.post.id).next_cursor
+        response = self.client.get(
+            reverse('posts:post_comments', args=(self.post.id,)),
+            {'after': cursor},
+        )
+        self.assertTemplateUsed(response, 'includes/comments_page.html')
+        self.assertEqual(
+            list(response.context['comments']),
+            self.comments[3:],
+        )
+        self.assertNotContains(response, 'data-more-comments')
+        response = self.client.get(
+            reverse('posts:post_comments', args=(self.post.id + 1,)),
+        )
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
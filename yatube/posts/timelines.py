@@ -0,0 +1,113 @@
+from typing import Iterable, Optional, Union
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import OuterRef, QuerySet, Subquery
+
+from core.cache import bump_tables
+from posts.models import Follow, Post, Timeline
+
+
+def enabled() -> bool:
+    return settings.FOLLOW_FEED == 'timeline'
+
+
+def batch_size() -> int:
+    # Django 2.2 не уменьшает batch_size до предела параметров базы
+    fields = [
+        field
+        for field in Timeline._meta.concrete_fields
+        if not field.primary_key
+    ]
+    ops = connections[Timeline.objects.db].ops
+    return min(settings.TIMELINE_BATCH_SIZE, ops.bulk_batch_size(fields, []))
+
+
+def changed() -> None:
+    # счётчик страниц ленты закэширован по версии таблицы posts_timeline
+    transaction.on_commit(lambda: bump_tables(Timeline))
+
+
+def fan_out(post: Post) -> None:
+    followers = list(
+        Follow.objects.filter(author_id=post.author_id).values_list(
+            'user_id',
+            flat=True,
+        ),
+    )
+    Timeline.objects.bulk_create(
+        (
+            Timeline(user_id=user_id, post=post, created=post.created)
+            for user_id in followers
+        ),
+        batch_size=batch_size(),
+        ignore_conflicts=True,
+    )
+    trim(Follow.objects.filter(author_id=post.author_id).values('user_id'))
+
+
+def backfill(user_id: int, author_id: int) -> None:
+    Timeline.objects.bulk_create(
+        (
+            Timeline(user_id=user_id, post_id=post_id, created=created)
+            for post_id, created in Post.objects.filter(
+                author_id=author_id,
+            ).values_list('id', 'created')[: settings.TIMELINE_LENGTH]
+        ),
+        batch_size=batch_size(),
+        ignore_conflicts=True,
+    )
+    trim((user_id,))
+
+
+def remove(user_id: int, author_id: int) -> None:
+    Timeline.objects.filter(
+        user_id=user_id,
+        post__author_id=author_id,
+    ).delete()
+    changed()
+
+
+def trim(user_ids: Union[QuerySet, Iterable[int]]) -> None:
+    # всё, что не новее (length + 1)-й записи своей ленты, выходит за её
+    # пределы; все ленты обрезаются одним DELETE
+    length = settings.TIMELINE_LENGTH
+    Timeline.objects.filter(
+        user_id__in=user_ids,
+        created__lte=Subquery(
+            Timeline.objects.filter(user_id=OuterRef('user_id'))
+            .order_by('-created')
+            .values('created')[length:][:1],
+        ),
+    ).delete()
+    # fan_out и backfill заканчиваются обрезкой, поэтому версия таблицы
+    # повышается и для их записей
+    changed()
+
+
+def owners() -> Iterable[int]:
+    return (
+        Follow.objects.order_by('user_id')
+        .values_list('user_id', flat=True)
+        .distinct()
+    )
+
+
+def rebuild(user_ids: Optional[Iterable[int]] = None) -> int:
+    if user_ids is None:
+        user_ids = owners()
+    rebuilt = 0
+    for user_id in user_ids:
+        Timeline.objects.filter(user_id=user_id).delete()
+        Timeline.objects.bulk_create(
+            (
+                Timeline(user_id=user_id, post_id=post_id, created=created)
+                for post_id, created in Post.objects.filter(
+                    author__following__user_id=user_id,
+                ).values_list('id', 'created')[: settings.TIMELINE_LENGTH]
+            ),
+            batch_size=batch_size(),
+        )
+        rebuilt += 1
+    changed()
+    return rebuilt
@@ -9,6 +9,8 @@ urlpatterns = [
     path('', views.index, name='index'),
     path('create/', views.post_create, name='post_create'),
     path('follow/', views.follow_index, name='follow_index'),
+    path('search/', views.post_search, name='post_search'),
+    path('autocomplete/', views.suggest, name='autocomplete'),
     path('group/<slug:slug>/', views.group_list, name='group_list'),
     path('posts/<int:id>/', views.post_detail, name='post_detail'),
     path(
@@ -16,6 +18,11 @@ urlpatterns = [
         views.add_comment,
         name='add_comment',
     ),
+    path(
+        'posts/<int:id>/comments/',
+        views.post_comments,
+        name='post_comments',
+    ),
     path('posts/<int:id>/edit/', views.post_edit, name='post_edit'),
     path('profile/<str:username>/', views.profile, name='profile'),
     path(
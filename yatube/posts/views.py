@@ -1,82 +1,166 @@
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
-from django.http import HttpRequest
+from django.db import transaction
+from django.http import HttpRequest, JsonResponse
 from django.shortcuts import HttpResponse, get_object_or_404, redirect, render
-from django.views.decorators.cache import cache_page
 
+from core import thumbnails
+from core.cache import conditional_page, versioned_cache_page
 from core.utils import paginate
+from posts import autocomplete, comments, follows, invalidation, search
+from posts.feeds import follow_feed, follow_feed_keys
 from posts.forms import CommentForm, PostForm
 from posts.models import Follow, Group, Post
 
 User = get_user_model()
 
 
-@cache_page(20, key_prefix='index_page')
+def with_cards(request: HttpRequest, context: dict) -> dict:
+    thumbnails.prefetch(
+        context['page_obj'],
+        scopes=invalidation.post_scopes,
+    )
+    if request.user.is_authenticated:
+        context['followed_authors'] = follows.following(
+            request.user,
+            (post.author_id for post in context['page_obj']),
+        )
+    return context
+
+
+@conditional_page(invalidation.index_state)
+@versioned_cache_page(
+    settings.PAGE_CACHE_TIMEOUT,
+    'index_page',
+    invalidation.index_scopes,
+)
 def index(request: HttpRequest) -> HttpResponse:
     return render(
         request,
         'posts/index.html',
-        {
-            'page_obj': paginate(
-                request,
-                Post.objects.select_related('group', 'author'),
-                settings.PAGE_SIZE,
-            ),
-        },
+        with_cards(
+            request,
+            {
+                'page_obj': paginate(
+                    request,
+                    Post.objects.select_related('group', 'author'),
+                    settings.PAGE_SIZE,
+                    keyset=settings.FEED_KEYSET_PAGINATION,
+                ),
+            },
+        ),
     )
 
 
+@conditional_page(invalidation.group_state)
+@versioned_cache_page(
+    settings.PAGE_CACHE_TIMEOUT,
+    'group_page',
+    invalidation.group_scopes,
+)
 def group_list(request: HttpRequest, slug: str) -> HttpResponse:
     group = get_object_or_404(Group, slug=slug)
     return render(
         request,
         'posts/group_list.html',
-        {
-            'group': group,
-            'page_obj': paginate(
-                request,
-                group.posts.select_related('group', 'author'),
-                settings.PAGE_SIZE,
-            ),
-        },
+        with_cards(
+            request,
+            {
+                'group': group,
+                'page_obj': paginate(
+                    request,
+                    group.posts.select_related('group', 'author'),
+                    settings.PAGE_SIZE,
+                    keyset=settings.FEED_KEYSET_PAGINATION,
+                ),
+            },
+        ),
     )
 
 
+@conditional_page(invalidation.profile_state)
+@versioned_cache_page(
+    settings.PAGE_CACHE_TIMEOUT,
+    'profile_page',
+    invalidation.profile_scopes,
+)
 def profile(request: HttpRequest, username: str) -> HttpResponse:
-    author = get_object_or_404(User, username=username)
+    author = get_object_or_404(
+        User.objects.select_related('stats'),
+        username=username,
+    )
+    page_obj = paginate(
+        request,
+        author.posts.select_related('group', 'author'),
+        settings.PAGE_SIZE,
+        keyset=settings.FEED_KEYSET_PAGINATION,
+    )
+    thumbnails.prefetch(page_obj, scopes=invalidation.post_scopes)
     return render(
         request,
         'posts/profile.html',
         {
             'author': author,
-            'page_obj': paginate(
-                request,
-                author.posts.select_related('group', 'author'),
-                settings.PAGE_SIZE,
-            ),
-            'following': (
-                request.user.is_authenticated
-                and author.id
-                in request.user.follower.values_list('author', flat=True)
-            ),
+            'page_obj': page_obj,
+            'following': follows.is_following(request.user, author.id),
         },
     )
 
 
+@conditional_page(invalidation.post_state)
 def post_detail(request: HttpRequest, id: int) -> HttpResponse:
-    post = get_object_or_404(Post, id=id)
+    post = get_object_or_404(
+        Post.objects.select_related('group', 'author__stats'),
+        id=id,
+    )
+    thumbnails.prefetch((post,), scopes=invalidation.post_scopes)
     return render(
         request,
         'posts/post_detail.html',
         {
             'post': post,
             'form': CommentForm(),
-            'comments': post.comments.select_related('post', 'author'),
+            'comments': comments.page(post.id),
+        },
+    )
+
+
+def post_comments(request: HttpRequest, id: int) -> HttpResponse:
+    post = get_object_or_404(Post.objects.only('id'), id=id)
+    return render(
+        request,
+        'includes/comments_page.html',
+        {
+            'post': post,
+            'comments': comments.page(post.id, request.GET.get('after')),
         },
     )
 
 
+def post_search(request: HttpRequest) -> HttpResponse:
+    query = request.GET.get('q', '').strip()
+    page_obj = search.paginator(
+        search.search(query, Post.objects.select_related('group', 'author')),
+        settings.PAGE_SIZE,
+    ).get_page(
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+    )
+    return render(
+        request,
+        'posts/search.html',
+        with_cards(request, {'query': query, 'page_obj': page_obj}),
+    )
+
+
+def suggest(request: HttpRequest) -> JsonResponse:
+    return JsonResponse(
+        autocomplete.suggest(request.GET.get('q', '')),
+        json_dumps_params={'ensure_ascii': False},
+    )
+
+
 @login_required
 def post_create(request: HttpRequest) -> HttpResponse:
     form = PostForm(request.POST or None, files=request.FILES or None)
@@ -90,7 +174,8 @@ def post_create(request: HttpRequest) -> HttpResponse:
         )
 
     form.instance.author = request.user
-    form.save()
+    with transaction.atomic():
+        form.save()
     return redirect('posts:profile', request.user.username)
 
 
@@ -125,7 +210,8 @@ def add_comment(request: HttpRequest, id: int) -> HttpResponse:
     if form.is_valid():
         form.instance.author = request.user
         form.instance.post = post
-        form.save()
+        with transaction.atomic():
+            form.save()
     return redirect('posts:post_detail', id=id)
 
 
@@ -134,15 +220,18 @@ def follow_index(request: HttpRequest) -> HttpResponse:
     return render(
         request,
         'posts/follow.html',
-        {
-            'page_obj': paginate(
-                request,
-                Post.objects.select_related('group', 'author').filter(
-                    author__following__user=request.user,
+        with_cards(
+            request,
+            {
+                'page_obj': paginate(
+                    request,
+                    follow_feed(request.user),
+                    settings.PAGE_SIZE,
+                    keyset=settings.FEED_KEYSET_PAGINATION,
+                    keys=follow_feed_keys(),
                 ),
-                settings.PAGE_SIZE,
-            ),
-        },
+            },
+        ),
     )
 
 
@@ -150,14 +239,15 @@ def follow_index(request: HttpRequest) -> HttpResponse:
 def profile_follow(request: HttpRequest, username: str) -> HttpResponse:
     author = get_object_or_404(User, username=username)
     if author != request.user:
-        Follow.objects.get_or_create(user=request.user, author=author)
+        with transaction.atomic():
+            Follow.objects.get_or_create(user=request.user, author=author)
     return redirect('posts:profile', author.username)
 
 
 @login_required
 def profile_unfollow(request: HttpRequest, username: str) -> HttpResponse:
     get_object_or_404(
-        Follow,
+        Follow.objects.select_related('user', 'author'),
         user=request.user,
         author__username=username,
     ).delete()
@@ -0,0 +1,22 @@
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.contrib.auth.admin import UserAdmin
+
+from posts import autocomplete
+
+User = get_user_model()
+
+
+class IndexedUserAdmin(UserAdmin):
+    def get_search_results(self, request, queryset, search_term):
+        if not autocomplete.admin_autocomplete(request):
+            return super().get_search_results(request, queryset, search_term)
+        return autocomplete.search_results(
+            autocomplete.users,
+            queryset,
+            search_term,
+        )
+
+
+admin.site.unregister(User)
+admin.site.register(User, IndexedUserAdmin)
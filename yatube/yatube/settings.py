@@ -6,7 +6,7 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
 SECRET_KEY = env('SECRET_KEY', cast=str, default='s3cr3t')
 
-DEBUG = True
+DEBUG = env('DEBUG', cast=bool, default=True)
 
 ALLOWED_HOSTS = [
     'localhost',
@@ -29,31 +29,83 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'sorl.thumbnail',
-    'debug_toolbar',
 ]
 
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.QueryBudgetMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'debug_toolbar.middleware.DebugToolbarMiddleware',
 ]
 
+if DEBUG:
+    INSTALLED_APPS.append('debug_toolbar')
+    MIDDLEWARE.append('debug_toolbar.middleware.DebugToolbarMiddleware')
+
+QUERY_BUDGET_STRICT = env('QUERY_BUDGET_STRICT', cast=bool, default=False)
+
+QUERY_BUDGET_DEFAULT = 10
+
+QUERY_REPEAT_LIMIT = 3
+
+QUERY_BUDGETS = {
+    'posts:index': 6,
+    'posts:group_list': 6,
+    'posts:profile': 6,
+    'posts:post_detail': 6,
+    'posts:follow_index': 8,
+    'posts:post_comments': 4,
+    'posts:post_search': 6,
+    'posts:autocomplete': 4,
+    # запись вызывает сигналы счётчиков, лент и кэша
+    'posts:post_create': 25,
+    'posts:post_edit': 25,
+    'posts:add_comment': 15,
+    'posts:profile_follow': 15,
+    'posts:profile_unfollow': 15,
+}
+
 INTERNAL_IPS = [
     '127.0.0.1',
 ]
 
+# файлы метрик рабочих процессов; каталог очищают при перезапуске сервера,
+# без него метрики хранятся в памяти единственного процесса
+METRICS_DIR = env('METRICS_DIR', cast=str, default='')
+
+# адреса, с которых доступен /metrics/; пустой список отключает выдачу.
+# Адрес берётся из REMOTE_ADDR, поэтому за прокси указывают адрес сборщика
+# метрик так, как его видит приложение
+METRICS_ALLOWED_IPS = env.list('METRICS_ALLOWED_IPS', default=[])
+
+PROFILE_DIR = env(
+    'PROFILE_DIR',
+    cast=str,
+    default=os.path.join(BASE_DIR, 'profiles'),
+)
+
+# 0 - без случайной выборки, N - профилировать в среднем 1 запрос из N
+PROFILE_SAMPLE_RATE = env('PROFILE_SAMPLE_RATE', cast=int, default=0)
+
+PROFILE_INTERVAL = 0.005
+
+# заголовок X-Profile: python manage.py shell -c
+# "from core.profiling import token; print(token())"
+PROFILE_TOKEN_MAX_AGE = 60 * 60
+
 ROOT_URLCONF = 'yatube.urls'
 
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.metrics.DjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -114,16 +166,95 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 PAGE_SIZE = 10
 
+PAGE_CACHE_TIMEOUT = 6 * 60 * 60
+
+PAGE_CACHE_STALE_TIMEOUT = 24 * 60 * 60
+
+PAGE_CACHE_LOCK_TIMEOUT = 30
+
+PAGE_CACHE_LOCK_WAIT = 2
+
+PAGE_CACHE_BETA = 1.0
+
+FEED_KEYSET_PAGINATION = False
+
+PAGINATOR_COUNT_TIMEOUT = 60 * 60
+
+PAGINATOR_ESTIMATE_THRESHOLD = 100_000
+
+PAGINATOR_ESTIMATE_TIMEOUT = 15 * 60
+
+# 'orm' - запрос с JOIN по подпискам, 'timeline' - материализованные ленты,
+# 'merge' - слияние кэшированных списков последних постов авторов
+FOLLOW_FEED = 'orm'
+
+TIMELINE_LENGTH = 1000
+
+TIMELINE_BATCH_SIZE = 500
+
+FEED_AUTHOR_LENGTH = 200
+
+FEED_AUTHOR_TIMEOUT = 24 * 60 * 60
+
+FOLLOWS_TIMEOUT = 24 * 60 * 60
+
+COMMENTS_PAGE_SIZE = 20
+
+COMMENTS_CACHE_TIMEOUT = 24 * 60 * 60
+
+THUMBNAIL_BACKEND = 'core.thumbnails.EagerThumbnailBackend'
+
+# 0 - без фоновых потоков (разработка и тесты): страницы получают заглушки,
+# а миниатюры создаются только при загрузке изображения
+THUMBNAIL_WORKERS = env('THUMBNAIL_WORKERS', cast=int, default=0)
+
+THUMBNAIL_PENDING_TIMEOUT = 60
+
+# варианты изображения поста: каждая ширина в каждом формате,
+# None - формат исходного файла
+POST_IMAGE_SIZE = (960, 339)
+
+POST_IMAGE_WIDTHS = (320, 640, 960)
+
+POST_IMAGE_FORMATS = ('WEBP', None)
+
+POST_IMAGE_OPTIONS = {'crop': 'center', 'upscale': True}
+
+POST_IMAGE_SIZES = '(min-width: 1200px) 960px, 100vw'
+
+THUMBNAIL_PRESERVE_FORMAT = True
+
+# загрузки с большим числом пикселей отклоняются до декодирования
+POST_IMAGE_MAX_PIXELS = 40_000_000
+
+POST_IMAGE_MAX_SIDE = 2560
+
+POST_IMAGE_QUALITY = 85
+
 NUMCATECHARS = 15
 
+AUTOCOMPLETE_INDEX = True
+
+AUTOCOMPLETE_LIMIT = 10
+
+AUTOCOMPLETE_ADMIN_LIMIT = 100
+
+AUTOCOMPLETE_MAX_ENTRIES = 500_000
+
+AUTOCOMPLETE_REBUILD_INTERVAL = 5 * 60
+
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
 MEDIA_URL = '/media/'
 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+SERVE_MEDIA = env('SERVE_MEDIA', cast=bool, default=True)
+
+MEDIA_CACHE_MAX_AGE = 60 * 60
+
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.metrics.LocMemCache',
     },
 }
@@ -1,9 +1,12 @@
+import re
+
 from django.conf import settings
-from django.conf.urls.static import static
 from django.contrib import admin
-from django.urls import include, path
+from django.urls import include, path, re_path
 
 from about.apps import AboutConfig
+from core import media
+from core.views import export_metrics
 from posts.apps import PostsConfig
 from users.apps import UsersConfig
 
@@ -12,6 +15,7 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path('auth/', include('users.urls', namespace=UsersConfig.name)),
     path('auth/', include('django.contrib.auth.urls')),
+    path('metrics/', export_metrics, name='metrics'),
     path('', include('posts.urls', namespace=PostsConfig.name)),
 ]
 
@@ -23,7 +27,13 @@ if settings.DEBUG:
     import debug_toolbar
 
     urlpatterns += (path('__debug__/', include(debug_toolbar.urls)),)
-    urlpatterns += static(
-        settings.MEDIA_URL,
-        document_root=settings.MEDIA_ROOT,
+
+if settings.SERVE_MEDIA:
+    media_prefix = re.escape(settings.MEDIA_URL.lstrip('/'))
+    urlpatterns += (
+        re_path(
+            rf'^{media_prefix}(?P<path>.+)$',
+            media.serve,
+            name='media',
+        ),
     )